@@ -5,6 +5,7 @@ from .base_agent import BaseFraudAgent, RiskAssessment, AgentMessage
 from .transaction_monitor import TransactionMonitorAgent
 from .behavioral_analysis import BehavioralAnalysisAgent
 from .risk_orchestrator import RiskOrchestrator
+from .state_store import StateStore, LRUStateStore
 
 __all__ = [
     'BaseFraudAgent',
@@ -12,5 +13,7 @@ __all__ = [
     'AgentMessage',
     'TransactionMonitorAgent',
     'BehavioralAnalysisAgent',
-    'RiskOrchestrator'
+    'RiskOrchestrator',
+    'StateStore',
+    'LRUStateStore'
 ]
@@ -1,32 +1,38 @@
 """
 Anomaly Detection Agent - ML-based fraud detection
 """
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from datetime import datetime
-from collections import deque
+import time
 import math
 from .base_agent import BaseFraudAgent, RiskAssessment
+from .running_stats import SlidingWindowStats
+from .state_store import StoreFactory
+
+HISTORY_SIZE = 1000  # Transactions per customer in the baseline
 
 
 class AnomalyDetectionAgent(BaseFraudAgent):
     """Agent for ML-based anomaly detection"""
     
-    def __init__(self):
+    def __init__(self, store_factory: Optional[StoreFactory] = None):
         super().__init__(
             name="anomaly_detection",
             description="Deteção de anomalias com ML",
-            version="1.0"
+            version="1.0",
+            store_factory=store_factory
         )
-        self.transaction_history = {}
+        self.transaction_history = self._create_state_store("transaction_history")
         
     def evaluate(self, transaction: Dict[str, Any], context: Dict = None) -> RiskAssessment:
         """Evaluate using statistical anomaly detection"""
-        start_time = datetime.now()
+        started = time.perf_counter_ns()
         flags = []
         score = 0.0
         
         customer_id = transaction.get("customer_id")
-        if not customer_id or customer_id not in self.transaction_history:
+        stored = self.transaction_history.get(customer_id) if customer_id else None
+        if stored is None:
             # First transaction - no baseline yet
             self._store_transaction(customer_id, transaction)
             return RiskAssessment(
@@ -36,8 +42,7 @@ class AnomalyDetectionAgent(BaseFraudAgent):
                 timestamp=datetime.now(), agent_name=self.name
             )
         
-        history = list(self.transaction_history[customer_id])
-        if len(history) < 5:
+        if len(stored) < 5:
             self._store_transaction(customer_id, transaction)
             return RiskAssessment(
                 score=0.0, confidence=0.4, flags=[],
@@ -46,10 +51,9 @@ class AnomalyDetectionAgent(BaseFraudAgent):
                 timestamp=datetime.now(), agent_name=self.name
             )
         
-        # Calculate statistics
-        amounts = [t["amount"] for t in history]
-        mean = sum(amounts) / len(amounts)
-        variance = sum((x - mean) ** 2 for x in amounts) / len(amounts)
+        # Running statistics of the baseline (before this transaction)
+        mean = stored.mean
+        variance = stored.variance
         std = math.sqrt(variance) if variance > 0 else 1
         
         # Z-score for current transaction
@@ -72,8 +76,7 @@ class AnomalyDetectionAgent(BaseFraudAgent):
         score = min(score, 100)
         action = "BLOCK" if score >= 70 else "REVIEW" if score >= 40 else "APPROVE"
         
-        processing_time = (datetime.now() - start_time).total_seconds() * 1000
-        self.update_metrics(processing_time)
+        self.record_latency(time.perf_counter_ns() - started)
         
         return RiskAssessment(
             score=score,
@@ -85,13 +88,22 @@ class AnomalyDetectionAgent(BaseFraudAgent):
             agent_name=self.name
         )
     
+    def score_upper_bound(self, transaction: Dict[str, Any], context: Dict = None) -> float:
+        """Z-score rule tops out at 35; no score until a 5-transaction baseline exists"""
+        history = self.transaction_history.get(transaction.get("customer_id"))
+        if not history or len(history) < 5:
+            return 0.0
+        return 35.0
+    
+    def update_state(self, transaction: Dict[str, Any], context: Dict = None):
+        """Add transaction to the baseline without scoring"""
+        self._store_transaction(transaction.get("customer_id"), transaction)
+    
     def _store_transaction(self, customer_id: str, transaction: Dict):
-        """Store transaction"""
+        """Add transaction amount to the customer's running baseline"""
         if not customer_id:
             return
-        if customer_id not in self.transaction_history:
-            self.transaction_history[customer_id] = deque(maxlen=1000)
-        self.transaction_history[customer_id].append({
-            "amount": transaction.get("amount", 0),
-            "timestamp": transaction.get("timestamp", datetime.now())
-        })
+        history = self.transaction_history.get(customer_id)
+        if history is None:
+            history = self.transaction_history[customer_id] = SlidingWindowStats(HISTORY_SIZE)
+        history.add(transaction.get("amount", 0), transaction.get("timestamp", datetime.now()))
@@ -0,0 +1,241 @@
+"""
+Audit Trail - Record of every decision for regulatory review
+Each decision (transaction, customer profile, per-agent scores and weights,
+flags, explanation and action) is queued on the request path and written
+by a background thread to rotating gzip-compressed JSON-lines files.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+
+FILE_PREFIX = "audit-"
+FILE_SUFFIX = ".jsonl.gz"
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class AuditTrail:
+    """
+    Write-behind audit log of decisions
+    
+    record() only appends a reference to the transaction, context and
+    assessment to a bounded queue; JSON encoding, compression and disk I/O
+    happen on the writer thread. When the queue reaches high_water_ratio of
+    max_pending the writer is woken early and the event is counted as
+    backpressure; a full queue drops the decision and counts it. Every
+    batch is sync-flushed through gzip (and fsynced unless fsync=False), so
+    a crash leaves every earlier batch readable with `gzip -dc`. Files are
+    rotated once rotate_bytes of JSON have been written to them, and
+    close() writes whatever is still queued. A batch that fails to write
+    is cut off its file and queued again for a fresh file at the next
+    interval; decisions are only given up (counted in lost) if writing
+    still fails on close().
+    """
+    
+    def __init__(self, directory: str, weights: Optional[Dict[str, float]] = None,
+                 max_pending: int = 100_000, high_water_ratio: float = 0.8,
+                 flush_interval_ms: float = 200.0, rotate_bytes: int = 256 * 1024 * 1024,
+                 compresslevel: int = 6, fsync: bool = True):
+        """
+        Args:
+            directory: Directory for the audit files (created if missing)
+            weights: Orchestrator aggregation weights, recorded with each agent score
+            max_pending: Queued decisions beyond which new ones are dropped (and counted)
+            high_water_ratio: Queue fill at which the writer is woken before its interval
+            flush_interval_ms: How long the writer collects decisions before writing them
+            rotate_bytes: Uncompressed bytes after which a new file is started
+            compresslevel: gzip level (1 fastest, 9 smallest)
+            fsync: fsync every batch (off: data survives a process crash, not a host crash)
+        """
+        self.directory = directory
+        self.weights = dict(weights or {})
+        self.max_pending = max_pending
+        self.high_water = max(1, int(max_pending * high_water_ratio))
+        self.flush_interval_ms = flush_interval_ms
+        self.rotate_bytes = rotate_bytes
+        self.compresslevel = compresslevel
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        
+        self._pending: List[Tuple[Dict[str, Any], Optional[Dict], Any]] = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._raw = None  # Underlying file, for fsync
+        self._file: Optional[gzip.GzipFile] = None
+        self._file_bytes = 0
+        self._synced_bytes = 0  # Size of the file up to its last complete batch
+        self.current_file: Optional[str] = None
+        self.recorded = 0
+        self.dropped = 0
+        self.backpressure = 0
+        self.batches = 0
+        self.written = 0
+        self.bytes_written = 0
+        self.files = 0
+        self.write_errors = 0
+        self.lost = 0
+        self.last_batch_ms = 0.0
+    
+    def start(self):
+        """Start the writer thread (decisions recorded before start() are queued)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="fraud-audit-trail", daemon=True)
+            self._thread.start()
+    
+    def record(self, transaction: Dict[str, Any], context: Optional[Dict], assessment) -> bool:
+        """Queue a decision; False if the queue is full and it was dropped"""
+        with self._condition:
+            pending = len(self._pending)
+            if self._closed or pending >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending.append((transaction, context, assessment))
+            self.recorded += 1
+            if pending + 1 >= self.high_water:
+                self.backpressure += 1
+                self._condition.notify()
+        return True
+    
+    def flush(self):
+        """Write the queued decisions now (from the calling thread)"""
+        self._write_pending()
+    
+    def close(self):
+        """Write what is queued, stop the writer and close the current file"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        else:
+            self._write_pending(final=True)
+        self._close_file()
+    
+    def _run(self):
+        while True:
+            # record() only notifies past the high-water mark, so batches accumulate for one interval
+            with self._condition:
+                if not self._closed and len(self._pending) < self.high_water:
+                    self._condition.wait(self.flush_interval_ms / 1000)
+                closed = self._closed
+            self._write_pending(final=closed)
+            if closed:
+                return
+    
+    def _entry(self, transaction: Dict[str, Any], context: Optional[Dict], assessment) -> Dict[str, Any]:
+        return {
+            "decided_at": assessment.timestamp,
+            "transaction_id": transaction.get("transaction_id"),
+            "customer_id": transaction.get("customer_id"),
+            "transaction": transaction,
+            "customer_profile": (context or {}).get("customer_profile"),
+            "score": assessment.score,
+            "confidence": assessment.confidence,
+            "action": assessment.recommended_action,
+            "flags": assessment.flags,
+            "explanation": assessment.explanation,
+            "agent_scores": assessment.agent_scores,
+            "weights": {name: self.weights.get(name, 0.1) for name in assessment.agent_scores},
+            "timed_out_agents": assessment.timed_out_agents,
+            "skipped_agents": assessment.skipped_agents
+        }
+    
+    def _write_pending(self, final: bool = False):
+        """Write the queued decisions as one batch; a failed batch is queued again unless final"""
+        with self._condition:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            data = "".join(
+                json.dumps(self._entry(*item), default=_json_default, ensure_ascii=False) + "\n" for item in batch
+            ).encode()
+            if self._file is None or self._file_bytes >= self.rotate_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._file.flush(zlib.Z_SYNC_FLUSH)  # Readable up to here even if the process dies
+            self._raw.flush()
+            if self.fsync:
+                os.fsync(self._raw.fileno())
+            self._synced_bytes = self._raw.tell()
+            self._file_bytes += len(data)
+            self.bytes_written += len(data)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            print(f"Error writing audit batch ({len(batch)} decisions): {e}")
+            self.write_errors += 1
+            self._abandon_file()
+            if not final:
+                with self._condition:
+                    self._pending[:0] = batch
+                return
+            self.lost += len(batch)
+        self.last_batch_ms = (time.perf_counter() - started) * 1000
+    
+    def _rotate(self):
+        """Close the current file and start one named after the current time"""
+        self._close_file()
+        name = f"{FILE_PREFIX}{datetime.now().strftime('%Y%m%dT%H%M%S%f')}{FILE_SUFFIX}"
+        self.current_file = os.path.join(self.directory, name)
+        self._raw = open(self.current_file, "ab")
+        self._file = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=self.compresslevel)
+        self._file_bytes = self._synced_bytes = 0
+        self.files += 1
+    
+    def _abandon_file(self):
+        """Close the file after a failed write, cutting it back to its last complete batch"""
+        if self._raw is None:
+            return
+        path, size = self.current_file, self._synced_bytes
+        handles = [self._file, self._raw]
+        self._file = self._raw = None
+        for handle in handles:
+            try:
+                if handle is not None:
+                    handle.close()
+            except Exception as e:
+                print(f"Error closing audit file {path}: {e}")
+        try:
+            if size:
+                os.truncate(path, size)
+            else:
+                os.remove(path)
+        except OSError as e:
+            print(f"Error cutting audit file {path}: {e}")
+    
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._raw.close()
+            self._file = self._raw = None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "current_file": self.current_file,
+            "pending": len(self._pending),
+            "max_pending": self.max_pending,
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "backpressure": self.backpressure,
+            "batches": self.batches,
+            "bytes_written": self.bytes_written,
+            "files": self.files,
+            "write_errors": self.write_errors,
+            "lost": self.lost,
+            "last_batch_ms": self.last_batch_ms
+        }
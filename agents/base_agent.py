@@ -3,9 +3,12 @@ Base Agent Class for Cofidis Fraud Detection System
 """
 from abc import ABC, abstractmethod
 from typing import Dict, Any, List, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
+import asyncio
 import uuid
+from .metrics import AGENT_ERRORS, AGENT_LATENCY
+from .state_store import StateStore, StoreFactory, default_store_factory
 
 @dataclass
 class AgentMessage:
@@ -32,22 +35,32 @@ class RiskAssessment:
     recommended_action: str  # "APPROVE", "REVIEW", "BLOCK"
     timestamp: datetime
     agent_name: str
+    timed_out_agents: List[str] = field(default_factory=list)  # Agents dropped for missing their deadline
+    skipped_agents: List[str] = field(default_factory=list)  # Agents skipped once the decision was settled
+    agent_scores: Dict[str, float] = field(default_factory=dict)  # Score of each agent that answered, for the audit trail
 
 class BaseFraudAgent(ABC):
     """
     Base class for all fraud detection agents
     """
     
-    def __init__(self, name: str, description: str, version: str = "1.0"):
+    # Set on agents whose evaluate() blocks on I/O, so evaluate_async() keeps it off the event loop
+    blocking_io: bool = False
+    
+    def __init__(self, name: str, description: str, version: str = "1.0",
+                 store_factory: Optional[StoreFactory] = None):
         self.name = name
         self.description = description
         self.version = version
         self.message_bus = None
+        self.store_factory = store_factory or default_store_factory
+        self.state_stores: Dict[str, StateStore] = {}
         self.metrics = {
             "requests_processed": 0,
             "alerts_generated": 0,
             "avg_processing_time_ms": 0
         }
+        self.latency = AGENT_LATENCY.labels(name)
         
     @abstractmethod
     def evaluate(self, transaction: Dict[str, Any], context: Dict = None) -> RiskAssessment:
@@ -63,6 +76,70 @@ class BaseFraudAgent(ABC):
         """
         pass
     
+    async def evaluate_async(self, transaction: Dict[str, Any], context: Dict = None) -> RiskAssessment:
+        """
+        Awaitable version of evaluate()
+        
+        CPU-only agents are evaluated inline; agents flagged blocking_io run
+        evaluate() in a worker thread. Agents doing native async I/O (e.g. an
+        identity provider call) override this.
+        """
+        if self.blocking_io:
+            return await asyncio.to_thread(self.evaluate, transaction, context)
+        return self.evaluate(transaction, context)
+    
+    @property
+    def runs_inline(self) -> bool:
+        """True when evaluate_async() just calls evaluate(), so callers can skip the coroutine"""
+        return not self.blocking_io and type(self).evaluate_async is BaseFraudAgent.evaluate_async
+    
+    def evaluate_many(self, transactions: List[Dict[str, Any]],
+                      contexts: Optional[List[Dict]] = None) -> List[Optional[RiskAssessment]]:
+        """
+        Evaluate a batch of transactions in input order
+        
+        Args:
+            transactions: Transactions to evaluate
+            contexts: One context per transaction (None = no context)
+            
+        Returns:
+            One assessment per transaction, None where evaluation failed.
+            Override to amortise per-call work (lookups, rule maths) over the batch.
+        """
+        contexts = self._batch_contexts(transactions, contexts)
+        results = []
+        for transaction, context in zip(transactions, contexts):
+            try:
+                results.append(self.evaluate(transaction, context))
+            except Exception as e:
+                print(f"Error in agent {self.name}: {e}")
+                AGENT_ERRORS.inc(self.name)
+                results.append(None)
+        return results
+    
+    def _batch_contexts(self, transactions: List[Dict[str, Any]], contexts: Optional[List[Dict]]) -> List[Dict]:
+        """Validate batch contexts, defaulting to an empty context per transaction"""
+        if contexts is None:
+            return [{} for _ in transactions]
+        if len(contexts) != len(transactions):
+            raise ValueError(f"Got {len(contexts)} contexts for {len(transactions)} transactions")
+        return [context or {} for context in contexts]
+    
+    def score_upper_bound(self, transaction: Dict[str, Any], context: Dict = None) -> float:
+        """
+        Highest score evaluate() could return for this transaction
+        Used by the orchestrator to skip agents that cannot change the decision;
+        override when the agent's rules cap lower or depend on available data
+        """
+        return 100.0
+    
+    def update_state(self, transaction: Dict[str, Any], context: Dict = None):
+        """
+        Record the transaction in the agent's state without scoring it
+        Stateful agents override this so skipped evaluations keep baselines current
+        """
+        pass
+    
     def can_handle(self, transaction_type: str, context: Dict = None) -> float:
         """
         Returns confidence score (0.0-1.0) for handling this transaction type
@@ -108,20 +185,36 @@ class BaseFraudAgent(ABC):
             )
             self.message_bus.route_message(message)
     
+    def _create_state_store(self, namespace: str) -> StateStore:
+        """Create a bounded store for per-customer state (e.g. "customer_profiles")"""
+        store = self.store_factory(f"{self.name}.{namespace}")
+        self.state_stores[namespace] = store
+        return store
+    
     def get_info(self) -> Dict[str, Any]:
         """Get agent metadata"""
-        return {
+        info = {
             "name": self.name,
             "description": self.description,
             "version": self.version,
             "metrics": self.metrics,
             "status": "active"
         }
+        if self.latency.count:
+            info["latency"] = self.latency.summary()
+        if self.state_stores:
+            info["state"] = {namespace: store.stats() for namespace, store in self.state_stores.items()}
+        return info
+    
+    def record_latency(self, elapsed_ns: int, count: int = 1):
+        """Record a time.perf_counter_ns() duration covering count requests"""
+        self.latency.record(elapsed_ns // count, count)
+        self.update_metrics(elapsed_ns / count / 1e6, count)
     
-    def update_metrics(self, processing_time_ms: float):
-        """Update agent metrics"""
-        self.metrics["requests_processed"] += 1
+    def update_metrics(self, processing_time_ms: float, count: int = 1):
+        """Update agent metrics (processing_time_ms is the mean over count requests)"""
+        self.metrics["requests_processed"] += count
         # Update average processing time
         n = self.metrics["requests_processed"]
         old_avg = self.metrics["avg_processing_time_ms"]
-        self.metrics["avg_processing_time_ms"] = (old_avg * (n-1) + processing_time_ms) / n
+        self.metrics["avg_processing_time_ms"] = (old_avg * (n-count) + processing_time_ms * count) / n
@@ -2,10 +2,115 @@
 Behavioral Analysis Agent - Analyzes customer behavior patterns
 Detects deviations from established behavioral baselines
 """
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from datetime import datetime, timedelta
-from collections import defaultdict
+import time
+from array import array
+import math
+import zlib
 from .base_agent import BaseFraudAgent, RiskAssessment
+from .state_store import StoreFactory
+from .tracing import span
+from .transaction_monitor import DEFAULT_USUAL_HOURS_MASK
+
+PRIOR_AVG_AMOUNT = 100.0  # Baseline before the first transaction
+PRIOR_STD_AMOUNT = 30.0  # Used until MIN_AMOUNT_SAMPLES transactions are seen
+MIN_AMOUNT_SAMPLES = 5
+MIN_STD_RATIO = 0.1  # σ floor as a fraction of the average, so constant spenders still get z-scores
+MAX_MERCHANTS = 50
+MAX_DEVICES = 20
+MAX_LOCATIONS = 10
+
+
+def _key_hash(value: str) -> int:
+    """Stable 32-bit hash used for merchant and device sets"""
+    return zlib.crc32(value.encode("utf-8"))
+
+
+class CustomerProfile:
+    """
+    Compact behavioral baseline of one customer
+    
+    Amount statistics are kept with Welford's online algorithm, usual hours as
+    a 24-bit mask, recent locations as a flat array of (lat, lon) pairs, and
+    merchants/devices as bounded arrays of 32-bit hashes (oldest dropped
+    first). Membership checks scan at most MAX_MERCHANTS machine words.
+    """
+    
+    __slots__ = ("transaction_count", "mean_amount", "m2_amount", "hours_mask",
+                 "locations", "merchants", "devices", "created_at")
+    
+    def __init__(self):
+        self.transaction_count = 0
+        self.mean_amount = 0.0
+        self.m2_amount = 0.0  # Sum of squared deviations from the mean
+        self.hours_mask = DEFAULT_USUAL_HOURS_MASK
+        self.locations = array("d")  # lat0, lon0, lat1, lon1, ... oldest first
+        self.merchants = array("I")  # Merchant hashes, oldest first
+        self.devices = array("I")  # Device hashes, oldest first
+        self.created_at = datetime.now().timestamp()
+    
+    @property
+    def avg_amount(self) -> float:
+        return self.mean_amount if self.transaction_count else PRIOR_AVG_AMOUNT
+    
+    @property
+    def std_amount(self) -> float:
+        """Sample standard deviation, floored at MIN_STD_RATIO of the average"""
+        if self.transaction_count < MIN_AMOUNT_SAMPLES:
+            return PRIOR_STD_AMOUNT
+        std = math.sqrt(self.m2_amount / (self.transaction_count - 1))
+        return max(std, MIN_STD_RATIO * abs(self.mean_amount), 1.0)
+    
+    @property
+    def usual_hour_count(self) -> int:
+        return self.hours_mask.bit_count()
+    
+    def add_amount(self, amount: float):
+        self.transaction_count += 1
+        delta = amount - self.mean_amount
+        self.mean_amount += delta / self.transaction_count
+        self.m2_amount += delta * (amount - self.mean_amount)
+    
+    def add_hour(self, hour: int):
+        self.hours_mask |= 1 << hour
+    
+    def is_usual_hour(self, hour: int) -> bool:
+        return bool(self.hours_mask >> hour & 1)
+    
+    def add_location(self, lat: float, lon: float):
+        self.locations.append(lat)
+        self.locations.append(lon)
+        if len(self.locations) > 2 * MAX_LOCATIONS:
+            del self.locations[:2]
+    
+    def iter_locations(self) -> Iterator[Tuple[float, float]]:
+        return zip(self.locations[0::2], self.locations[1::2])
+    
+    @property
+    def location_count(self) -> int:
+        return len(self.locations) // 2
+    
+    def add_merchant(self, merchant: str):
+        self._add_bounded(self.merchants, _key_hash(merchant), MAX_MERCHANTS)
+    
+    def knows_merchant(self, merchant: str) -> bool:
+        return _key_hash(merchant) in self.merchants
+    
+    def add_device(self, device_id: str):
+        self._add_bounded(self.devices, _key_hash(device_id), MAX_DEVICES)
+    
+    def knows_device(self, device_id: str) -> bool:
+        return _key_hash(device_id) in self.devices
+    
+    @staticmethod
+    def _add_bounded(keys: array, key: int, limit: int):
+        if key in keys:
+            return
+        keys.append(key)
+        if len(keys) > limit:
+            del keys[0]
+
 
 class BehavioralAnalysisAgent(BaseFraudAgent):
     """
@@ -13,20 +118,21 @@ class BehavioralAnalysisAgent(BaseFraudAgent):
     Detects when behavior deviates from established baselines
     """
     
-    def __init__(self):
+    def __init__(self, store_factory: Optional[StoreFactory] = None):
         super().__init__(
             name="behavioral_analysis",
             description="Análise comportamental - deteta desvios do perfil normal do cliente",
-            version="1.0"
+            version="1.0",
+            store_factory=store_factory
         )
         # Customer behavior profiles cache
-        self.customer_profiles = {}
+        self.customer_profiles = self._create_state_store("customer_profiles")
         
     def evaluate(self, transaction: Dict[str, Any], context: Dict = None) -> RiskAssessment:
         """
         Evaluate transaction against customer's behavioral baseline
         """
-        start_time = datetime.now()
+        started = time.perf_counter_ns()
         flags = []
         score = 0.0
         
@@ -39,21 +145,24 @@ class BehavioralAnalysisAgent(BaseFraudAgent):
         
         # Check various behavioral aspects
         checks = [
-            ("amount", self._check_amount_deviation(transaction, profile)),
-            ("time", self._check_time_deviation(transaction, profile)),
-            ("location", self._check_location_deviation(transaction, profile)),
-            ("merchant", self._check_merchant_deviation(transaction, profile)),
-            ("frequency", self._check_frequency_deviation(transaction, profile)),
-            ("device", self._check_device_deviation(transaction, profile))
+            ("amount", self._check_amount_deviation),
+            ("time", self._check_time_deviation),
+            ("location", self._check_location_deviation),
+            ("merchant", self._check_merchant_deviation),
+            ("frequency", self._check_frequency_deviation),
+            ("device", self._check_device_deviation)
         ]
         
-        for check_name, (check_score, check_flags) in checks:
+        for check_name, check in checks:
+            with span(check_name):
+                check_score, check_flags = check(transaction, profile)
             if check_score > 0:
                 score += check_score
                 flags.extend(check_flags)
         
         # Update profile with new transaction
-        self._update_profile(customer_id, transaction)
+        with span("update_profile"):
+            self._update_profile(profile, transaction)
         
         # Determine action
         if score >= 60:
@@ -66,8 +175,7 @@ class BehavioralAnalysisAgent(BaseFraudAgent):
         # Cap score
         score = min(score, 100)
         
-        processing_time = (datetime.now() - start_time).total_seconds() * 1000
-        self.update_metrics(processing_time)
+        self.record_latency(time.perf_counter_ns() - started)
         
         return RiskAssessment(
             score=score,
@@ -79,60 +187,61 @@ class BehavioralAnalysisAgent(BaseFraudAgent):
             agent_name=self.name
         )
     
+    def score_upper_bound(self, transaction: Dict[str, Any], context: Dict = None) -> float:
+        """Sum of the behavioral check maxima (amount 25, time 20, location 20, merchant 5, device 10)"""
+        if not transaction.get("customer_id"):
+            return 0.0
+        return 80.0
+    
+    def update_state(self, transaction: Dict[str, Any], context: Dict = None):
+        """Update the behavioral baseline without scoring"""
+        customer_id = transaction.get("customer_id")
+        if not customer_id:
+            return
+        self._update_profile(self._get_customer_profile(customer_id), transaction)
+    
     def can_handle(self, transaction_type: str, context: Dict = None) -> float:
         """High confidence when customer profile exists"""
         if context and context.get("customer_profile"):
             return 0.9
         return 0.6
     
-    def _get_customer_profile(self, customer_id: str) -> Dict:
+    def _get_customer_profile(self, customer_id: str) -> CustomerProfile:
         """Get or create customer behavioral profile"""
-        if customer_id not in self.customer_profiles:
-            # Create default profile
-            self.customer_profiles[customer_id] = {
-                "avg_amount": 100.0,
-                "std_amount": 30.0,
-                "usual_hours": list(range(8, 23)),
-                "usual_locations": [],
-                "usual_merchants": [],
-                "transaction_count": 0,
-                "devices": [],
-                "created_at": datetime.now()
-            }
-        return self.customer_profiles[customer_id]
-    
-    def _update_profile(self, customer_id: str, transaction: Dict):
+        profile = self.customer_profiles.get(customer_id)
+        if profile is None:
+            profile = self.customer_profiles[customer_id] = CustomerProfile()
+        return profile
+    
+    def _update_profile(self, profile: CustomerProfile, transaction: Dict):
         """Update customer profile with new transaction data"""
-        profile = self.customer_profiles[customer_id]
         
-        # Update amount statistics (simple moving average)
-        amount = transaction.get("amount", 0)
-        n = profile["transaction_count"]
-        profile["avg_amount"] = (profile["avg_amount"] * n + amount) / (n + 1)
-        profile["transaction_count"] += 1
+        # Update amount statistics (Welford mean/variance)
+        profile.add_amount(transaction.get("amount", 0))
         
         # Update usual hours
-        hour = transaction.get("timestamp", datetime.now()).hour
-        if hour not in profile["usual_hours"]:
-            profile["usual_hours"].append(hour)
+        profile.add_hour(transaction.get("timestamp", datetime.now()).hour)
         
         # Update locations (keep last 10)
         location = transaction.get("location")
         if location:
-            profile["usual_locations"].append(location)
-            profile["usual_locations"] = profile["usual_locations"][-10:]
+            profile.add_location(location.get("lat", 0), location.get("lon", 0))
         
         # Update merchants (keep unique, max 50)
         merchant = transaction.get("merchant", "")
-        if merchant and merchant not in profile["usual_merchants"]:
-            profile["usual_merchants"].append(merchant)
-            profile["usual_merchants"] = profile["usual_merchants"][-50:]
+        if merchant:
+            profile.add_merchant(merchant)
+        
+        # Update known devices
+        device_id = transaction.get("device_id", "")
+        if device_id:
+            profile.add_device(device_id)
     
-    def _check_amount_deviation(self, transaction: Dict, profile: Dict) -> tuple:
+    def _check_amount_deviation(self, transaction: Dict, profile: CustomerProfile) -> tuple:
         """Check if transaction amount deviates from customer's norm"""
         amount = transaction.get("amount", 0)
-        avg = profile["avg_amount"]
-        std = profile["std_amount"]
+        avg = profile.avg_amount
+        std = profile.std_amount
         
         if avg == 0:
             return 0, []
@@ -149,36 +258,31 @@ class BehavioralAnalysisAgent(BaseFraudAgent):
         
         return 0, []
     
-    def _check_time_deviation(self, transaction: Dict, profile: Dict) -> tuple:
+    def _check_time_deviation(self, transaction: Dict, profile: CustomerProfile) -> tuple:
         """Check if transaction time is unusual for customer"""
         timestamp = transaction.get("timestamp", datetime.now())
         hour = timestamp.hour
         
-        usual_hours = profile.get("usual_hours", [])
-        
         # Very unusual hours (3am - 6am)
         if 3 <= hour <= 6:
             return 20, [f"TIME_DEVIATION: Transaction at {hour:02d}:00 (unusual hour)"]
         
         # If we have history and this hour is not in usual hours
-        if len(usual_hours) > 5 and hour not in usual_hours:
+        if profile.usual_hour_count > 5 and not profile.is_usual_hour(hour):
             return 10, [f"TIME_DEVIATION: {hour:02d}:00h not in customer's usual hours"]
         
         return 0, []
     
-    def _check_location_deviation(self, transaction: Dict, profile: Dict) -> tuple:
+    def _check_location_deviation(self, transaction: Dict, profile: CustomerProfile) -> tuple:
         """Check if location is unusual"""
         location = transaction.get("location")
-        usual_locations = profile.get("usual_locations", [])
         
-        if not location or len(usual_locations) < 3:
+        if not location or profile.location_count < 3:
             return 0, []
         
         # Calculate distance to nearest usual location
-        min_distance = float('inf')
-        for usual_loc in usual_locations:
-            dist = self._calculate_distance(location, usual_loc)
-            min_distance = min(min_distance, dist)
+        point = (location.get("lat", 0), location.get("lon", 0))
+        min_distance = min(self._calculate_distance(point, usual_loc) for usual_loc in profile.iter_locations())
         
         if min_distance > 500:  # > 500km from usual locations
             return 20, [f"LOCATION_DEVIATION: {min_distance:.0f}km from usual locations"]
@@ -187,47 +291,43 @@ class BehavioralAnalysisAgent(BaseFraudAgent):
         
         return 0, []
     
-    def _check_merchant_deviation(self, transaction: Dict, profile: Dict) -> tuple:
+    def _check_merchant_deviation(self, transaction: Dict, profile: CustomerProfile) -> tuple:
         """Check if merchant is new/unusual"""
         merchant = transaction.get("merchant", "")
-        usual_merchants = profile.get("usual_merchants", [])
         
-        if not merchant or len(usual_merchants) < 5:
+        if not merchant or len(profile.merchants) < 5:
             return 0, []
         
-        if merchant not in usual_merchants:
+        if not profile.knows_merchant(merchant):
             return 5, [f"NEW_MERCHANT: {merchant} (first time)"]
         
         return 0, []
     
-    def _check_frequency_deviation(self, transaction: Dict, profile: Dict) -> tuple:
+    def _check_frequency_deviation(self, transaction: Dict, profile: CustomerProfile) -> tuple:
         """Check if transaction frequency is unusual"""
         # This would check for sudden spikes in transaction frequency
         # Simplified implementation
         return 0, []
     
-    def _check_device_deviation(self, transaction: Dict, profile: Dict) -> tuple:
+    def _check_device_deviation(self, transaction: Dict, profile: CustomerProfile) -> tuple:
         """Check if device is new/unusual"""
         device_id = transaction.get("device_id", "")
-        known_devices = profile.get("devices", [])
         
-        if device_id and device_id not in known_devices:
-            if len(known_devices) > 0:  # If customer has known devices
+        if device_id and not profile.knows_device(device_id):
+            if profile.devices:  # If customer has known devices
                 return 10, ["NEW_DEVICE: Transaction from unrecognized device"]
         
         return 0, []
     
-    def _calculate_distance(self, loc1: Dict, loc2: Dict) -> float:
-        """Calculate distance between two coordinates (simplified)"""
-        lat1 = loc1.get("lat", 0)
-        lon1 = loc1.get("lon", 0)
-        lat2 = loc2.get("lat", 0)
-        lon2 = loc2.get("lon", 0)
+    def _calculate_distance(self, loc1: Tuple[float, float], loc2: Tuple[float, float]) -> float:
+        """Calculate distance between two (lat, lon) coordinates (simplified)"""
+        lat1, lon1 = loc1
+        lat2, lon2 = loc2
         
         # Simplified distance (not haversine, but sufficient for relative comparison)
         return abs(lat1 - lat2) * 111 + abs(lon1 - lon2) * 111
     
-    def _generate_explanation(self, flags: List[str], score: float, profile: Dict) -> str:
+    def _generate_explanation(self, flags: List[str], score: float, profile: CustomerProfile) -> str:
         """Generate human-readable explanation"""
         if not flags:
             return f"Comportamento dentro do padrão normal do cliente (score: {score:.1f})"
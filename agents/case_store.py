@@ -0,0 +1,310 @@
+"""
+Case Store - Fraud cases for investigation, in SQLite
+Assessments that end in REVIEW or BLOCK open a case. Cases are queued on
+the request path and inserted in batches by a writer thread; reads use
+indexes on status, customer and time, with keyset pagination so deep pages
+cost the same as the first one.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+import json
+import sqlite3
+import threading
+import time
+
+CASE_ACTIONS = ("REVIEW", "BLOCK")
+CASE_STATUSES = ("open", "investigating", "fraud", "legitimate")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fraud_cases (
+    case_id INTEGER PRIMARY KEY,
+    transaction_id TEXT NOT NULL UNIQUE,
+    customer_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    action TEXT NOT NULL,
+    risk_score REAL NOT NULL,
+    confidence REAL NOT NULL,
+    amount REAL,
+    currency TEXT,
+    merchant TEXT,
+    flags TEXT NOT NULL,
+    explanation TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+-- Every index ends in (created_at, case_id), the page order, so pages never need a sort
+CREATE INDEX IF NOT EXISTS fraud_cases_status ON fraud_cases (status, created_at);
+CREATE INDEX IF NOT EXISTS fraud_cases_customer ON fraud_cases (customer_id, created_at);
+CREATE INDEX IF NOT EXISTS fraud_cases_created ON fraud_cases (created_at);
+
+-- Per-status totals kept by triggers, so totals do not count millions of rows
+CREATE TABLE IF NOT EXISTS fraud_case_counts (
+    status TEXT PRIMARY KEY,
+    cases INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS fraud_cases_insert AFTER INSERT ON fraud_cases BEGIN
+    INSERT INTO fraud_case_counts (status, cases) VALUES (NEW.status, 1)
+    ON CONFLICT(status) DO UPDATE SET cases = cases + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS fraud_cases_status AFTER UPDATE OF status ON fraud_cases
+WHEN OLD.status != NEW.status BEGIN
+    UPDATE fraud_case_counts SET cases = cases - 1 WHERE status = OLD.status;
+    INSERT INTO fraud_case_counts (status, cases) VALUES (NEW.status, 1)
+    ON CONFLICT(status) DO UPDATE SET cases = cases + 1;
+END;
+"""
+COLUMNS = ("case_id, transaction_id, customer_id, status, action, risk_score, confidence, amount, "
+           "currency, merchant, flags, explanation, created_at, updated_at")
+INSERT = """
+INSERT OR IGNORE INTO fraud_cases (transaction_id, customer_id, status, action, risk_score, confidence,
+                                   amount, currency, merchant, flags, explanation, created_at, updated_at)
+VALUES (?, ?, 'open', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def utc_timestamp(value: datetime) -> str:
+    """Stored form of a time: UTC, fixed width, so text order is time order (naive values are local time)"""
+    return value.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+class CaseStore:
+    """
+    Write-behind store of fraud cases
+    
+    record() only queues the case (O(1), no I/O), so scoring latency does
+    not depend on how many cases exist; every flush_interval_ms the writer
+    thread inserts the queue with one executemany in one transaction.
+    Retried transactions are ignored by the UNIQUE transaction_id. Cases
+    still queued when the process dies are lost.
+    
+    Times are stored in UTC (utc_timestamp()), whatever the timezone of
+    the assessment or of the query's since/until.
+    
+    query() pages newest first, by (created_at, case_id). Each filter has an
+    index in that order, so a page is a range scan of one index; passing
+    the previous page's next_before seeks straight to where it ended.
+    offset is kept for small pages but has to skip the rows before it.
+    """
+    
+    def __init__(self, path: str, flush_interval_ms: float = 200.0, max_pending: int = 100_000):
+        """
+        Args:
+            path: SQLite database file (created if missing)
+            flush_interval_ms: How long the writer collects cases before inserting them
+            max_pending: Queued cases beyond which new cases are dropped (and counted)
+        """
+        self.path = path
+        self.flush_interval_ms = flush_interval_ms
+        self.max_pending = max_pending
+        
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.executescript(SCHEMA)
+        self._write_lock = threading.Lock()  # Batches and status updates share the writer connection
+        self._reader = self._connect()
+        self._read_lock = threading.Lock()
+        
+        self._pending: List[Tuple] = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.recorded = 0
+        self.dropped = 0
+        self.batches = 0
+        self.write_errors = 0
+        self.last_batch_ms = 0.0
+    
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit: the writer opens its own transactions; statements are cached per connection
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA busy_timeout=5000")
+        return connection
+    
+    def start(self):
+        """Start the writer thread (cases recorded before start() are queued)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="fraud-case-store", daemon=True)
+            self._thread.start()
+    
+    def close(self):
+        """Write what is queued, stop the writer and close the database"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        else:
+            self._write_pending()
+        self._writer.close()
+        self._reader.close()
+    
+    def record(self, transaction: Dict[str, Any], assessment) -> bool:
+        """Queue a case if the assessment needs one; False if not needed or dropped"""
+        if assessment.recommended_action not in CASE_ACTIONS:
+            return False
+        created_at = utc_timestamp(assessment.timestamp)
+        case = (
+            transaction.get("transaction_id"), transaction.get("customer_id"), assessment.recommended_action,
+            assessment.score, assessment.confidence, transaction.get("amount"), transaction.get("currency"),
+            transaction.get("merchant"), json.dumps(assessment.flags), assessment.explanation, created_at, created_at
+        )
+        with self._condition:
+            if self._closed or len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending.append(case)
+            self.recorded += 1
+        return True
+    
+    def flush(self):
+        """Insert the queued cases now (from the calling thread)"""
+        self._write_pending()
+    
+    def _run(self):
+        while True:
+            # record() does not notify, so cases accumulate for one interval
+            with self._condition:
+                if not self._closed:
+                    self._condition.wait(self.flush_interval_ms / 1000)
+                closed = self._closed
+            self._write_pending()
+            if closed:
+                return
+    
+    def _write_pending(self):
+        with self._condition:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        started = time.perf_counter()
+        with self._write_lock:
+            try:
+                self._writer.execute("BEGIN IMMEDIATE")
+                try:
+                    self._writer.executemany(INSERT, batch)
+                    self._writer.execute("COMMIT")
+                except Exception:
+                    self._writer.execute("ROLLBACK")
+                    raise
+                self.batches += 1
+            except Exception as e:
+                print(f"Error writing fraud cases ({len(batch)} cases): {e}")
+                self.write_errors += 1
+        self.last_batch_ms = (time.perf_counter() - started) * 1000
+    
+    def query(self, status: Optional[str] = "open", customer_id: Optional[str] = None,
+              since: Optional[datetime] = None, until: Optional[datetime] = None,
+              before: Optional[str] = None, limit: int = 50, offset: int = 0) -> Dict[str, Any]:
+        """
+        Page of cases, newest first
+        
+        Args:
+            status: Only cases in this status (None = any)
+            customer_id: Only this customer's cases
+            since / until: created_at range (inclusive / exclusive; naive times are local)
+            before: Keyset cursor, the next_before of the previous page
+            limit: Cases per page
+            offset: Rows skipped after the cursor (prefer before for deep pages)
+        
+        Returns:
+            cases, total (cases matching status/customer, ignoring the time
+            range and cursor; None for a time range without them) and
+            next_before (None on the last page)
+        
+        Raises:
+            ValueError: before is not a cursor returned by query()
+        """
+        conditions, params = [], []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if customer_id is not None:
+            conditions.append("customer_id = ?")
+            params.append(customer_id)
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(utc_timestamp(since))
+        if until is not None:
+            conditions.append("created_at < ?")
+            params.append(utc_timestamp(until))
+        if before is not None:
+            created_at, _, case_id = before.rpartition(",")
+            conditions.append("(created_at, case_id) < (?, ?)")
+            params.extend((created_at, int(case_id)))
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        sql = f"SELECT {COLUMNS} FROM fraud_cases {where}ORDER BY created_at DESC, case_id DESC LIMIT ? OFFSET ?"
+        
+        with self._read_lock:
+            rows = self._reader.execute(sql, params + [limit, offset]).fetchall()
+            total = self._total(status, customer_id) if since is None and until is None else None
+        
+        cases = [self._case(row) for row in rows]
+        return {
+            "cases": cases,
+            "total": total,
+            "next_before": f"{cases[-1]['created_at']},{cases[-1]['case_id']}" if len(cases) == limit else None
+        }
+    
+    def _total(self, status: Optional[str], customer_id: Optional[str]) -> int:
+        if customer_id is not None:
+            # One customer's cases: a short range of the customer index
+            if status is None:
+                return self._reader.execute("SELECT COUNT(*) FROM fraud_cases WHERE customer_id = ?",
+                                            (customer_id,)).fetchone()[0]
+            return self._reader.execute("SELECT COUNT(*) FROM fraud_cases WHERE customer_id = ? AND status = ?",
+                                        (customer_id, status)).fetchone()[0]
+        if status is None:
+            return self._reader.execute("SELECT COALESCE(SUM(cases), 0) FROM fraud_case_counts").fetchone()[0]
+        row = self._reader.execute("SELECT cases FROM fraud_case_counts WHERE status = ?", (status,)).fetchone()
+        return row[0] if row else 0
+    
+    def get(self, case_id: int) -> Optional[Dict[str, Any]]:
+        with self._read_lock:
+            row = self._reader.execute(f"SELECT {COLUMNS} FROM fraud_cases WHERE case_id = ?", (case_id,)).fetchone()
+        return self._case(row) if row else None
+    
+    def update_status(self, case_id: int, status: str) -> Optional[Dict[str, Any]]:
+        """
+        Move a case to another status; returns the updated case, None if unknown
+        
+        Raises:
+            ValueError: status is not one of CASE_STATUSES
+        """
+        if status not in CASE_STATUSES:
+            raise ValueError(f"Unknown case status {status!r}, expected one of {CASE_STATUSES}")
+        with self._write_lock:
+            self._writer.execute("UPDATE fraud_cases SET status = ?, updated_at = ? WHERE case_id = ?",
+                                 (status, utc_timestamp(datetime.now()), case_id))
+        return self.get(case_id)
+    
+    @staticmethod
+    def _case(row: Tuple) -> Dict[str, Any]:
+        return {
+            "case_id": row[0],
+            "transaction_id": row[1],
+            "customer_id": row[2],
+            "status": row[3],
+            "action": row[4],
+            "risk_score": row[5],
+            "confidence": row[6],
+            "amount": row[7],
+            "currency": row[8],
+            "merchant": row[9],
+            "flags": json.loads(row[10]),
+            "explanation": row[11],
+            "created_at": row[12],
+            "updated_at": row[13]
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "pending": len(self._pending),
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "write_errors": self.write_errors,
+            "last_batch_ms": self.last_batch_ms
+        }
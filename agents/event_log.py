@@ -0,0 +1,366 @@
+"""
+Event Log - Write-ahead log of scored transactions for rebuilding agent state
+Every scored transaction is appended to segment-rotated files by a writer
+thread that batches and fsyncs off the request path. Replaying the log tail
+after a snapshot (or the whole log) through the agents' update_state()
+rebuilds their histories without scoring anything.
+
+Usage (rebuild a snapshot offline from a snapshot plus the log, or split it
+to seed the shards of a new layout):
+    python -m agents.event_log /var/lib/fraud/events --snapshot state.bin --output state.bin
+    python -m agents.event_log /var/lib/fraud/events --snapshot state.bin --output state.bin.shard2 --shard 2 --shards 4
+"""
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import argparse
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+RECORD_HEADER = struct.Struct("<QII")  # LSN, payload length, payload crc32
+SEGMENT_SUFFIX = ".wal"
+
+
+def _segment_name(first_lsn: int) -> str:
+    return f"{first_lsn:020d}{SEGMENT_SUFFIX}"
+
+
+def list_segments(directory: str) -> List[Tuple[int, str]]:
+    """(first LSN, path) of every segment, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        (int(name[:-len(SEGMENT_SUFFIX)]), os.path.join(directory, name))
+        for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX)
+    )
+
+
+def _read_segment(path: str) -> Iterator[Tuple[int, bytes]]:
+    """(LSN, payload) of each complete record; stops at a torn or corrupt tail"""
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            lsn, length, checksum = RECORD_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                print(f"⚠️  Event log {path}: torn record at LSN {lsn}, ignoring the rest of the segment")
+                return
+            yield lsn, payload
+
+
+def read_events(directory: str, after_lsn: int = 0) -> Iterator[Tuple[int, Dict[str, Any], Dict, List[str]]]:
+    """
+    (LSN, transaction, context, agents that never saw it) for every event
+    with LSN > after_lsn, in log order
+    """
+    segments = list_segments(directory)
+    for i, (first_lsn, path) in enumerate(segments):
+        # Skip segments entirely covered by after_lsn
+        if i + 1 < len(segments) and segments[i + 1][0] <= after_lsn + 1:
+            continue
+        for lsn, payload in _read_segment(path):
+            if lsn > after_lsn:
+                transaction, context, not_run = pickle.loads(payload)
+                yield lsn, transaction, context, not_run
+
+
+def replay(events: Iterator[Tuple[int, Dict[str, Any], Dict, List[str]]], agents: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Feed events to the agents' update_state() (no scoring)
+    
+    Each agent records the events it saw when they were scored, so agents
+    short-circuited by a critical score or a deadline are left out again.
+    
+    Returns:
+        Events replayed and the last LSN
+    """
+    replayed = 0
+    last_lsn = None
+    for lsn, transaction, context, not_run in events:
+        for name, agent in agents.items():
+            if name in not_run:
+                continue
+            try:
+                agent.update_state(transaction, context)
+            except Exception as e:
+                print(f"Error updating state of agent {name}: {e}")
+        replayed += 1
+        last_lsn = lsn
+    return {"events": replayed, "last_lsn": last_lsn}
+
+
+class EventLog:
+    """
+    Append-only log of scored transactions
+    
+    append() only queues the event (O(1), no I/O). A writer thread pickles
+    queued events every flush_interval_ms, writes them as one batch and
+    fsyncs, so an event is durable within about one interval of being
+    scored; events still queued when the process dies are lost. Segments
+    are rotated at segment_bytes and named after their first LSN;
+    truncate() drops segments already covered by a snapshot. Readers stop
+    at a torn record, so nothing is ever appended after one: a torn tail is
+    cut off on open, and a failed write is cut off and retried in a new
+    segment at the next interval. The events are already applied to the
+    agents' state, so they are only given up on close; those, and appends
+    dropped when the queue is full, are counted in unlogged.
+    """
+    
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024,
+                 flush_interval_ms: float = 10.0, max_pending: int = 100_000, fsync: bool = True):
+        """
+        Args:
+            directory: Segment directory (created if missing)
+            segment_bytes: Size at which the current segment is closed
+            flush_interval_ms: How long the writer waits to collect a batch
+            max_pending: Queued events beyond which appends are dropped (and counted)
+            fsync: fsync every batch (off: data survives a process crash, not a host crash)
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.flush_interval_ms = flush_interval_ms
+        self.max_pending = max_pending
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        
+        # Continue numbering after the last complete record on disk
+        self.last_lsn = 0
+        segments = list_segments(directory)
+        if segments:
+            last_segment = segments[-1][1]
+            self.last_lsn = segments[-1][0] - 1
+            valid_bytes = 0
+            for lsn, payload in _read_segment(last_segment):
+                self.last_lsn = lsn
+                valid_bytes += RECORD_HEADER.size + len(payload)
+            if os.path.getsize(last_segment) > valid_bytes:
+                os.truncate(last_segment, valid_bytes)
+        self.durable_lsn = self.last_lsn
+        self._processed_lsn = self.last_lsn  # Written or given up
+        
+        self._pending: List[Tuple[int, Dict[str, Any], Dict, Sequence[str]]] = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._file = None
+        self._file_size = 0
+        self._thread: Optional[threading.Thread] = None
+        self.appended = 0
+        self.dropped = 0
+        self.batches = 0
+        self.bytes_written = 0
+        self.write_errors = 0
+        self.unlogged = 0  # Events applied in memory that never reached the log (missing on replay)
+        self.last_batch_ms = 0.0
+    
+    def start(self):
+        """Start the writer thread (appends before start() are queued)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="fraud-event-log", daemon=True)
+            self._thread.start()
+    
+    def append(self, transaction: Dict[str, Any], context: Dict, not_run: Sequence[str] = ()) -> Optional[int]:
+        """Queue a scored transaction; returns its LSN, or None if dropped"""
+        with self._condition:
+            if self._closed or len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                self.unlogged += 1
+                return None
+            self.last_lsn += 1
+            self._pending.append((self.last_lsn, transaction, context, tuple(not_run)))
+            self.appended += 1
+            return self.last_lsn
+    
+    def position(self) -> int:
+        """LSN of the last appended event (durable once the writer catches up)"""
+        return self.last_lsn
+    
+    def advance_to(self, lsn: int):
+        """Number new events after lsn (e.g. a restored snapshot's position, if the log was lost)"""
+        with self._condition:
+            if lsn > self.last_lsn:
+                self.last_lsn = self.durable_lsn = self._processed_lsn = lsn
+    
+    def replay_into(self, agents: Dict[str, Any], after_lsn: int = 0) -> Dict[str, Any]:
+        """
+        Rebuild agent state from the events after after_lsn; call before start()
+        
+        New events are numbered after after_lsn even if the log no longer
+        reaches that far.
+        """
+        started = time.perf_counter()
+        self.advance_to(after_lsn)
+        result = replay(read_events(self.directory, after_lsn), agents)
+        if result["events"]:
+            print(f"🔁 Replayed {result['events']} events from {self.directory} "
+                  f"in {(time.perf_counter() - started) * 1000:.0f}ms")
+        return result
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the writer has handled everything appended so far; False on timeout"""
+        target = self.last_lsn
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._condition.notify_all()
+            while self._processed_lsn < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+    
+    def close(self):
+        """Write what is queued and stop the writer"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        else:
+            self._write_pending(final=True)
+        self._close_segment()
+    
+    def truncate(self, upto_lsn: int) -> int:
+        """Delete segments whose events all have LSN <= upto_lsn; returns segments deleted"""
+        segments = list_segments(self.directory)
+        deleted = 0
+        # The newest segment is kept: it may be open for writing
+        for (first_lsn, path), (next_first_lsn, _) in zip(segments, segments[1:]):
+            if next_first_lsn - 1 > upto_lsn:
+                break
+            os.remove(path)
+            deleted += 1
+        return deleted
+    
+    def _run(self):
+        while True:
+            # append() does not notify, so a batch accumulates for one interval
+            with self._condition:
+                if not self._closed:
+                    self._condition.wait(self.flush_interval_ms / 1000)
+                closed = self._closed
+            self._write_pending(final=closed)
+            if closed:
+                return
+    
+    def _write_pending(self, final: bool = False):
+        """Write the queued events as one batch; a failed batch is queued again unless final"""
+        with self._condition:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            chunks = []
+            for lsn, transaction, context, not_run in batch:
+                payload = pickle.dumps((transaction, context, list(not_run)), protocol=pickle.HIGHEST_PROTOCOL)
+                chunks.append(RECORD_HEADER.pack(lsn, len(payload), zlib.crc32(payload)))
+                chunks.append(payload)
+            data = b"".join(chunks)
+            if self._file is None or self._file_size >= self.segment_bytes:
+                self._rotate(batch[0][0])
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._file_size += len(data)
+            self.bytes_written += len(data)
+            self.batches += 1
+            self.durable_lsn = batch[-1][0]
+        except Exception as e:
+            print(f"Error writing event log batch ({len(batch)} events): {e}")
+            self.write_errors += 1
+            self._abandon_segment()
+            if not final:
+                with self._condition:
+                    self._pending[:0] = batch
+                return
+            self.unlogged += len(batch)
+        self.last_batch_ms = (time.perf_counter() - started) * 1000
+        with self._condition:
+            self._processed_lsn = batch[-1][0]
+            self._condition.notify_all()
+    
+    def _rotate(self, first_lsn: int):
+        """Close the current segment and start one named after first_lsn"""
+        self._close_segment()
+        self._file = open(os.path.join(self.directory, _segment_name(first_lsn)), "ab")
+        self._file_size = self._file.tell()
+    
+    def _abandon_segment(self):
+        """Close the segment after a failed write, cutting off the partial record it may end in"""
+        if self._file is None:
+            return
+        path, size = self._file.name, self._file_size
+        self._close_segment()
+        try:
+            os.truncate(path, size)
+        except OSError as e:
+            print(f"Error truncating event log segment {path}: {e}")
+    
+    def _close_segment(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError as e:
+                print(f"Error closing event log segment: {e}")
+            self._file = None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "last_lsn": self.last_lsn,
+            "durable_lsn": self.durable_lsn,
+            "pending": len(self._pending),
+            "appended": self.appended,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "bytes_written": self.bytes_written,
+            "write_errors": self.write_errors,
+            "unlogged": self.unlogged,
+            "last_batch_ms": self.last_batch_ms,
+            "segments": len(list_segments(self.directory))
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild agent state from a snapshot plus the event log")
+    parser.add_argument("log_dir", help="Event log directory")
+    parser.add_argument("--snapshot", help="Snapshot to start from (default: empty state, whole log)")
+    parser.add_argument("--output", required=True, help="Snapshot file to write")
+    parser.add_argument("--shard", type=int, default=0, help="Keep only customers routed to this shard")
+    parser.add_argument("--shards", type=int, default=1, help="Shard count the output is for")
+    parser.add_argument("--state-max-entries", type=int, default=int(os.getenv("STATE_MAX_ENTRIES", "100000")))
+    args = parser.parse_args()
+    
+    from .pipeline import build_orchestrator
+    from .sharding import shard_for
+    from .snapshot import load_snapshot, write_snapshot
+    
+    orchestrator = build_orchestrator(state_max_entries=args.state_max_entries)
+    after_lsn = 0
+    if args.snapshot:
+        restored = load_snapshot(args.snapshot, orchestrator.agents)
+        after_lsn = restored["wal_lsn"] or 0
+        print(f"💾 Restored {restored['entries']} entries from {args.snapshot} (event log position {after_lsn})")
+    
+    started = time.perf_counter()
+    events = read_events(args.log_dir, after_lsn)
+    if args.shards > 1:
+        events = (event for event in events if shard_for(event[1].get("customer_id"), args.shards) == args.shard)
+    result = replay(events, orchestrator.agents)
+    print(f"🔁 Replayed {result['events']} events in {time.perf_counter() - started:.1f}s")
+    
+    # A resharded output is for a shard with its own (new) event log, so it
+    # carries no position in this one
+    wal_lsn = None if args.shards > 1 else (result["last_lsn"] or after_lsn)
+    written = write_snapshot(args.output, orchestrator.agents, {"shard": args.shard, "shards": args.shards}, wal_lsn)
+    print(f"💾 Wrote {written['entries']} entries ({written['bytes']} bytes) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Execution Planner - Cost-aware agent ordering for the Risk Orchestrator
+Orders agents by expected impact per millisecond and decides when the
+remaining agents can no longer change the final decision
+"""
+from typing import Dict, Any, List, Tuple, Optional
+
+
+class ExecutionPlanner:
+    """
+    Tracks measured agent cost and score history, orders agents so the
+    decision settles as early as possible, and bounds the final weighted score
+    """
+    
+    def __init__(self, review_threshold: float = 45, block_threshold: float = 75,
+                 critical_score: float = 90, smoothing: float = 0.1):
+        """
+        Args:
+            review_threshold: Aggregated score from which the action is REVIEW
+            block_threshold: Aggregated score from which the action is BLOCK
+            critical_score: Single-agent score that short-circuits to BLOCK
+            smoothing: EWMA factor for cost and score statistics
+        """
+        self.review_threshold = review_threshold
+        self.block_threshold = block_threshold
+        self.critical_score = critical_score
+        self.smoothing = smoothing
+        self.stats = {}  # agent_name -> {"cost_ms": ewma, "score": ewma, "samples": n}
+    
+    def record(self, agent_name: str, cost_ms: float, score: float):
+        """Record one agent run"""
+        stats = self.stats.get(agent_name)
+        if stats is None:
+            self.stats[agent_name] = {"cost_ms": cost_ms, "score": score, "samples": 1}
+            return
+        
+        alpha = self.smoothing
+        stats["cost_ms"] += alpha * (cost_ms - stats["cost_ms"])
+        stats["score"] += alpha * (score - stats["score"])
+        stats["samples"] += 1
+    
+    def plan(self, agents: Dict[str, Any], weights: Dict[str, float],
+             transaction: Dict[str, Any], context: Dict) -> List[Tuple[str, float]]:
+        """
+        Order agents for this transaction
+        
+        Agents never measured run first (in registration order) so every agent
+        gets a cost estimate. The rest are ordered by weighted expected score
+        per millisecond, where the expected score mixes the observed average
+        with a fraction of the agent's upper bound for this transaction.
+        
+        Returns:
+            List of (agent_name, score_upper_bound) in execution order
+        """
+        bounds = {
+            name: agent.score_upper_bound(transaction, context)
+            for name, agent in agents.items()
+        }
+        return [(name, bounds[name]) for name in self._order(agents, weights, bounds)]
+    
+    def plan_many(self, agents: Dict[str, Any], weights: Dict[str, float],
+                  transactions: List[Dict[str, Any]], contexts: List[Dict]) -> Tuple[List[str], List[Dict[str, float]]]:
+        """
+        Order agents once for a whole batch
+        
+        Returns:
+            (execution order, per-transaction agent_name -> score upper bound);
+            the order uses each agent's mean bound over the batch
+        """
+        bounds = [
+            {name: agent.score_upper_bound(transaction, context) for name, agent in agents.items()}
+            for transaction, context in zip(transactions, contexts)
+        ]
+        mean_bounds = {
+            name: sum(txn_bounds[name] for txn_bounds in bounds) / max(len(bounds), 1)
+            for name in agents
+        }
+        return self._order(agents, weights, mean_bounds), bounds
+    
+    def _order(self, agents: Dict[str, Any], weights: Dict[str, float], bounds: Dict[str, float]) -> List[str]:
+        """Sort agents by priority, unmeasured agents first in registration order"""
+        def priority(name: str) -> float:
+            stats = self.stats.get(name)
+            if stats is None:
+                return float("inf")
+            impact = weights.get(name, 0.1) * (stats["score"] + 0.1 * bounds[name])
+            return impact / max(stats["cost_ms"], 0.001)
+        
+        return sorted(agents, key=priority, reverse=True)
+    
+    def score_bounds(self, scores: Dict[str, float], remaining: Dict[str, float],
+                     weights: Dict[str, float]) -> Tuple[float, float]:
+        """
+        Lower and upper bound of the final weighted score
+        
+        Args:
+            scores: agent_name -> score for agents that already answered
+            remaining: agent_name -> score upper bound for agents still to answer
+            weights: Aggregation weights (missing agents weigh 0.1)
+        
+        Remaining agents may also drop out (error or timeout), so both bounds
+        consider any subset of them answering.
+        """
+        total_score = sum(score * weights.get(name, 0.1) for name, score in scores.items())
+        total_weight = sum(weights.get(name, 0.1) for name in scores)
+        remaining_weight = sum(weights.get(name, 0.1) for name in remaining)
+        
+        # Every remaining agent answering 0 gives the lowest average
+        if total_weight + remaining_weight == 0:
+            lower = 0.0
+        else:
+            lower = total_score / (total_weight + remaining_weight)
+        
+        # Highest average: add agents whose bound still raises it, highest first
+        upper = total_score / total_weight if total_weight else 0.0
+        for name, bound in sorted(remaining.items(), key=lambda item: item[1], reverse=True):
+            if bound <= upper:
+                break
+            total_score += bound * weights.get(name, 0.1)
+            total_weight += weights.get(name, 0.1)
+            upper = total_score / total_weight
+        
+        return min(lower, 100.0), min(upper, 100.0)
+    
+    def settled_action(self, scores: Dict[str, float], remaining: Dict[str, float],
+                       weights: Dict[str, float]) -> Optional[str]:
+        """
+        Return the final action if the remaining agents can no longer change it
+        
+        A remaining agent able to reach the critical score could still force
+        BLOCK, so anything short of BLOCK stays open while one exists.
+        """
+        lower, upper = self.score_bounds(scores, remaining, weights)
+        action = self.decide(lower)
+        if action != self.decide(upper):
+            return None
+        if action != "BLOCK" and any(bound >= self.critical_score for bound in remaining.values()):
+            return None
+        return action
+    
+    def decide(self, score: float) -> str:
+        """Map an aggregated score to an action"""
+        if score >= self.block_threshold:
+            return "BLOCK"
+        elif score >= self.review_threshold:
+            return "REVIEW"
+        return "APPROVE"
+    
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """Measured cost and score per agent"""
+        return {name: dict(stats) for name, stats in self.stats.items()}
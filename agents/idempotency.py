@@ -0,0 +1,119 @@
+"""
+Idempotency Cache - Replays assessments for retried transactions
+Bounded TTL cache keyed by (customer_id, transaction_id), plus in-flight
+tracking so a retry arriving while the original is still being scored waits
+for that result. Only an exact retry (same fields) is replayed.
+"""
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import json
+from .base_agent import RiskAssessment
+from .state_store import LRUStateStore
+
+IdempotencyKey = Tuple[str, str]  # (customer_id, transaction_id)
+
+
+def transaction_digest(transaction: Dict[str, Any]) -> str:
+    """Digest of every field of a transaction (amount, merchant, location, timestamp, ...)"""
+    encoded = json.dumps(transaction, sort_keys=True, default=str, ensure_ascii=False).encode()
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+class IdempotencyCache:
+    """
+    Recent assessments by (customer_id, transaction_id)
+    
+    A retried transaction gets the original assessment back without running
+    the agents again, so agent state (velocity windows, profiles) records
+    each transaction once. Each entry keeps the digest of the transaction it
+    scored: a "retry" with other fields (say, a new amount or merchant under
+    a known transaction_id) is a conflict, counted and scored as new, so a
+    reused ID never inherits an earlier approval.
+    
+    Only evaluate_async() joins an evaluation still in flight; concurrent
+    synchronous evaluate() calls for the same transaction are each scored.
+    """
+    
+    def __init__(self, max_entries: int = 100_000, ttl_seconds: float = 300.0):
+        """
+        Args:
+            max_entries: Assessments kept (least recently used evicted first)
+            ttl_seconds: How long an assessment stays replayable without being requested again
+        """
+        self.store = LRUStateStore("risk_orchestrator.idempotency", max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.in_flight: Dict[IdempotencyKey, Tuple[str, asyncio.Future]] = {}
+        self.hits = 0  # Replayed from the cache
+        self.misses = 0  # Scored and stored
+        self.conflicts = 0  # Known IDs sent with different fields, scored as new
+        self.in_flight_joins = 0  # Retries that waited for the original evaluation
+        self.batch_duplicates = 0  # Repeated transactions within one batch
+    
+    def lookup(self, key: IdempotencyKey, digest: str) -> Optional[RiskAssessment]:
+        """Return the stored assessment for key if it was for the same transaction (digest)"""
+        entry = self.store.get(key)
+        if entry is None:
+            return None
+        if entry[0] != digest:
+            self.conflicts += 1
+            return None
+        self.hits += 1
+        return entry[1]
+    
+    def remember(self, key: IdempotencyKey, digest: str, assessment: RiskAssessment):
+        """Store the assessment of a newly scored transaction"""
+        self.misses += 1
+        self.store[key] = (digest, assessment)
+    
+    def pending(self, key: IdempotencyKey, digest: str) -> Optional[asyncio.Future]:
+        """Future of an evaluation of the same transaction still in progress (async path only)"""
+        entry = self.in_flight.get(key)
+        if entry is None or entry[0] != digest:
+            return None
+        self.in_flight_joins += 1
+        return entry[1]
+    
+    def begin(self, key: IdempotencyKey, digest: str) -> Optional[asyncio.Future]:
+        """Mark key as being evaluated; None if another version of it already is (a conflict)"""
+        if key in self.in_flight:
+            self.conflicts += 1
+            return None
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = (digest, future)
+        return future
+    
+    def finish(self, key: IdempotencyKey, digest: str, future: Optional[asyncio.Future],
+               assessment: Optional[RiskAssessment] = None, error: Optional[BaseException] = None):
+        """Resolve waiting retries and store the assessment"""
+        if future is None:
+            if error is None:
+                self.remember(key, digest, assessment)
+            return
+        del self.in_flight[key]
+        if isinstance(error, asyncio.CancelledError):
+            future.cancel()
+            return
+        if error is not None:
+            future.set_exception(error)
+            future.exception()  # Retrieved here so an unjoined failure is not logged again
+            return
+        self.remember(key, digest, assessment)
+        future.set_result(assessment)
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        store_stats = self.store.stats()
+        return {
+            "entries": store_stats["entries"],
+            "max_entries": store_stats["max_entries"],
+            "ttl_seconds": store_stats["ttl_seconds"],
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "conflicts": self.conflicts,
+            "in_flight": len(self.in_flight),
+            "in_flight_joins": self.in_flight_joins,
+            "batch_duplicates": self.batch_duplicates,
+            "evictions": store_stats["evictions"],
+            "expirations": store_stats["expirations"]
+        }
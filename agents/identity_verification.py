@@ -3,6 +3,7 @@ Identity Verification Agent - Advanced KYC and Identity Fraud Detection
 """
 from typing import Dict, Any, List
 from datetime import datetime
+import time
 from .base_agent import BaseFraudAgent, RiskAssessment
 import hashlib
 
@@ -20,7 +21,7 @@ class IdentityVerificationAgent(BaseFraudAgent):
         
     def evaluate(self, transaction: Dict[str, Any], context: Dict = None) -> RiskAssessment:
         """Evaluate identity risk"""
-        start_time = datetime.now()
+        started = time.perf_counter_ns()
         flags = []
         score = 0.0
         
@@ -79,8 +80,7 @@ class IdentityVerificationAgent(BaseFraudAgent):
         else:
             action = "APPROVE"
         
-        processing_time = (datetime.now() - start_time).total_seconds() * 1000
-        self.update_metrics(processing_time)
+        self.record_latency(time.perf_counter_ns() - started)
         
         return RiskAssessment(
             score=score,
@@ -91,3 +91,8 @@ class IdentityVerificationAgent(BaseFraudAgent):
             timestamp=datetime.now(),
             agent_name=self.name
         )
+    
+    def score_upper_bound(self, transaction: Dict[str, Any], context: Dict = None) -> float:
+        """Without identity data the agent always scores 0"""
+        identity_data = context.get("identity_data", {}) if context else {}
+        return 100.0 if identity_data else 0.0
@@ -0,0 +1,247 @@
+"""
+Metrics - Latency histograms and counters with Prometheus text exposition
+HDR-style log-linear buckets over time.perf_counter_ns() durations; recording
+is a few integer operations and a list increment, without locks
+"""
+from typing import Dict, List, Sequence, Tuple
+
+SUB_BUCKET_BITS = 4  # 16 buckets per power of two: values are kept to within 1/16 (~6%)
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+MAX_TRACKED_NS = 1 << 40  # ~18 minutes; longer durations land in the last bucket
+BUCKET_COUNT = (MAX_TRACKED_NS.bit_length() - SUB_BUCKET_BITS) * SUB_BUCKETS
+
+# Cumulative "le" bounds exposed to Prometheus (seconds)
+EXPORT_BOUNDS_SECONDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                         0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+EXPORT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def bucket_index(value_ns: int) -> int:
+    """Histogram bucket of a duration: exact below 32ns, then 16 per power of two"""
+    if value_ns < 2 * SUB_BUCKETS:
+        return max(value_ns, 0)
+    if value_ns >= MAX_TRACKED_NS:
+        return BUCKET_COUNT - 1
+    shift = value_ns.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + (value_ns >> shift) - SUB_BUCKETS
+
+
+def bucket_upper_ns(index: int) -> int:
+    """Highest duration that falls in bucket index"""
+    if index < 2 * SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    return ((index % SUB_BUCKETS + SUB_BUCKETS + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """
+    Fixed-size log-linear histogram of nanosecond durations
+    
+    Memory is BUCKET_COUNT integers regardless of traffic. Updates are not
+    locked: concurrent threads may very rarely lose an increment, which is
+    acceptable for monitoring and keeps the hot path cheap.
+    """
+    
+    __slots__ = ("counts", "count", "sum_ns", "max_ns")
+    
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.sum_ns = 0
+        self.max_ns = 0
+    
+    def record(self, elapsed_ns: int, count: int = 1):
+        """Record count durations of elapsed_ns each"""
+        # bucket_index(), inlined for the hot path
+        if elapsed_ns < 2 * SUB_BUCKETS:
+            index = elapsed_ns if elapsed_ns > 0 else 0
+        elif elapsed_ns < MAX_TRACKED_NS:
+            shift = elapsed_ns.bit_length() - SUB_BUCKET_BITS - 1
+            index = (shift + 1) * SUB_BUCKETS + (elapsed_ns >> shift) - SUB_BUCKETS
+        else:
+            index = BUCKET_COUNT - 1
+        self.counts[index] += count
+        self.count += count
+        self.sum_ns += elapsed_ns * count
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+    
+    def percentile(self, quantile: float) -> int:
+        """Duration (ns) at or below which the given fraction of records fall"""
+        counts = list(self.counts)
+        total = sum(counts)
+        if not total:
+            return 0
+        rank = max(quantile * total, 1)
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(bucket_upper_ns(index), self.max_ns)
+        return self.max_ns
+    
+    def cumulative_counts(self, bounds_ns: Sequence[int]) -> List[int]:
+        """Records in buckets lying entirely at or below each bound (ascending bounds)"""
+        counts = list(self.counts)
+        result = []
+        seen = 0
+        index = 0
+        for bound in bounds_ns:
+            while index < BUCKET_COUNT and bucket_upper_ns(index) <= bound:
+                seen += counts[index]
+                index += 1
+            result.append(seen)
+        return result
+    
+    def summary(self) -> Dict[str, float]:
+        """Count, mean and tail percentiles in milliseconds"""
+        return {
+            "count": self.count,
+            "mean_ms": self.sum_ns / self.count / 1e6 if self.count else 0.0,
+            "p50_ms": self.percentile(0.5) / 1e6,
+            "p90_ms": self.percentile(0.9) / 1e6,
+            "p99_ms": self.percentile(0.99) / 1e6,
+            "p999_ms": self.percentile(0.999) / 1e6,
+            "max_ms": self.max_ns / 1e6
+        }
+
+
+class _Metric:
+    """A named metric family with one child per label value combination"""
+    
+    kind = ""
+    
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.children: Dict[Tuple[str, ...], object] = {}
+    
+    def _label_text(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(_Metric):
+    """Monotonic counters keyed by label values"""
+    
+    kind = "counter"
+    
+    def inc(self, *label_values: str, amount: float = 1):
+        self.children[label_values] = self.children.get(label_values, 0) + amount
+    
+    def value(self, *label_values: str) -> float:
+        return self.children.get(label_values, 0)
+    
+    def render(self) -> List[str]:
+        return [f"{self.name}{self._label_text(values)} {_number(value)}"
+                for values, value in list(self.children.items())]
+
+
+class Histogram(_Metric):
+    """Latency histograms keyed by label values, exported in seconds"""
+    
+    kind = "histogram"
+    
+    def labels(self, *label_values: str) -> LatencyHistogram:
+        """Child histogram for these labels; keep it to record without a lookup"""
+        histogram = self.children.get(label_values)
+        if histogram is None:
+            histogram = self.children.setdefault(label_values, LatencyHistogram())
+        return histogram
+    
+    def render(self) -> List[str]:
+        bounds_ns = [int(bound * 1e9) for bound in EXPORT_BOUNDS_SECONDS]
+        lines = []
+        for values, histogram in list(self.children.items()):
+            count = histogram.count
+            for bound, cumulative in zip(EXPORT_BOUNDS_SECONDS, histogram.cumulative_counts(bounds_ns)):
+                labels = self._label_text(values, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = self._label_text(values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{self._label_text(values)} {_number(histogram.sum_ns / 1e9)}")
+            lines.append(f"{self.name}_count{self._label_text(values)} {count}")
+        return lines
+    
+    def render_quantiles(self) -> List[str]:
+        """Exact-to-bucket percentiles as a companion gauge family"""
+        lines = []
+        for values, histogram in list(self.children.items()):
+            if not histogram.count:
+                continue
+            for quantile in EXPORT_QUANTILES:
+                seconds = histogram.percentile(quantile) / 1e9
+                labels = self._label_text(values, 'quantile="%s"' % quantile)
+                lines.append(f"{self.name}_quantile{labels} {_number(seconds)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Metric families rendered together in Prometheus text format"""
+    
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+    
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, label_names))
+    
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Histogram:
+        return self._register(Histogram(name, help_text, label_names))
+    
+    def _register(self, metric: _Metric):
+        existing = self.metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric) or existing.label_names != metric.label_names:
+                raise ValueError(f"Metric {metric.name} already registered with a different type or labels")
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+    
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+            if isinstance(metric, Histogram):
+                lines.append(f"# HELP {metric.name}_quantile {metric.help_text} (percentiles)")
+                lines.append(f"# TYPE {metric.name}_quantile gauge")
+                lines.extend(metric.render_quantiles())
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def flag_code(flag: str) -> str:
+    """Stable flag name for labels ("HIGH_AMOUNT: €1500 ..." -> "HIGH_AMOUNT")"""
+    return flag.split(":", 1)[0].strip()
+
+
+# Process-wide registry and the fraud pipeline's metric families
+registry = MetricsRegistry()
+
+AGENT_LATENCY = registry.histogram(
+    "fraud_agent_latency_seconds", "Evaluation latency per transaction by agent (risk_orchestrator = full decision)", ["agent"])
+AGENT_ERRORS = registry.counter(
+    "fraud_agent_errors_total", "Agent evaluations that raised", ["agent"])
+AGENT_TIMEOUTS = registry.counter(
+    "fraud_agent_timeouts_total", "Agent results dropped for missing their deadline", ["agent"])
+AGENT_SKIPS = registry.counter(
+    "fraud_agent_skips_total", "Agents skipped once the decision was settled", ["agent"])
+DECISIONS = registry.counter(
+    "fraud_decisions_total", "Final decisions by action", ["action"])
+FLAGS = registry.counter(
+    "fraud_flags_total", "Risk flags raised in final decisions", ["flag"])
+SHORT_CIRCUITS = registry.counter(
+    "fraud_short_circuits_total", "Decisions short-circuited to BLOCK by a critical agent score", ["agent"])
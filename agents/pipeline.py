@@ -0,0 +1,115 @@
+"""
+Pipeline - Builds the standard orchestrator and agent set, and wires up
+the persistence of their state (snapshots, event log)
+Importable without side effects, so shard worker processes can build their
+own copy of the pipeline from the same settings as the gateway
+"""
+from typing import Dict, Optional
+from functools import partial
+from .risk_orchestrator import RiskOrchestrator
+from .transaction_monitor import TransactionMonitorAgent
+from .behavioral_analysis import BehavioralAnalysisAgent
+from .identity_verification import IdentityVerificationAgent
+from .state_store import LRUStateStore
+from .snapshot import SnapshotManager
+from .event_log import EventLog
+
+
+def build_orchestrator(execution_mode: str = "sequential",
+                       request_budget_ms: Optional[float] = None,
+                       agent_timeouts_ms: Optional[Dict[str, float]] = None,
+                       early_termination: bool = False,
+                       idempotency_ttl_seconds: Optional[float] = None,
+                       idempotency_max_entries: int = 100_000,
+                       state_max_entries: int = 100_000,
+                       state_ttl_seconds: Optional[float] = None) -> RiskOrchestrator:
+    """
+    RiskOrchestrator with the transaction monitor, behavioral analysis and
+    identity verification agents registered
+    
+    Args:
+        state_max_entries: Customers kept per agent state store (LRU)
+        state_ttl_seconds: Idle customers expire after this long (None = never)
+        Others: see RiskOrchestrator
+    """
+    orchestrator = RiskOrchestrator(
+        execution_mode=execution_mode,
+        request_budget_ms=request_budget_ms,
+        agent_timeouts_ms=agent_timeouts_ms,
+        early_termination=early_termination,
+        idempotency_ttl_seconds=idempotency_ttl_seconds,
+        idempotency_max_entries=idempotency_max_entries
+    )
+    
+    # Per-customer agent state is bounded
+    store_factory = partial(LRUStateStore, max_entries=state_max_entries, ttl_seconds=state_ttl_seconds)
+    
+    orchestrator.register_agent(TransactionMonitorAgent(store_factory=store_factory))
+    orchestrator.register_agent(BehavioralAnalysisAgent(store_factory=store_factory))
+    orchestrator.register_agent(IdentityVerificationAgent())
+    
+    return orchestrator
+
+
+class StatePersistence:
+    """
+    Snapshots and event log of one orchestrator's agent state
+    
+    restore() before serving, start() to begin logging and periodic
+    snapshots, stop() on shutdown (final snapshot, then the log is flushed).
+    Either part is optional.
+    """
+    
+    def __init__(self, orchestrator: RiskOrchestrator, snapshot_path: Optional[str] = None,
+                 snapshot_interval_seconds: float = 300.0, event_log_dir: Optional[str] = None,
+                 event_log_options: Optional[Dict] = None, meta: Optional[Dict] = None):
+        """
+        Args:
+            snapshot_path: Snapshot file (None = no snapshots)
+            event_log_dir: Event log directory (None = no event log)
+            event_log_options: Extra EventLog arguments (fsync, flush_interval_ms, segment_bytes)
+            meta: Snapshot metadata checked on restore (the shard layout)
+        """
+        self.orchestrator = orchestrator
+        self.event_log = None
+        if event_log_dir:
+            self.event_log = EventLog(event_log_dir, **(event_log_options or {}))
+            orchestrator.event_log = self.event_log
+        self.snapshots = None
+        if snapshot_path:
+            self.snapshots = SnapshotManager(orchestrator, snapshot_path, snapshot_interval_seconds,
+                                             meta=meta, event_log=self.event_log)
+    
+    @property
+    def enabled(self) -> bool:
+        return self.snapshots is not None or self.event_log is not None
+    
+    def restore(self):
+        """Snapshot plus log tail, or the whole log without snapshots"""
+        if self.snapshots is not None:
+            self.snapshots.restore()
+        elif self.event_log is not None:
+            self.event_log.replay_into(self.orchestrator.agents)
+    
+    def start(self):
+        if self.event_log is not None:
+            self.event_log.start()
+        if self.snapshots is not None:
+            self.snapshots.start()
+    
+    def stop(self):
+        if self.snapshots is not None:
+            self.snapshots.stop()
+        if self.event_log is not None:
+            self.event_log.close()
+    
+    def snapshot(self) -> Dict:
+        if self.snapshots is None:
+            raise ValueError("Snapshots are disabled")
+        return self.snapshots.snapshot()
+    
+    def stats(self) -> Dict:
+        return {
+            "snapshots": self.snapshots.stats() if self.snapshots is not None else None,
+            "event_log": self.event_log.stats() if self.event_log is not None else None
+        }
@@ -0,0 +1,397 @@
+"""
+Profile Store - Customer profiles in SQLite behind an in-process LRU cache
+Profiles (average and largest approved amounts, usual hours, decision
+counts) are learned from scored transactions. Reads go through a
+read-through LRU cache; updates are aggregated per customer and upserted
+in batches by a writer thread, off the request path.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+import json
+import sqlite3
+import threading
+import time
+
+from .state_store import LRUStateStore
+
+# Profile used until a customer has enough approved history (the gateway's former static profile)
+DEFAULT_PROFILE = {
+    "avg_transaction_amount": 100.0,
+    "max_transaction_amount": 500.0,
+    "usual_transaction_hours": list(range(8, 23))
+}
+
+READ_CHUNK = 64  # Customers per SELECT ... IN (...); short chunks are padded so the statement is reused
+USUAL_HOUR_SHARE = 0.02  # Hours with at least this share of approved transactions are usual
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS customer_profiles (
+    customer_id TEXT PRIMARY KEY,
+    transactions INTEGER NOT NULL,
+    approved INTEGER NOT NULL,
+    reviewed INTEGER NOT NULL,
+    blocked INTEGER NOT NULL,
+    amount_sum REAL NOT NULL,
+    max_amount REAL NOT NULL,
+    hour_counts TEXT NOT NULL,
+    last_transaction_at TEXT,
+    updated_at TEXT NOT NULL
+) WITHOUT ROWID
+"""
+COLUMNS = ("customer_id, transactions, approved, reviewed, blocked, amount_sum, max_amount, "
+           "hour_counts, last_transaction_at, updated_at")
+SELECT_MANY = f"SELECT {COLUMNS} FROM customer_profiles WHERE customer_id IN ({', '.join('?' * READ_CHUNK)})"
+UPSERT = f"""
+INSERT INTO customer_profiles ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(customer_id) DO UPDATE SET
+    transactions = excluded.transactions,
+    approved = excluded.approved,
+    reviewed = excluded.reviewed,
+    blocked = excluded.blocked,
+    amount_sum = excluded.amount_sum,
+    max_amount = excluded.max_amount,
+    hour_counts = excluded.hour_counts,
+    last_transaction_at = excluded.last_transaction_at,
+    updated_at = excluded.updated_at
+"""
+
+
+@dataclass
+class ProfileRecord:
+    """Aggregates kept per customer; amounts and hours only count approved transactions"""
+    customer_id: str
+    transactions: int = 0
+    approved: int = 0
+    reviewed: int = 0
+    blocked: int = 0
+    amount_sum: float = 0.0
+    max_amount: float = 0.0
+    hour_counts: List[int] = field(default_factory=lambda: [0] * 24)
+    last_transaction_at: Optional[str] = None
+    updated_at: Optional[str] = None
+    context: Dict[str, Any] = field(default=None, repr=False, compare=False)  # customer_profile handed to agents
+    
+    def merge(self, other: "ProfileRecord"):
+        """Add the counts of other (newer transactions of the same customer)"""
+        self.transactions += other.transactions
+        self.approved += other.approved
+        self.reviewed += other.reviewed
+        self.blocked += other.blocked
+        self.amount_sum += other.amount_sum
+        self.max_amount = max(self.max_amount, other.max_amount)
+        self.hour_counts = [a + b for a, b in zip(self.hour_counts, other.hour_counts)]
+        self.last_transaction_at = other.last_transaction_at or self.last_transaction_at
+    
+    def risk_level(self) -> str:
+        if self.blocked:
+            return "high"
+        if self.transactions and self.reviewed / self.transactions >= 0.1:
+            return "medium"
+        return "low"
+    
+    def row(self) -> Tuple:
+        return (self.customer_id, self.transactions, self.approved, self.reviewed, self.blocked,
+                self.amount_sum, self.max_amount, json.dumps(self.hour_counts),
+                self.last_transaction_at, self.updated_at)
+    
+    @classmethod
+    def from_row(cls, row: Tuple) -> "ProfileRecord":
+        return cls(row[0], row[1], row[2], row[3], row[4], row[5], row[6], json.loads(row[7]), row[8], row[9])
+
+
+class ProfileStore:
+    """
+    SQLite-backed customer profiles with a read-through LRU cache
+    
+    The database runs in WAL mode so the reader connection is never blocked
+    by the writer's batches. get() serves from the cache and falls back to a
+    primary-key lookup on a miss; customers without a row are cached too, so
+    unknown customers do not query SQLite on every transaction. record()
+    only aggregates the transaction in memory; every flush_interval_ms the
+    writer thread merges the pending aggregates into their rows in one
+    transaction (executemany over the same prepared upsert) and refreshes
+    the cached profiles; a batch that fails is queued again. A cached
+    profile never includes queued updates: a read that races a flush of
+    the same customers is not cached, so it cannot overwrite the flushed
+    profile. current() adds the queued updates for read-your-writes.
+    Other processes writing to the same file are not seen until the cached
+    entry expires (cache_ttl_seconds).
+    """
+    
+    def __init__(self, path: str, cache_entries: int = 100_000, cache_ttl_seconds: Optional[float] = None,
+                 min_history: int = 10, flush_interval_ms: float = 500.0, max_pending: int = 100_000):
+        """
+        Args:
+            path: SQLite database file (created if missing)
+            cache_entries: Profiles kept in the LRU cache
+            cache_ttl_seconds: Re-read cached profiles older than this (None = only refreshed by own flushes)
+            min_history: Approved transactions before learned values replace DEFAULT_PROFILE
+            flush_interval_ms: How long the writer collects updates before upserting them
+            max_pending: Customers with queued updates beyond which new updates are dropped (and counted)
+        """
+        self.path = path
+        self.min_history = min_history
+        self.flush_interval_ms = flush_interval_ms
+        self.max_pending = max_pending
+        self.cache = LRUStateStore("customer_profiles", max_entries=cache_entries, ttl_seconds=cache_ttl_seconds)
+        self._recorded = LRUStateStore("recorded_transactions", max_entries=max_pending)  # Retries are not counted twice
+        
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute(SCHEMA)
+        self._reader = self._connect()
+        self._read_lock = threading.Lock()
+        
+        self._pending: Dict[str, ProfileRecord] = {}
+        self._flushing: Dict[str, ProfileRecord] = {}  # Updates being written, until the cache has them
+        self._flushes_published = 0  # Bumped (under _condition) each time a flush updates the cache or fails
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.db_reads = 0
+        self.recorded = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.write_errors = 0
+        self.last_flush_ms = 0.0
+    
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit: the writer opens its own transactions; statements are cached per connection
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA busy_timeout=5000")
+        return connection
+    
+    def start(self):
+        """Start the writer thread (updates before start() are queued)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="fraud-profile-store", daemon=True)
+            self._thread.start()
+    
+    def close(self):
+        """Write what is queued, stop the writer and close the database"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        else:
+            self._flush_pending()
+        self._writer.close()
+        self._reader.close()
+    
+    def get(self, customer_id: str) -> ProfileRecord:
+        """Profile of one customer (an empty record if unknown)"""
+        record = self.cache.get(customer_id)
+        if record is None:
+            record = self._load([customer_id])[0]
+        return record
+    
+    def cached(self, customer_id: str) -> Optional[ProfileRecord]:
+        """Profile if it is in the cache, None on a miss (never reads SQLite)"""
+        return self.cache.get(customer_id)
+    
+    def current(self, customer_id: str) -> ProfileRecord:
+        """Profile including the updates still queued for SQLite (read-your-writes)"""
+        while True:
+            record = self.current_cached(customer_id)
+            if record is not None:
+                return record
+            # Not cached if it raced a flush of this customer; the next read finds the flushed profile
+            self._load([customer_id])
+    
+    def current_cached(self, customer_id: str) -> Optional[ProfileRecord]:
+        """current() if the profile is in the cache, None on a miss (never reads SQLite)"""
+        with self._condition:
+            record = self.cache.get(customer_id)
+            if record is None:
+                return None
+            updates = [update for update in (self._flushing.get(customer_id), self._pending.get(customer_id)) if update]
+            if not updates:
+                return record
+            record = replace(record, hour_counts=list(record.hour_counts))
+            for update in updates:
+                record.merge(update)
+        record.context = self._context_for(record)
+        return record
+    
+    def get_many(self, customer_ids: List[str]) -> List[ProfileRecord]:
+        """Profiles in input order, reading all cache misses in as few queries as possible"""
+        records: List[Optional[ProfileRecord]] = [self.cache.get(customer_id) for customer_id in customer_ids]
+        missing = list(dict.fromkeys(customer_id for customer_id, record in zip(customer_ids, records) if record is None))
+        if missing:
+            loaded = {record.customer_id: record for record in self._load(missing)}
+            records = [record or loaded[customer_id] for customer_id, record in zip(customer_ids, records)]
+        return records
+    
+    def context_profile(self, customer_id: str) -> Dict[str, Any]:
+        """customer_profile for the agents' evaluation context"""
+        return self.get(customer_id).context
+    
+    def _load(self, customer_ids: List[str]) -> List[ProfileRecord]:
+        """Read customers from SQLite into the cache"""
+        rows = {}
+        published = self._flushes_published
+        with self._read_lock:
+            for start in range(0, len(customer_ids), READ_CHUNK):
+                chunk = customer_ids[start:start + READ_CHUNK]
+                for row in self._reader.execute(SELECT_MANY, chunk + [None] * (READ_CHUNK - len(chunk))):
+                    rows[row[0]] = row
+                self.db_reads += 1
+        
+        records = []
+        with self._condition:
+            # A flush of these customers may have committed mid-read: keep what it cached instead
+            stale = self._flushes_published != published
+            for customer_id in customer_ids:
+                row = rows.get(customer_id)
+                record = ProfileRecord.from_row(row) if row is not None else ProfileRecord(customer_id)
+                if not stale and customer_id not in self._flushing:
+                    record = self._cache(record)
+                else:
+                    record = self.cache.get(customer_id) or self._with_context(record)
+                records.append(record)
+        return records
+    
+    def _cache(self, record: ProfileRecord) -> ProfileRecord:
+        self.cache[record.customer_id] = self._with_context(record)
+        return record
+    
+    def _with_context(self, record: ProfileRecord) -> ProfileRecord:
+        record.context = self._context_for(record)
+        return record
+    
+    def _context_for(self, record: ProfileRecord) -> Dict[str, Any]:
+        """Learned profile once there is enough approved history, DEFAULT_PROFILE before"""
+        if record.approved < self.min_history:
+            return DEFAULT_PROFILE
+        threshold = max(1, record.approved * USUAL_HOUR_SHARE)
+        return {
+            "avg_transaction_amount": record.amount_sum / record.approved,
+            "max_transaction_amount": record.max_amount,
+            "usual_transaction_hours": [hour for hour, count in enumerate(record.hour_counts) if count >= threshold]
+        }
+    
+    def record(self, transaction: Dict[str, Any], action: str) -> bool:
+        """Queue a scored transaction's contribution to its customer's profile; False if dropped or already counted"""
+        customer_id = transaction.get("customer_id")
+        if not customer_id:
+            return False
+        transaction_id = transaction.get("transaction_id")
+        if transaction_id:
+            if transaction_id in self._recorded:
+                return False
+            self._recorded[transaction_id] = True
+        
+        timestamp = transaction.get("timestamp") or datetime.now()
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        
+        with self._condition:
+            delta = self._pending.get(customer_id)
+            if delta is None:
+                if self._closed or len(self._pending) >= self.max_pending:
+                    self.dropped += 1
+                    return False
+                delta = self._pending[customer_id] = ProfileRecord(customer_id)
+            
+            delta.transactions += 1
+            if action == "APPROVE":
+                amount = float(transaction.get("amount", 0))
+                delta.approved += 1
+                delta.amount_sum += amount
+                delta.max_amount = max(delta.max_amount, amount)
+                delta.hour_counts[timestamp.hour] += 1
+            elif action == "REVIEW":
+                delta.reviewed += 1
+            else:
+                delta.blocked += 1
+            delta.last_transaction_at = timestamp.isoformat()
+            self.recorded += 1
+        return True
+    
+    def record_many(self, transactions: Iterable[Dict[str, Any]], actions: Iterable[str]):
+        for transaction, action in zip(transactions, actions):
+            self.record(transaction, action)
+    
+    def flush(self):
+        """Upsert the queued updates now (from the calling thread)"""
+        self._flush_pending()
+    
+    def _run(self):
+        while True:
+            # record() does not notify, so updates accumulate for one interval
+            with self._condition:
+                if not self._closed:
+                    self._condition.wait(self.flush_interval_ms / 1000)
+                closed = self._closed
+            self._flush_pending()
+            if closed:
+                return
+    
+    def _flush_pending(self):
+        with self._condition:
+            pending, self._pending = self._pending, {}
+            self._flushing = pending
+        if not pending:
+            return
+        
+        started = time.perf_counter()
+        customer_ids = list(pending)
+        updated_at = datetime.now().isoformat()
+        try:
+            # Read-merge-write in one IMMEDIATE transaction, so other writers of the file are serialised
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                records = {customer_id: ProfileRecord(customer_id) for customer_id in customer_ids}
+                for start in range(0, len(customer_ids), READ_CHUNK):
+                    chunk = customer_ids[start:start + READ_CHUNK]
+                    for row in self._writer.execute(SELECT_MANY, chunk + [None] * (READ_CHUNK - len(chunk))):
+                        records[row[0]] = ProfileRecord.from_row(row)
+                for customer_id, record in records.items():
+                    record.merge(pending[customer_id])
+                    record.updated_at = updated_at
+                self._writer.executemany(UPSERT, [record.row() for record in records.values()])
+                self._writer.execute("COMMIT")
+            except Exception:
+                self._writer.execute("ROLLBACK")
+                raise
+        except Exception as e:
+            print(f"Error writing customer profiles ({len(pending)} customers): {e}")
+            self.write_errors += 1
+            with self._condition:
+                # Retried with the next batch, ahead of anything queued meanwhile
+                for customer_id, update in pending.items():
+                    newer = self._pending.get(customer_id)
+                    if newer is not None:
+                        update.merge(newer)
+                    self._pending[customer_id] = update
+                self._flushing = {}
+                self._flushes_published += 1
+        else:
+            with self._condition:
+                # These customers are active, so their fresh profiles are worth caching
+                for record in records.values():
+                    self._cache(record)
+                self._flushing = {}
+                self._flushes_published += 1
+            self.flushes += 1
+            self.rows_written += len(records)
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "cache": self.cache.stats(),
+            "db_reads": self.db_reads,
+            "pending": len(self._pending) + len(self._flushing),
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "write_errors": self.write_errors,
+            "last_flush_ms": self.last_flush_ms
+        }
@@ -2,9 +2,32 @@
 Risk Orchestrator - Coordinates all fraud detection agents
 Aggregates risk scores and makes final decisions
 """
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from dataclasses import dataclass, field
 from datetime import datetime
+from functools import partial
+from itertools import groupby
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from .base_agent import BaseFraudAgent, RiskAssessment, AgentMessage
+from .execution_planner import ExecutionPlanner
+from .idempotency import IdempotencyCache, IdempotencyKey, transaction_digest
+from .metrics import AGENT_ERRORS, AGENT_SKIPS, AGENT_TIMEOUTS, DECISIONS, FLAGS, SHORT_CIRCUITS, flag_code
+from .state_store import StateGate
+from .tracing import span, tracer
+
+EXECUTION_MODES = ("sequential", "concurrent")
+
+@dataclass
+class _AgentRun:
+    """Outcome of running the registered agents for one transaction"""
+    agent_results: Dict[str, RiskAssessment] = field(default_factory=dict)
+    critical_agent: Optional[str] = None
+    timed_out: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    not_run: List[str] = field(default_factory=list)  # Agents whose state update is not part of the event
 
 class RiskOrchestrator(BaseFraudAgent):
     """
@@ -12,7 +35,27 @@ class RiskOrchestrator(BaseFraudAgent):
     Aggregates scores and makes final risk decisions
     """
     
-    def __init__(self):
+    def __init__(self, execution_mode: str = "sequential", max_workers: Optional[int] = None,
+                 request_budget_ms: Optional[float] = None,
+                 agent_timeouts_ms: Optional[Dict[str, float]] = None,
+                 early_termination: bool = False,
+                 idempotency_ttl_seconds: Optional[float] = None,
+                 idempotency_max_entries: int = 100_000):
+        """
+        Args:
+            execution_mode: "sequential" runs agents one after another,
+                "concurrent" fans them out to a thread pool
+            max_workers: Thread pool size for concurrent mode (None = stdlib default)
+            request_budget_ms: Default latency budget per evaluation (None = unbounded)
+            agent_timeouts_ms: Per-agent timeouts, applied within the request budget
+            early_termination: Order agents by measured cost and skip the rest
+                once the APPROVE/REVIEW/BLOCK outcome can no longer change
+            idempotency_ttl_seconds: Replay assessments of repeated transaction_ids
+                for this long instead of re-scoring them (None = disabled)
+            idempotency_max_entries: Assessments kept for replay
+        """
+        if execution_mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode: {execution_mode}")
         super().__init__(
             name="risk_orchestrator",
             description="Orquestrador central - agrega scores e decide ação final",
@@ -26,42 +69,285 @@ class RiskOrchestrator(BaseFraudAgent):
             "anomaly_detection": 0.15,
             "external_intelligence": 0.10
         }
-        
+        self.execution_mode = execution_mode
+        self.max_workers = max_workers
+        self.request_budget_ms = request_budget_ms
+        self.agent_timeouts_ms = dict(agent_timeouts_ms or {})
+        self.early_termination = early_termination
+        self.planner = ExecutionPlanner(review_threshold=45, block_threshold=75, critical_score=90)
+        self._executor = None
+        self.idempotency = None
+        if idempotency_ttl_seconds is not None:
+            self.idempotency = IdempotencyCache(idempotency_max_entries, idempotency_ttl_seconds)
+        self.event_log = None  # EventLog recording every scored transaction, when attached
+        self.state_gate = StateGate()  # Held from an evaluation's first state update to its event log append
+        self.late_writes = 0  # Agent threads that outlived their evaluation, logged on completion
+        self.dropped_late_writes = 0  # Same, but a snapshot cut came in between (may be missing after a restart)
+    
     def register_agent(self, agent: BaseFraudAgent):
         """Register an agent with the orchestrator"""
         self.agents[agent.name] = agent
         agent.message_bus = self
         print(f"✅ Agent registered: {agent.name}")
     
-    def evaluate(self, transaction: Dict[str, Any], context: Dict = None) -> RiskAssessment:
+    def evaluate(self, transaction: Dict[str, Any], context: Dict = None,
+                 budget_ms: Optional[float] = None) -> RiskAssessment:
         """
         Orchestrate evaluation across all agents and make final decision
+        
+        Args:
+            transaction: Transaction data
+            context: Additional context shared with every agent
+            budget_ms: Latency budget for this evaluation (defaults to request_budget_ms).
+                Agents that miss their deadline are left out of the decision.
+        
+        With idempotency enabled, an exact retry of a recent transaction (same
+        customer_id, transaction_id and fields) gets its original assessment
+        back and no agent runs or records it again. Concurrent retries are
+        not joined here (see evaluate_async()).
         """
-        start_time = datetime.now()
+        started = time.perf_counter_ns()
         context = context or {}
+        with tracer.trace("risk_orchestrator.evaluate", transaction_id=transaction.get("transaction_id"),
+                          customer_id=transaction.get("customer_id")) as trace_span:
+            key = self._idempotency_key(transaction)
+            if key is not None:
+                digest = transaction_digest(transaction)
+                cached = self.idempotency.lookup(key, digest)
+                if cached is not None:
+                    trace_span.set(replayed=True)
+                    return cached
+            
+            with self.state_gate:
+                deadlines = self._agent_deadlines(budget_ms)
+                
+                # Collect assessments from all agents
+                if self.execution_mode == "concurrent":
+                    run = self._run_agents_concurrent(transaction, context, deadlines)
+                else:
+                    run = self._run_agents_sequential(transaction, context, deadlines)
+                
+                assessment = self._aggregate(run)
+                self._trace_result(trace_span, run, assessment)
+                self._log_event(transaction, context, run)
+            if key is not None:
+                self.idempotency.remember(key, digest, assessment)
+            
+            # Calculate processing time
+            self.record_latency(time.perf_counter_ns() - started)
+            
+            return assessment
+    
+    async def evaluate_async(self, transaction: Dict[str, Any], context: Dict = None,
+                             budget_ms: Optional[float] = None) -> RiskAssessment:
+        """
+        Awaitable evaluate() for async callers (same arguments and result)
+        
+        Agents that run inline (CPU-only) are called directly on the event loop
+        in plan order, while agents doing I/O are awaited concurrently, so no
+        worker thread is held per request. execution_mode only applies to the
+        synchronous evaluate(). A retry arriving while the same transaction is
+        still being scored waits for that result.
+        """
+        started = time.perf_counter_ns()
+        context = context or {}
+        with tracer.trace("risk_orchestrator.evaluate", transaction_id=transaction.get("transaction_id"),
+                          customer_id=transaction.get("customer_id")) as trace_span:
+            key = self._idempotency_key(transaction)
+            if key is not None:
+                digest = transaction_digest(transaction)
+                cached = self.idempotency.lookup(key, digest)
+                if cached is not None:
+                    trace_span.set(replayed=True)
+                    return cached
+                pending = self.idempotency.pending(key, digest)
+                if pending is not None:
+                    trace_span.set(joined_in_flight=True)
+                    return await asyncio.shield(pending)
+                future = self.idempotency.begin(key, digest)
+            
+            try:
+                async with self.state_gate:
+                    deadlines = self._agent_deadlines(budget_ms)
+                    run = await self._run_agents_async(transaction, context, deadlines)
+                    assessment = self._aggregate(run)
+                    self._trace_result(trace_span, run, assessment)
+                    self._log_event(transaction, context, run)
+            except BaseException as e:
+                if key is not None:
+                    self.idempotency.finish(key, digest, future, error=e)
+                raise
+            if key is not None:
+                self.idempotency.finish(key, digest, future, assessment)
+            
+            self.record_latency(time.perf_counter_ns() - started)
+            
+            return assessment
+    
+    def evaluate_many(self, transactions: List[Dict[str, Any]],
+                      contexts: Optional[List[Dict]] = None) -> List[RiskAssessment]:
+        """
+        Evaluate a batch of transactions, returning assessments in input order
+        
+        Agents take the whole batch one agent at a time through their own
+        evaluate_many(), so per-call overhead is paid once per agent rather than
+        once per transaction. Each agent still sees the transactions in input
+        order, so results match calling evaluate() on each in turn (with early
+        termination the decisions match, possibly with fewer agents run).
+        Latency budgets do not apply to batches.
+        
+        With idempotency enabled, exact retries of recent transactions are
+        replayed and repeats within the batch are scored once.
+        """
+        contexts = self._batch_contexts(transactions, contexts)
+        with tracer.trace("risk_orchestrator.evaluate_many", batch_size=len(transactions)):
+            if self.idempotency is None:
+                return self._evaluate_batch(transactions, contexts)
+            return self._evaluate_many_idempotent(transactions, contexts)
+    
+    def _evaluate_many_idempotent(self, transactions: List[Dict[str, Any]], contexts: List[Dict]) -> List[RiskAssessment]:
+        """evaluate_many() replaying recent transactions and scoring repeats once"""
+        results: List[Optional[RiskAssessment]] = [None] * len(transactions)
+        digests: List[Optional[str]] = [None] * len(transactions)
+        first_index = {}  # (key, digest) -> index of its first occurrence to score
+        duplicates = []  # (index, index of first occurrence)
+        for i, transaction in enumerate(transactions):
+            key = self._idempotency_key(transaction)
+            if key is None:
+                continue
+            digests[i] = transaction_digest(transaction)
+            if (key, digests[i]) in first_index:
+                duplicates.append((i, first_index[key, digests[i]]))
+                continue
+            results[i] = self.idempotency.lookup(key, digests[i])
+            if results[i] is None:
+                first_index[key, digests[i]] = i
+        
+        duplicate_indices = {i for i, _ in duplicates}
+        to_score = [i for i, result in enumerate(results) if result is None and i not in duplicate_indices]
+        assessments = self._evaluate_batch([transactions[i] for i in to_score], [contexts[i] for i in to_score])
+        for i, assessment in zip(to_score, assessments):
+            results[i] = assessment
+            key = self._idempotency_key(transactions[i])
+            if key is not None:
+                self.idempotency.remember(key, digests[i], assessment)
+        
+        for i, first in duplicates:
+            results[i] = results[first]
+        self.idempotency.batch_duplicates += len(duplicates)
+        
+        return results
+    
+    def _evaluate_batch(self, transactions: List[Dict[str, Any]], contexts: List[Dict]) -> List[RiskAssessment]:
+        """Score a batch through every agent (evaluate_many without idempotency)"""
+        started = time.perf_counter_ns()
+        if not transactions:
+            return []
+        
+        with self.state_gate:
+            assessments = self._score_batch(transactions, contexts)
+        
+        self.record_latency(time.perf_counter_ns() - started, count=len(transactions))
+        
+        return assessments
+    
+    def _score_batch(self, transactions: List[Dict[str, Any]], contexts: List[Dict]) -> List[RiskAssessment]:
+        """Run the agents over a batch and log every event (called with the state gate held)"""
+        if self.early_termination:
+            order, bounds = self.planner.plan_many(self.agents, self.weights, transactions, contexts)
+        else:
+            order, bounds = list(self.agents), [dict.fromkeys(self.agents, 100.0) for _ in transactions]
+        
+        runs = [_AgentRun() for _ in transactions]
+        remaining = [{name: txn_bounds[name] for name in order} for txn_bounds in bounds]
+        
+        for name in order:
+            # (index, update_only) for every transaction this agent still has to see
+            steps = []
+            for i, run in enumerate(runs):
+                if run.critical_agent:
+                    run.not_run.append(name)
+                    continue
+                if not run.skipped and self._settled(run.agent_results, remaining[i]):
+                    run.skipped = list(remaining[i])
+                steps.append((i, bool(run.skipped)))
+                del remaining[i][name]
+            self._run_agent_batch(self.agents[name], steps, transactions, contexts, runs)
         
-        # Collect assessments from all agents
         assessments = []
-        agent_results = {}
+        for i, run in enumerate(runs):
+            run.agent_results = self._in_registration_order(run.agent_results)
+            assessments.append(self._aggregate(run))
+            self._log_event(transactions[i], contexts[i], run)
         
-        for name, agent in self.agents.items():
+        return assessments
+    
+    def _run_agent_batch(self, agent: BaseFraudAgent, steps: List[Tuple[int, bool]],
+                         transactions: List[Dict[str, Any]], contexts: List[Dict],
+                         runs: List["_AgentRun"]):
+        """Feed one agent its share of the batch, keeping input order across scored and skipped transactions"""
+        for update_only, group in groupby(steps, key=lambda step: step[1]):
+            indices = [i for i, _ in group]
+            
+            if update_only:
+                for i in indices:
+                    try:
+                        agent.update_state(transactions[i], contexts[i])
+                    except Exception as e:
+                        print(f"Error updating state of agent {agent.name}: {e}")
+                continue
+            
+            started = time.perf_counter()
             try:
-                assessment = agent.evaluate(transaction, context)
-                assessments.append(assessment)
-                agent_results[name] = assessment
-                
-                # If any agent returns critical score, short-circuit
-                if assessment.score >= 90:
-                    return self._create_final_assessment(
-                        agent_results, 
-                        "BLOCK",
-                        f"Score crítico detetado por {name}",
-                        start_time
-                    )
-                    
+                with span(agent.name, batch_size=len(indices)):
+                    results = agent.evaluate_many([transactions[i] for i in indices], [contexts[i] for i in indices])
             except Exception as e:
-                print(f"Error in agent {name}: {e}")
+                print(f"Error in agent {agent.name}: {e}")
+                AGENT_ERRORS.inc(agent.name)
                 continue
+            cost_ms = (time.perf_counter() - started) * 1000
+            
+            scores = []
+            for i, assessment in zip(indices, results):
+                if assessment is None:
+                    continue
+                runs[i].agent_results[agent.name] = assessment
+                scores.append(assessment.score)
+                if assessment.score >= 90:
+                    runs[i].critical_agent = agent.name
+            
+            if scores:
+                self.planner.record(agent.name, cost_ms / len(indices), sum(scores) / len(scores))
+    
+    def _aggregate(self, run: "_AgentRun") -> RiskAssessment:
+        """Turn the agents' results into the final decision and count it"""
+        assessment = self._decide(run)
+        
+        if run.critical_agent:
+            SHORT_CIRCUITS.inc(run.critical_agent)
+        for name in run.timed_out:
+            AGENT_TIMEOUTS.inc(name)
+        for name in run.skipped:
+            AGENT_SKIPS.inc(name)
+        DECISIONS.inc(assessment.recommended_action)
+        for flag in assessment.flags:
+            FLAGS.inc(flag_code(flag))
+        
+        return assessment
+    
+    def _decide(self, run: "_AgentRun") -> RiskAssessment:
+        """Final assessment from the agents' results"""
+        # If any agent returns critical score, short-circuit
+        if run.critical_agent:
+            return self._create_final_assessment(
+                run.agent_results,
+                "BLOCK",
+                f"Score crítico detetado por {run.critical_agent}",
+                run.timed_out
+            )
+        
+        agent_results = run.agent_results
+        assessments = list(agent_results.values())
         
         # Calculate weighted aggregate score
         final_score = self._calculate_weighted_score(agent_results)
@@ -72,32 +358,386 @@ class RiskOrchestrator(BaseFraudAgent):
             all_flags.extend(assessment.flags)
         
         # Determine final action
-        if final_score >= 75:
-            action = "BLOCK"
-        elif final_score >= 45:
-            action = "REVIEW"
-        else:
-            action = "APPROVE"
+        action = self.planner.decide(final_score)
         
         # Generate comprehensive explanation
         explanation = self._generate_final_explanation(agent_results, final_score)
         
-        # Calculate processing time
-        processing_time = (datetime.now() - start_time).total_seconds() * 1000
-        self.update_metrics(processing_time)
-        
         return RiskAssessment(
             score=final_score,
             confidence=self._calculate_confidence(assessments),
-            flags=list(set(all_flags)),  # Remove duplicates
+            flags=list(dict.fromkeys(all_flags)),  # Remove duplicates, keep agent order
             explanation=explanation,
             recommended_action=action,
             timestamp=datetime.now(),
-            agent_name=self.name
+            agent_name=self.name,
+            timed_out_agents=run.timed_out,
+            skipped_agents=run.skipped,
+            agent_scores={name: assessment.score for name, assessment in agent_results.items()}
         )
     
+    def _trace_result(self, trace_span, run: "_AgentRun", assessment: RiskAssessment):
+        """Record the decision and the agents left out of it on the request span"""
+        trace_span.set(score=assessment.score, action=assessment.recommended_action)
+        if run.timed_out:
+            trace_span.set(timed_out=run.timed_out)
+        if run.skipped:
+            trace_span.set(skipped=run.skipped)
+    
+    def _log_event(self, transaction: Dict[str, Any], context: Dict, run: "_AgentRun"):
+        """Append a scored transaction to the event log, with the agents that never saw it"""
+        if self.event_log is not None:
+            self.event_log.append(transaction, context, run.not_run)
+    
+    def _abandon_threads(self, threads: Dict[str, Any], transaction: Dict[str, Any], context: Dict,
+                         run: "_AgentRun"):
+        """
+        Leave agent threads still running after the decision out of its event
+        
+        They record the transaction when they finish, which may be after a
+        snapshot, so they do not keep the state gate held (one hung agent
+        would stall every snapshot and every evaluation behind it). Their
+        update is logged as its own event once they finish, unless a cut was
+        taken meanwhile: the snapshot may or may not hold it, so it is
+        counted in dropped_late_writes instead.
+        """
+        generation = self.state_gate.generation
+        for name, thread in threads.items():
+            run.not_run.append(name)
+            if self.event_log is not None:
+                thread.add_done_callback(partial(self._log_late_write, name, transaction, context, generation))
+    
+    def _log_late_write(self, name: str, transaction: Dict[str, Any], context: Dict, generation: int, thread):
+        """Log the state update of an abandoned agent thread that finished"""
+        if thread.cancelled() or thread.exception() is not None:
+            return
+        # Never waits: this may run on the event loop, inside the evaluation that abandoned the thread
+        if not self.state_gate.try_enter():
+            self.dropped_late_writes += 1
+            return
+        try:
+            if self.state_gate.generation != generation:
+                self.dropped_late_writes += 1
+                return
+            self.event_log.append(transaction, context, [other for other in self.agents if other != name])
+            self.late_writes += 1
+        finally:
+            self.state_gate.release()
+    
+    def _idempotency_key(self, transaction: Dict[str, Any]) -> Optional[IdempotencyKey]:
+        """Idempotency cache key (None when the cache is off or the transaction has no ID)"""
+        if self.idempotency is None or not transaction.get("transaction_id"):
+            return None
+        return transaction.get("customer_id") or "", transaction["transaction_id"]
+    
+    def _agent_deadlines(self, budget_ms: Optional[float]) -> Dict[str, float]:
+        """Absolute time.monotonic() deadline per agent (agents without one are omitted)"""
+        if budget_ms is None:
+            budget_ms = self.request_budget_ms
+        
+        now = time.monotonic()
+        deadlines = {}
+        for name in self.agents:
+            limits = [ms for ms in (budget_ms, self.agent_timeouts_ms.get(name)) if ms is not None]
+            if limits:
+                deadlines[name] = now + min(limits) / 1000
+        return deadlines
+    
+    def _plan(self, transaction: Dict[str, Any], context: Dict) -> Dict[str, float]:
+        """Execution order with score upper bounds (registration order without early termination)"""
+        if not self.early_termination:
+            return {name: 100.0 for name in self.agents}
+        return dict(self.planner.plan(self.agents, self.weights, transaction, context))
+    
+    def _settled(self, agent_results: Dict[str, RiskAssessment], remaining: Dict[str, float]) -> bool:
+        """True when the agents still to run can no longer change the decision"""
+        if not self.early_termination or not remaining:
+            return False
+        scores = {name: assessment.score for name, assessment in agent_results.items()}
+        return self.planner.settled_action(scores, remaining, self.weights) is not None
+    
+    def _call_agent(self, agent: BaseFraudAgent, transaction: Dict[str, Any], context: Dict) -> RiskAssessment:
+        """Evaluate one agent and feed its cost into the planner"""
+        started = time.perf_counter()
+        with span(agent.name) as agent_span:
+            assessment = agent.evaluate(transaction, context)
+            agent_span.set(score=assessment.score)
+        self.planner.record(agent.name, (time.perf_counter() - started) * 1000, assessment.score)
+        return assessment
+    
+    async def _call_agent_async(self, agent: BaseFraudAgent, transaction: Dict[str, Any], context: Dict) -> RiskAssessment:
+        """Await one agent and feed its latency into the planner"""
+        started = time.perf_counter()
+        with span(agent.name) as agent_span:
+            assessment = await agent.evaluate_async(transaction, context)
+            agent_span.set(score=assessment.score)
+        self.planner.record(agent.name, (time.perf_counter() - started) * 1000, assessment.score)
+        return assessment
+    
+    def _skip_agents(self, names: List[str], transaction: Dict[str, Any], context: Dict):
+        """Keep state of agents skipped by early termination up to date"""
+        for name in names:
+            try:
+                self.agents[name].update_state(transaction, context)
+            except Exception as e:
+                print(f"Error updating state of agent {name}: {e}")
+    
+    def _in_registration_order(self, agent_results: Dict[str, RiskAssessment]) -> Dict[str, RiskAssessment]:
+        """Re-order results so aggregation does not depend on execution order"""
+        return {name: agent_results[name] for name in self.agents if name in agent_results}
+    
+    def _run_agents_sequential(self, transaction: Dict[str, Any], context: Dict,
+                               deadlines: Dict[str, float]) -> "_AgentRun":
+        """
+        Run agents one after another, stopping at the first critical score.
+        
+        A running agent cannot be interrupted, so deadlines are enforced when it
+        returns: late results are dropped, and agents whose deadline has already
+        passed are not started.
+        """
+        run = _AgentRun()
+        remaining = self._plan(transaction, context)
+        
+        for name in list(remaining):
+            if self._settled(run.agent_results, remaining):
+                run.skipped = list(remaining)
+                self._skip_agents(run.skipped, transaction, context)
+                break
+            
+            del remaining[name]
+            deadline = deadlines.get(name)
+            if deadline is not None and time.monotonic() >= deadline:
+                run.timed_out.append(name)
+                run.not_run.append(name)
+                continue
+            
+            try:
+                assessment = self._call_agent(self.agents[name], transaction, context)
+            except Exception as e:
+                print(f"Error in agent {name}: {e}")
+                AGENT_ERRORS.inc(name)
+                continue
+            
+            if deadline is not None and time.monotonic() > deadline:
+                run.timed_out.append(name)
+                continue
+            
+            run.agent_results[name] = assessment
+            if assessment.score >= 90:
+                run.critical_agent = name
+                run.not_run.extend(remaining)
+                break
+        
+        run.agent_results = self._in_registration_order(run.agent_results)
+        return run
+    
+    def _run_agents_concurrent(self, transaction: Dict[str, Any], context: Dict,
+                               deadlines: Dict[str, float]) -> "_AgentRun":
+        """
+        Fan agents out to the thread pool and collect results as they finish.
+        
+        A critical score cancels agents that have not started yet; agents
+        already running cannot be interrupted and their results are discarded.
+        Agents still pending at their deadline, or once the decision has
+        settled, are abandoned the same way. Results are returned in
+        registration order so aggregation is identical to sequential mode.
+        """
+        executor = self._get_executor()
+        run = _AgentRun()
+        remaining = self._plan(transaction, context)
+        order = {name: i for i, name in enumerate(self.agents)}
+        futures = {
+            executor.submit(contextvars.copy_context().run, self._call_agent, self.agents[name], transaction, context): name
+            for name in remaining
+        }
+        pending = set(futures)
+        
+        while pending and run.critical_agent is None:
+            pending_deadlines = [deadlines[futures[f]] for f in pending if futures[f] in deadlines]
+            timeout = max(min(pending_deadlines) - time.monotonic(), 0) if pending_deadlines else None
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            # Futures finishing together are handled in registration order
+            for future in sorted(done, key=lambda f: order[futures[f]]):
+                name = futures[future]
+                del remaining[name]
+                try:
+                    assessment = future.result()
+                except Exception as e:
+                    print(f"Error in agent {name}: {e}")
+                    AGENT_ERRORS.inc(name)
+                    continue
+                
+                run.agent_results[name] = assessment
+                if assessment.score >= 90 and run.critical_agent is None:
+                    run.critical_agent = name
+            
+            now = time.monotonic()
+            expired = {f for f in pending if deadlines.get(futures[f], now + 1) <= now}
+            for future in expired:
+                if future.cancel():
+                    run.not_run.append(futures[future])
+                run.timed_out.append(futures[future])
+                del remaining[futures[future]]
+            pending -= expired
+            
+            if run.critical_agent is None and self._settled(run.agent_results, remaining):
+                # Agents that never started still record the transaction
+                never_started = [futures[f] for f in pending if f.cancel()]
+                run.skipped = sorted(remaining, key=order.get)
+                self._skip_agents(never_started, transaction, context)
+                pending = set()
+        
+        for future in pending:
+            if future.cancel():
+                run.not_run.append(futures[future])
+        self._abandon_threads({futures[f]: f for f in futures if not f.done()}, transaction, context, run)
+        
+        run.agent_results = self._in_registration_order(run.agent_results)
+        run.timed_out.sort(key=order.get)
+        return run
+    
+    async def _run_agents_async(self, transaction: Dict[str, Any], context: Dict,
+                                deadlines: Dict[str, float]) -> "_AgentRun":
+        """
+        Start the awaitable agents as tasks, run the inline agents meanwhile,
+        then collect the tasks as they finish.
+        
+        Inline agents follow the sequential rules. Pending tasks are cancelled
+        on a critical score, at their deadline, or once the decision has
+        settled (skipped agents still record the transaction). Agents flagged
+        blocking_io run on the agent thread pool, like concurrent mode: one
+        whose thread has started cannot be stopped and records the
+        transaction itself.
+        """
+        run = _AgentRun()
+        remaining = self._plan(transaction, context)
+        order = {name: i for i, name in enumerate(self.agents)}
+        tasks = {}
+        threads = {}  # task -> thread pool future, for blocking_io agents
+        for name in remaining:
+            agent = self.agents[name]
+            if agent.runs_inline:
+                continue
+            if agent.blocking_io and type(agent).evaluate_async is BaseFraudAgent.evaluate_async:
+                thread = self._get_executor().submit(contextvars.copy_context().run, self._call_agent,
+                                                     agent, transaction, context)
+                task = asyncio.wrap_future(thread)
+                threads[task] = thread
+            else:
+                task = asyncio.ensure_future(self._call_agent_async(agent, transaction, context))
+            tasks[task] = name
+        pending = set(tasks)
+        if pending:
+            # Let the tasks reach their first await before the inline agents take the loop
+            await asyncio.sleep(0)
+        
+        for name in [name for name in remaining if self.agents[name].runs_inline]:
+            if run.critical_agent or self._settled(run.agent_results, remaining):
+                break
+            
+            del remaining[name]
+            deadline = deadlines.get(name)
+            if deadline is not None and time.monotonic() >= deadline:
+                run.timed_out.append(name)
+                run.not_run.append(name)
+                continue
+            
+            try:
+                assessment = self._call_agent(self.agents[name], transaction, context)
+            except Exception as e:
+                print(f"Error in agent {name}: {e}")
+                AGENT_ERRORS.inc(name)
+                continue
+            
+            if deadline is not None and time.monotonic() > deadline:
+                run.timed_out.append(name)
+                continue
+            
+            run.agent_results[name] = assessment
+            if assessment.score >= 90:
+                run.critical_agent = name
+        
+        while pending and run.critical_agent is None and not self._settled(run.agent_results, remaining):
+            pending_deadlines = [deadlines[tasks[t]] for t in pending if tasks[t] in deadlines]
+            timeout = max(min(pending_deadlines) - time.monotonic(), 0) if pending_deadlines else None
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            # Tasks finishing together are handled in registration order
+            for task in sorted(done, key=lambda t: order[tasks[t]]):
+                name = tasks[task]
+                del remaining[name]
+                try:
+                    assessment = task.result()
+                except Exception as e:
+                    print(f"Error in agent {name}: {e}")
+                    AGENT_ERRORS.inc(name)
+                    continue
+                
+                run.agent_results[name] = assessment
+                if assessment.score >= 90 and run.critical_agent is None:
+                    run.critical_agent = name
+            
+            now = time.monotonic()
+            expired = {t for t in pending if deadlines.get(tasks[t], now + 1) <= now}
+            for task in expired:
+                if self._cancel_task(task, threads):
+                    run.not_run.append(tasks[task])
+                run.timed_out.append(tasks[task])
+                del remaining[tasks[task]]
+            pending -= expired
+        
+        # Agents that finished or are running in a thread record the transaction themselves
+        stopped = [tasks[t] for t in pending if self._cancel_task(t, threads)]
+        if run.critical_agent is None and self._settled(run.agent_results, remaining):
+            run.skipped = sorted(remaining, key=order.get)
+            started = {tasks[t] for t in pending} - set(stopped)
+            self._skip_agents([name for name in run.skipped if name not in started], transaction, context)
+        
+        if run.critical_agent is not None:
+            # Inline agents after the critical score never ran
+            run.not_run.extend(name for name in remaining if self.agents[name].runs_inline)
+        run.not_run.extend(name for name in stopped if name not in run.skipped)
+        self._abandon_threads({tasks[t]: thread for t, thread in threads.items() if not thread.done()},
+                              transaction, context, run)
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        
+        run.agent_results = self._in_registration_order(run.agent_results)
+        run.timed_out.sort(key=order.get)
+        return run
+    
+    @staticmethod
+    def _cancel_task(task: asyncio.Future, threads: Dict[asyncio.Future, Any]) -> bool:
+        """Cancel an agent task; True only if the agent never started"""
+        thread = threads.get(task)
+        if thread is None:
+            return task.cancel()
+        # Cancelling the task does not stop a thread that is already running
+        never_started = thread.cancel()
+        task.cancel()
+        return never_started
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Lazily create the shared agent thread pool"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="fraud-agent"
+            )
+        return self._executor
+    
+    def shutdown(self):
+        """Release the agent thread pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
     def _calculate_weighted_score(self, agent_results: Dict[str, RiskAssessment]) -> float:
-        """Calculate weighted aggregate score"""
+        """
+        Calculate weighted aggregate score
+        
+        Only agents present in agent_results contribute, so weights are
+        renormalised over the agents that actually answered.
+        """
         total_score = 0.0
         total_weight = 0.0
         
@@ -125,11 +765,9 @@ class RiskOrchestrator(BaseFraudAgent):
         
         return min(total_confidence / total_score, 1.0)
     
-    def _create_final_assessment(self, agent_results: Dict, action: str, reason: str, start_time: datetime) -> RiskAssessment:
+    def _create_final_assessment(self, agent_results: Dict, action: str, reason: str,
+                                 timed_out: List[str] = None) -> RiskAssessment:
         """Create final assessment (for short-circuit cases)"""
-        processing_time = (datetime.now() - start_time).total_seconds() * 1000
-        self.update_metrics(processing_time)
-        
         return RiskAssessment(
             score=95.0,
             confidence=0.95,
@@ -137,7 +775,9 @@ class RiskOrchestrator(BaseFraudAgent):
             explanation=f"Ação imediata necessária: {reason}",
             recommended_action=action,
             timestamp=datetime.now(),
-            agent_name=self.name
+            agent_name=self.name,
+            timed_out_agents=timed_out or [],
+            agent_scores={name: assessment.score for name, assessment in agent_results.items()}
         )
     
     def _generate_final_explanation(self, agent_results: Dict[str, RiskAssessment], final_score: float) -> str:
@@ -174,5 +814,13 @@ class RiskOrchestrator(BaseFraudAgent):
             "orchestrator": self.get_info(),
             "registered_agents": [agent.get_info() for agent in self.agents.values()],
             "total_agents": len(self.agents),
+            "execution_mode": self.execution_mode,
+            "request_budget_ms": self.request_budget_ms,
+            "agent_timeouts_ms": self.agent_timeouts_ms,
+            "early_termination": self.early_termination,
+            "agent_costs": self.planner.get_stats(),
+            "idempotency": self.idempotency.stats() if self.idempotency else None,
+            "late_agent_writes": {"logged": self.late_writes, "dropped": self.dropped_late_writes},
+            "event_log": self.event_log.stats() if self.event_log is not None else None,
             "weights": self.weights
         }
@@ -0,0 +1,75 @@
+"""
+Running Stats - Incremental mean/variance for per-customer baselines
+Welford updates over a bounded window, O(1) per transaction
+"""
+from typing import Any, Optional
+from collections import deque
+import math
+
+
+class SlidingWindowStats:
+    """
+    Mean and population variance of the last maxlen values
+    
+    Values are added with Welford's update; once the window is full the
+    oldest value is replaced in the same step. Rounding error from the
+    replacements is reset by an exact two-pass recompute every maxlen
+    replacements, so the cost stays amortised O(1).
+    """
+    
+    __slots__ = ("values", "timestamps", "mean", "m2", "replacements")
+    
+    def __init__(self, maxlen: int = 1000):
+        self.values = deque(maxlen=maxlen)
+        self.timestamps = deque(maxlen=maxlen)
+        self.mean = 0.0
+        self.m2 = 0.0  # Sum of squared deviations from the mean
+        self.replacements = 0
+    
+    def __len__(self) -> int:
+        return len(self.values)
+    
+    def add(self, value: float, timestamp: Optional[Any] = None):
+        """Add a value, evicting the oldest one when the window is full"""
+        if len(self.values) < self.values.maxlen:
+            self.values.append(value)
+            self.timestamps.append(timestamp)
+            delta = value - self.mean
+            self.mean += delta / len(self.values)
+            self.m2 += delta * (value - self.mean)
+            return
+        
+        oldest = self.values[0]
+        self.values.append(value)
+        self.timestamps.append(timestamp)
+        old_mean = self.mean
+        self.mean += (value - oldest) / len(self.values)
+        self.m2 += (value - oldest) * (value - self.mean + oldest - old_mean)
+        
+        self.replacements += 1
+        if self.replacements >= self.values.maxlen:
+            self.recompute()
+    
+    def recompute(self):
+        """Exact two-pass mean and variance over the current window"""
+        count = len(self.values)
+        self.replacements = 0
+        if not count:
+            self.mean = self.m2 = 0.0
+            return
+        self.mean = sum(self.values) / count
+        self.m2 = sum((x - self.mean) ** 2 for x in self.values)
+    
+    @property
+    def variance(self) -> float:
+        """Population variance; rounding residue below float resolution reads as 0"""
+        if not self.values:
+            return 0.0
+        variance = self.m2 / len(self.values)
+        if variance <= 1e-12 * max(self.mean * self.mean, 1.0):
+            return 0.0
+        return variance
+    
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
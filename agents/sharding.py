@@ -0,0 +1,365 @@
+"""
+Sharding - Scores transactions in worker processes partitioned by customer
+Each shard process owns the agent state for the customers hashed to it, so
+per-customer history stays consistent while scoring uses several cores.
+The dispatcher routes every transaction by crc32(customer_id) % shards.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import Future
+from itertools import count, groupby
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+from .base_agent import RiskAssessment
+from .risk_orchestrator import RiskOrchestrator
+from .pipeline import StatePersistence
+
+MAX_BATCH = 256  # Requests coalesced into one pipe message / evaluate_many call
+START_TIMEOUT_SECONDS = 120.0
+STATUS_TIMEOUT_SECONDS = 5.0
+STOP_TIMEOUT_SECONDS = 60.0  # Includes the final state snapshot
+
+
+class ShardError(RuntimeError):
+    """A shard failed to evaluate a request, or its process is gone"""
+
+
+def shard_for(customer_id: Optional[str], shards: int) -> int:
+    """Shard owning a customer's state (transactions without customer go to shard 0)"""
+    if not customer_id:
+        return 0
+    return zlib.crc32(str(customer_id).encode()) % shards
+
+
+def shard_persistence(settings: Dict[str, Any], shard_id: int) -> Dict[str, Any]:
+    """StatePersistence arguments of one shard: paths get a ".shard<N>" suffix / "shard<N>" subdirectory"""
+    settings = dict(settings)
+    if settings.get("snapshot_path"):
+        settings["snapshot_path"] = f"{settings['snapshot_path']}.shard{shard_id}"
+    if settings.get("event_log_dir"):
+        settings["event_log_dir"] = os.path.join(settings["event_log_dir"], f"shard{shard_id}")
+    return settings
+
+
+def _shard_main(shard_id: int, shards: int, factory: Callable[[], RiskOrchestrator], connection,
+                persistence_settings: Dict[str, Any]):
+    """Worker process: build the pipeline, then answer request lists until told to stop"""
+    orchestrator = factory()
+    # The shard layout is part of the snapshot: with another shard count,
+    # the customers in this file would belong to other shards
+    persistence = StatePersistence(orchestrator, **shard_persistence(persistence_settings, shard_id),
+                                   meta={"shard": shard_id, "shards": shards})
+    persistence.restore()
+    persistence.start()
+    connection.send(("ready", {name: agent.get_info() for name, agent in orchestrator.agents.items()},
+                     orchestrator.weights))
+    
+    while True:
+        try:
+            requests = connection.recv()
+        except EOFError:
+            break
+        if requests is None:
+            break
+        connection.send(_handle(orchestrator, persistence, requests))
+    
+    persistence.stop()
+    orchestrator.shutdown()
+
+
+def _handle(orchestrator: RiskOrchestrator, persistence: StatePersistence,
+            requests: List[Tuple[int, str, tuple]]) -> List[Tuple[int, bool, Any]]:
+    """Replies (request_id, ok, result or error text) in request order"""
+    replies = []
+    # Consecutive single evaluations without a latency budget or agent timeouts
+    # are scored as one batch: evaluate_many gives the same results as
+    # evaluate() in order, but applies no deadlines
+    deadlines = orchestrator.request_budget_ms is not None or bool(orchestrator.agent_timeouts_ms)
+    batchable = lambda request: request[1] == "evaluate" and request[2][2] is None and not deadlines
+    for is_batch, group in groupby(requests, key=batchable):
+        group = list(group)
+        if is_batch and len(group) > 1:
+            try:
+                assessments = orchestrator.evaluate_many([args[0] for _, _, args in group], [args[1] for _, _, args in group])
+                replies.extend((request_id, True, assessment) for (request_id, _, _), assessment in zip(group, assessments))
+            except Exception as e:
+                replies.extend((request_id, False, f"{type(e).__name__}: {e}") for request_id, _, _ in group)
+            continue
+        for request_id, op, args in group:
+            try:
+                if op == "evaluate":
+                    result = orchestrator.evaluate(*args)
+                elif op == "evaluate_many":
+                    result = orchestrator.evaluate_many(*args)
+                elif op == "status":
+                    result = orchestrator.get_system_status()
+                elif op == "snapshot":
+                    result = persistence.snapshot()
+                elif op == "persistence_stats":
+                    result = persistence.stats()
+                else:
+                    raise ValueError(f"Unknown shard operation: {op}")
+                replies.append((request_id, True, result))
+            except Exception as e:
+                replies.append((request_id, False, f"{type(e).__name__}: {e}"))
+    return replies
+
+
+class _Shard:
+    """Dispatcher side of one worker process: a send queue, a sender thread and a reader thread"""
+    
+    def __init__(self, shard_id: int, shards: int, context, factory: Callable[[], RiskOrchestrator],
+                 persistence_settings: Dict[str, Any]):
+        self.shard_id = shard_id
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_shard_main,
+            args=(shard_id, shards, factory, child_connection, persistence_settings),
+            name=f"fraud-shard-{shard_id}", daemon=True
+        )
+        self.process.start()
+        child_connection.close()
+        self.outbox: "queue.SimpleQueue" = queue.SimpleQueue()
+        self.pending: Dict[int, Future] = {}
+        self.lock = threading.Lock()
+        self.alive = True
+        self.agents: Dict[str, Any] = {}
+        self.weights: Dict[str, float] = {}
+        self.requests = 0
+    
+    def wait_ready(self, timeout: float):
+        if not self.connection.poll(timeout):
+            raise ShardError(f"Shard {self.shard_id} did not start within {timeout}s")
+        try:
+            _, self.agents, self.weights = self.connection.recv()
+        except EOFError:
+            raise ShardError(f"Shard {self.shard_id} exited during startup (exit code {self.process.exitcode})")
+        threading.Thread(target=self._send_loop, name=f"fraud-shard-{self.shard_id}-send", daemon=True).start()
+        threading.Thread(target=self._receive_loop, name=f"fraud-shard-{self.shard_id}-receive", daemon=True).start()
+    
+    def submit(self, request_id: int, op: str, args: tuple) -> Future:
+        future = Future()
+        with self.lock:
+            if not self.alive:
+                raise ShardError(f"Shard {self.shard_id} is not running")
+            self.pending[request_id] = future
+            self.requests += 1
+        self.outbox.put((request_id, op, args))
+        return future
+    
+    def _send_loop(self):
+        """Coalesce whatever is queued into one message, so a busy shard gets batches"""
+        while True:
+            request = self.outbox.get()
+            if request is None:
+                break
+            batch = [request]
+            stop = False
+            while len(batch) < MAX_BATCH:
+                try:
+                    request = self.outbox.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+            try:
+                self.connection.send(batch)
+            except (OSError, ValueError):
+                self._fail_pending()
+                return
+            if stop:
+                break
+        try:
+            self.connection.send(None)
+        except (OSError, ValueError):
+            pass
+    
+    def _receive_loop(self):
+        while True:
+            try:
+                replies = self.connection.recv()
+            except (EOFError, OSError):
+                break
+            for request_id, ok, result in replies:
+                with self.lock:
+                    future = self.pending.pop(request_id, None)
+                if future is None:
+                    continue
+                if ok:
+                    future.set_result(result)
+                else:
+                    future.set_exception(ShardError(f"Shard {self.shard_id}: {result}"))
+        self._fail_pending()
+    
+    def _fail_pending(self):
+        with self.lock:
+            self.alive = False
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ShardError(f"Shard {self.shard_id} exited (exit code {self.process.exitcode})"))
+    
+    def stop(self, timeout: float = STOP_TIMEOUT_SECONDS):
+        self.outbox.put(None)
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+        self.connection.close()
+
+
+class ShardedOrchestrator:
+    """
+    Drop-in for RiskOrchestrator that fans customers out to worker processes
+    
+    Workers are started with the "spawn" method and build their pipeline by
+    calling factory(), which must be picklable (a module-level function or a
+    functools.partial of one). Processes start on the first evaluation, or
+    explicitly with start(). A shard that exits fails its in-flight requests
+    with ShardError and is not restarted; get_system_status() reports it.
+    
+    persistence holds StatePersistence arguments (snapshot_path,
+    snapshot_interval_seconds, event_log_dir, event_log_options); each shard
+    restores, logs and snapshots its own state under shard-specific paths.
+    
+    Agent metrics and traces are recorded inside each shard process.
+    """
+    
+    def __init__(self, factory: Callable[[], RiskOrchestrator], shards: int,
+                 start_timeout_seconds: float = START_TIMEOUT_SECONDS,
+                 persistence: Optional[Dict[str, Any]] = None):
+        if shards < 1:
+            raise ValueError(f"shards must be at least 1, got {shards}")
+        self.factory = factory
+        self.shard_count = shards
+        self.start_timeout_seconds = start_timeout_seconds
+        self.persistence = dict(persistence or {})
+        self.shards: List[_Shard] = []
+        self.agents: Dict[str, Any] = {}  # Agent name -> info from shard 0 (the agents live in the shards)
+        self.weights: Dict[str, float] = {}  # Aggregation weights, from shard 0
+        self.request_ids = count()
+        self._start_lock = threading.Lock()
+    
+    def start(self):
+        """Start the worker processes and wait until each has built its pipeline"""
+        with self._start_lock:
+            if self.shards:
+                return
+            context = multiprocessing.get_context("spawn")
+            shards = [
+                _Shard(i, self.shard_count, context, self.factory, self.persistence)
+                for i in range(self.shard_count)
+            ]
+            try:
+                for shard in shards:
+                    shard.wait_ready(self.start_timeout_seconds)
+            except Exception:
+                for shard in shards:
+                    shard.process.terminate()
+                raise
+            self.agents = dict(shards[0].agents)
+            self.weights = dict(shards[0].weights)
+            self.shards = shards
+            print(f"🧩 Started {self.shard_count} scoring shards")
+    
+    def shutdown(self):
+        """Stop the worker processes"""
+        with self._start_lock:
+            shards, self.shards = self.shards, []
+        for shard in shards:
+            shard.stop()
+    
+    def shard_for(self, customer_id: Optional[str]) -> int:
+        return shard_for(customer_id, self.shard_count)
+    
+    def _submit(self, shard_id: int, op: str, args: tuple) -> Future:
+        if not self.shards:
+            self.start()
+        return self.shards[shard_id].submit(next(self.request_ids), op, args)
+    
+    def evaluate(self, transaction: Dict[str, Any], context: Dict = None,
+                 budget_ms: Optional[float] = None) -> RiskAssessment:
+        """Score on the shard owning the customer (same arguments and result as RiskOrchestrator)"""
+        shard_id = self.shard_for(transaction.get("customer_id"))
+        return self._submit(shard_id, "evaluate", (transaction, context, budget_ms)).result()
+    
+    async def evaluate_async(self, transaction: Dict[str, Any], context: Dict = None,
+                             budget_ms: Optional[float] = None) -> RiskAssessment:
+        """Awaitable evaluate(); the event loop is not blocked while the shard scores"""
+        shard_id = self.shard_for(transaction.get("customer_id"))
+        return await asyncio.wrap_future(self._submit(shard_id, "evaluate", (transaction, context, budget_ms)))
+    
+    def evaluate_many(self, transactions: List[Dict[str, Any]],
+                      contexts: Optional[List[Dict]] = None) -> List[RiskAssessment]:
+        """Split the batch by shard (keeping input order within each), score the parts in parallel"""
+        contexts = contexts if contexts is not None else [{} for _ in transactions]
+        indices_by_shard: Dict[int, List[int]] = {}
+        for i, transaction in enumerate(transactions):
+            indices_by_shard.setdefault(self.shard_for(transaction.get("customer_id")), []).append(i)
+        
+        futures = {
+            shard_id: self._submit(shard_id, "evaluate_many",
+                                   ([transactions[i] for i in indices], [contexts[i] for i in indices]))
+            for shard_id, indices in indices_by_shard.items()
+        }
+        results: List[Optional[RiskAssessment]] = [None] * len(transactions)
+        for shard_id, future in futures.items():
+            for i, assessment in zip(indices_by_shard[shard_id], future.result()):
+                results[i] = assessment
+        return results
+    
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Snapshot every shard now (in parallel); returns each shard's result"""
+        return self._fan_out("snapshot")
+    
+    def persistence_stats(self) -> List[Dict[str, Any]]:
+        return self._fan_out("persistence_stats")
+    
+    def _fan_out(self, op: str) -> List[Dict[str, Any]]:
+        futures = [self._submit(shard_id, op, ()) for shard_id in range(self.shard_count)]
+        return [{"shard": shard_id, **future.result()} for shard_id, future in enumerate(futures)]
+    
+    def get_system_status(self) -> Dict[str, Any]:
+        """
+        Routing summary plus each shard's own orchestrator status
+        
+        Blocks for up to STATUS_TIMEOUT_SECONDS in total (the shards are
+        asked in parallel), so call it from a worker thread.
+        """
+        shards = list(self.shards)
+        futures = []
+        for shard in shards:
+            try:
+                futures.append(shard.submit(next(self.request_ids), "status", ()))
+            except ShardError as e:
+                futures.append(Future())
+                futures[-1].set_exception(e)
+        deadline = time.monotonic() + STATUS_TIMEOUT_SECONDS
+        shard_status = []
+        for shard, future in zip(shards, futures):
+            try:
+                status = future.result(max(deadline - time.monotonic(), 0))
+            except Exception as e:
+                status = {"error": str(e) or type(e).__name__}
+            shard_status.append({
+                "shard": shard.shard_id,
+                "pid": shard.process.pid,
+                "alive": shard.alive and shard.process.is_alive(),
+                "requests": shard.requests,
+                "in_flight": len(shard.pending),
+                "status": status
+            })
+        return {
+            "sharding": {
+                "shards": self.shard_count,
+                "started": bool(self.shards),
+                "routing": "crc32(customer_id) % shards"
+            },
+            "shards": shard_status
+        }
@@ -0,0 +1,311 @@
+"""
+Snapshots - Periodic on-disk copies of agent state for warm restarts
+Every agent state store (velocity windows, behavioral profiles, device maps,
+anomaly histories) is written to one binary file in the background and
+loaded back through mmap when the process starts
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from datetime import datetime
+import gc
+import json
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+MAGIC = b"FDSNAP02"
+TRAILER = struct.Struct("<Q8s")  # Footer length, MAGIC
+CHUNK_ENTRIES = 1000  # Entries pickled at a time; scoring threads run between chunks
+
+
+class SnapshotError(RuntimeError):
+    """Snapshot file is missing its trailer, truncated or from another format version"""
+
+
+def _chunks(items: Iterator[Tuple[str, Any]], size: int) -> Iterator[List[Tuple[str, Any]]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_snapshot(path: str, agents: Dict[str, Any], meta: Optional[Dict[str, Any]] = None,
+                   wal_lsn: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Write every agent's state stores to path, atomically replacing any previous file
+    
+    Layout: pickled chunks of (key, pickled value) pairs in each store's LRU
+    order, then a JSON footer indexing them (offset, length, crc32), then
+    the footer length and MAGIC. Entries come from each store's
+    snapshot_entries(): the state frozen by begin_snapshot() (see
+    SnapshotManager), or the live state when nothing is scoring. wal_lsn is
+    the event log position the state covers, recorded for replaying the tail.
+    The directory is fsynced after the rename, so the new file is durable
+    before the caller deletes the log segments it covers.
+    
+    Returns:
+        Bytes and entries written
+    """
+    sections = []
+    entries = 0
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as f:
+        for agent_name, agent in agents.items():
+            for namespace, store in agent.state_stores.items():
+                chunks = []
+                for chunk in _chunks(store.snapshot_entries(), CHUNK_ENTRIES):
+                    data = pickle.dumps(chunk, protocol=pickle.HIGHEST_PROTOCOL)
+                    chunks.append([f.tell(), len(data), zlib.crc32(data), len(chunk)])
+                    f.write(data)
+                    entries += len(chunk)
+                    time.sleep(0)  # Let scoring threads run between chunks
+                sections.append({"agent": agent_name, "namespace": namespace, "chunks": chunks})
+        
+        footer = json.dumps({
+            "created_at": datetime.now().isoformat(),
+            "meta": meta or {},
+            "wal_lsn": wal_lsn,
+            "sections": sections
+        }).encode()
+        f.write(footer)
+        f.write(TRAILER.pack(len(footer), MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+        size = f.tell()
+    os.replace(temporary_path, path)
+    _fsync_directory(os.path.dirname(os.path.abspath(path)))
+    return {"bytes": size, "entries": entries}
+
+
+def _fsync_directory(directory: str):
+    """Make a rename in directory durable (no-op where directories cannot be opened)"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_snapshot_footer(buffer) -> Dict[str, Any]:
+    """Parse the footer of a snapshot held in a bytes-like buffer"""
+    if len(buffer) < TRAILER.size:
+        raise SnapshotError("File too short for a snapshot")
+    footer_length, magic = TRAILER.unpack_from(buffer, len(buffer) - TRAILER.size)
+    if magic != MAGIC:
+        raise SnapshotError(f"Not a snapshot file (magic {magic!r})")
+    start = len(buffer) - TRAILER.size - footer_length
+    if start < 0:
+        raise SnapshotError("Snapshot footer is truncated")
+    return json.loads(bytes(buffer[start:start + footer_length]))
+
+
+def load_snapshot(path: str, agents: Dict[str, Any], expected_meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Restore the agents' state stores from a snapshot written by write_snapshot()
+    
+    The file is memory-mapped and each chunk unpickled straight from the
+    mapping. Entries go through the stores' normal insert, oldest first, so
+    max_entries still applies and the most recent customers are kept. Stores
+    no longer present are skipped; a corrupt chunk is skipped and counted.
+    Snapshots are unpickled, so only load files this service wrote itself.
+    
+    The cyclic GC is paused while loading, since it would otherwise rescan
+    the growing state on every collection (3-4x slower with millions of
+    entries), and the restored objects are then frozen out of later
+    collections.
+    
+    Raises:
+        SnapshotError: Not a snapshot, or its meta differs from expected_meta
+    
+    Returns:
+        Entries restored, chunks skipped and the snapshot's footer metadata
+    """
+    gc_enabled = gc.isenabled()
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            gc.disable()
+            try:
+                footer = read_snapshot_footer(view)
+                if expected_meta is not None and footer["meta"] != expected_meta:
+                    raise SnapshotError(f"Snapshot was written for {footer['meta']}, expected {expected_meta}")
+                restored, skipped_chunks = _restore_sections(view, footer["sections"], agents)
+            finally:
+                view.release()
+                if gc_enabled:
+                    gc.enable()
+    gc.freeze()
+    return {
+        "entries": restored,
+        "skipped_chunks": skipped_chunks,
+        "created_at": footer["created_at"],
+        "meta": footer["meta"],
+        "wal_lsn": footer.get("wal_lsn")
+    }
+
+
+def _restore_sections(view: memoryview, sections: List[Dict[str, Any]], agents: Dict[str, Any]) -> Tuple[int, int]:
+    """Unpickle each section's chunks into the matching store; returns (entries restored, chunks skipped)"""
+    restored = 0
+    skipped_chunks = 0
+    for section in sections:
+        agent = agents.get(section["agent"])
+        store = agent.state_stores.get(section["namespace"]) if agent is not None else None
+        if store is None:
+            skipped_chunks += len(section["chunks"])
+            continue
+        for offset, length, checksum, _ in section["chunks"]:
+            data = view[offset:offset + length]
+            try:
+                if zlib.crc32(data) != checksum:
+                    raise SnapshotError("checksum mismatch")
+                chunk = pickle.loads(data)
+            except Exception as e:
+                print(f"Error restoring {section['agent']}.{section['namespace']} chunk at {offset}: {e}")
+                skipped_chunks += 1
+                continue
+            finally:
+                data.release()
+            for key, value in chunk:
+                store[key] = pickle.loads(value)
+            restored += len(chunk)
+    return restored, skipped_chunks
+
+
+class SnapshotManager:
+    """
+    Snapshots an orchestrator's agent state every interval_seconds from a
+    background thread, and restores it at startup
+    
+    A snapshot closes the orchestrator's state gate just long enough to
+    read the event log position and freeze the stores, so the state it
+    writes holds exactly the events up to that position; scoring continues
+    while the file is written. restore() replays the events after it, and
+    the segments before it are dropped.
+    """
+    
+    def __init__(self, orchestrator, path: str, interval_seconds: float = 300.0,
+                 meta: Optional[Dict[str, Any]] = None, event_log=None):
+        """
+        Args:
+            orchestrator: RiskOrchestrator whose registered agents are snapshotted
+            path: Snapshot file (replaced atomically on every snapshot)
+            interval_seconds: Time between snapshots (0 = only on demand and at stop())
+            meta: Stored in the footer and checked on restore (e.g. the shard layout)
+            event_log: EventLog to replay on restore and truncate after each snapshot
+        """
+        self.orchestrator = orchestrator
+        self.path = path
+        self.interval_seconds = interval_seconds
+        self.meta = meta or {}
+        self.event_log = event_log
+        self._lock = threading.Lock()  # One snapshot at a time
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.snapshots = 0
+        self.failures = 0
+        self.last_snapshot: Optional[Dict[str, Any]] = None
+        self.last_restore: Optional[Dict[str, Any]] = None
+    
+    def restore(self) -> Optional[Dict[str, Any]]:
+        """
+        Load the snapshot file if there is one, then replay the event log tail
+        
+        Without a usable snapshot the agents start cold (plus whatever the
+        event log still holds).
+        """
+        started = time.perf_counter()
+        result = None
+        if os.path.exists(self.path):
+            try:
+                result = load_snapshot(self.path, self.orchestrator.agents, self.meta)
+                print(f"💾 Restored {result['entries']} state entries from {self.path} "
+                      f"(taken {result['created_at']}) in {(time.perf_counter() - started) * 1000:.0f}ms")
+            except Exception as e:
+                print(f"Error restoring snapshot {self.path}: {e}")
+                self.last_restore = {"error": str(e)}
+        
+        if self.event_log is not None:
+            replayed = self.event_log.replay_into(self.orchestrator.agents, (result or {}).get("wal_lsn") or 0)
+            if result is None:
+                result = {"entries": 0}
+            result["replayed_events"] = replayed["events"]
+        
+        if result is not None:
+            result["duration_ms"] = (time.perf_counter() - started) * 1000
+            self.last_restore = result
+        return result
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Write a snapshot now (scoring only pauses while the state is frozen)"""
+        with self._lock:
+            started = time.perf_counter()
+            stores = [store for agent in self.orchestrator.agents.values() for store in agent.state_stores.values()]
+            with self.orchestrator.state_gate.closed():
+                wal_lsn = self.event_log.position() if self.event_log is not None else None
+                for store in stores:
+                    store.begin_snapshot()
+            pause_ms = (time.perf_counter() - started) * 1000
+            try:
+                result = write_snapshot(self.path, self.orchestrator.agents, self.meta, wal_lsn)
+            except Exception:
+                self.failures += 1
+                raise
+            finally:
+                for store in stores:
+                    store.end_snapshot()
+            result["duration_ms"] = (time.perf_counter() - started) * 1000
+            result["pause_ms"] = pause_ms
+            result["taken_at"] = datetime.now().isoformat()
+            if wal_lsn is not None:
+                result["wal_lsn"] = wal_lsn
+                result["log_segments_deleted"] = self.event_log.truncate(wal_lsn)
+            self.snapshots += 1
+            self.last_snapshot = result
+            return result
+    
+    def start(self):
+        """Start periodic snapshots"""
+        if self.interval_seconds <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="fraud-snapshot", daemon=True)
+        self._thread.start()
+    
+    def stop(self, final_snapshot: bool = True):
+        """Stop periodic snapshots, writing a last one so a clean restart loses nothing"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if final_snapshot:
+            try:
+                self.snapshot()
+            except Exception as e:
+                print(f"Error writing snapshot {self.path}: {e}")
+    
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.snapshot()
+            except Exception as e:
+                print(f"Error writing snapshot {self.path}: {e}")
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "interval_seconds": self.interval_seconds,
+            "snapshots": self.snapshots,
+            "failures": self.failures,
+            "last_snapshot": self.last_snapshot,
+            "last_restore": self.last_restore
+        }
@@ -0,0 +1,317 @@
+"""
+State Store - Bounded per-customer state shared by all agents
+Pluggable key-value abstraction with LRU/TTL eviction and usage counters
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
+import asyncio
+import pickle
+import threading
+import time
+
+_MISSING = object()
+_WRITTEN = object()  # Frozen entry already handed to the snapshot writer
+GATE_POLL_SECONDS = 0.001  # How often async evaluations retry a closed StateGate
+
+
+class StateGate:
+    """
+    Keeps snapshots from seeing an evaluation half applied
+    
+    Every evaluation holds the gate (with / async with) from its first agent
+    state update until its event is in the log. closed() waits for the
+    holders and keeps new ones out, so the caller can read the log position
+    and freeze the stores as one cut. Async holders poll instead of
+    blocking, so the event loop keeps running while the gate is closed;
+    synchronous holders must not run on the event loop. generation counts
+    the cuts taken, so work finishing later can tell whether one fell in
+    between.
+    """
+    
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._holders = 0
+        self._closed = False
+        self.generation = 0
+    
+    def __enter__(self):
+        with self._condition:
+            while self._closed:
+                self._condition.wait()
+            self._holders += 1
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.release()
+    
+    async def __aenter__(self):
+        while not self.try_enter():
+            await asyncio.sleep(GATE_POLL_SECONDS)
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        self.release()
+    
+    def try_enter(self) -> bool:
+        """Hold the gate unless it is closed (never waits); release() when done"""
+        with self._condition:
+            if self._closed:
+                return False
+            self._holders += 1
+            return True
+    
+    def release(self):
+        with self._condition:
+            self._holders -= 1
+            if not self._holders:
+                self._condition.notify_all()
+    
+    @contextmanager
+    def closed(self):
+        """Wait for the holders to finish and keep new ones out until the block exits"""
+        with self._condition:
+            while self._closed:
+                self._condition.wait()
+            self._closed = True
+            while self._holders:
+                self._condition.wait()
+            self.generation += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._closed = False
+                self._condition.notify_all()
+
+
+class StateStore(ABC):
+    """
+    Key-value store holding one piece of agent state per key (usually a customer)
+    
+    Agents only use this interface, so the in-process LRU store can be swapped
+    for another backend without touching agent code.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self._snapshot: Optional[List[Tuple[str, bytes]]] = None
+    
+    @abstractmethod
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the value for key (counted as hit or miss)"""
+        pass
+    
+    @abstractmethod
+    def __setitem__(self, key: str, value: Any):
+        pass
+    
+    @abstractmethod
+    def __delitem__(self, key: str):
+        pass
+    
+    @abstractmethod
+    def __contains__(self, key: str) -> bool:
+        """Membership test; does not count as an access"""
+        pass
+    
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+    
+    @abstractmethod
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """Snapshot of (key, value) pairs"""
+        pass
+    
+    @abstractmethod
+    def clear(self):
+        pass
+    
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Usage counters"""
+        pass
+    
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+    
+    def setdefault(self, key: str, default: Any) -> Any:
+        """Return the value for key, storing default first if absent"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            self[key] = default
+            return default
+        return value
+    
+    def begin_snapshot(self):
+        """
+        Freeze the current contents for snapshot_entries(); call while no agent updates state
+        
+        This default pickles every entry now. Stores that can keep an
+        entry's old value when it changes override it to return at once.
+        """
+        self._snapshot = [(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)) for key, value in self.items()]
+    
+    def snapshot_entries(self) -> Iterator[Tuple[str, bytes]]:
+        """(key, pickled value) as of begin_snapshot(), or as of now without one"""
+        if self._snapshot is not None:
+            return iter(self._snapshot)
+        return ((key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)) for key, value in self.items())
+    
+    def end_snapshot(self):
+        self._snapshot = None
+
+
+class LRUStateStore(StateStore):
+    """
+    In-process store bounded by entry count, with optional idle TTL
+    
+    Entries are kept in access order: the least recently used entry is evicted
+    when the store is full, and entries untouched for ttl_seconds expire.
+    
+    Snapshots are copy-on-write: begin_snapshot() only lists the keys, and
+    until end_snapshot() an entry is pickled the first time it is handed
+    out, replaced or removed, so the writer sees every value as it was at
+    begin_snapshot() while agents keep updating them.
+    """
+    
+    def __init__(self, name: str, max_entries: int = 100_000, ttl_seconds: Optional[float] = None):
+        super().__init__(name)
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()  # key -> (value, last access time.monotonic())
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._frozen: Optional[Dict[str, Any]] = None  # key -> pickled value as of begin_snapshot() (None: absent)
+        self._frozen_keys: List[str] = []
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            
+            self._preserve(key)  # Agents change values in place once they have them
+            value, last_access = entry
+            if self.ttl_seconds is not None and now - last_access > self.ttl_seconds:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            
+            self._data[key] = (value, now)
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def __setitem__(self, key: str, value: Any):
+        now = time.monotonic()
+        with self._lock:
+            self._preserve(key)
+            self._data[key] = (value, now)
+            self._data.move_to_end(key)
+            self._evict(now)
+    
+    def __delitem__(self, key: str):
+        with self._lock:
+            self._preserve(key)
+            del self._data[key]
+    
+    def __contains__(self, key: str) -> bool:
+        entry = self._data.get(key)
+        if entry is None:
+            return False
+        return self.ttl_seconds is None or time.monotonic() - entry[1] <= self.ttl_seconds
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        with self._lock:
+            snapshot = [(key, value) for key, (value, _) in self._data.items()]
+        return iter(snapshot)
+    
+    def clear(self):
+        with self._lock:
+            for key in self._data:
+                self._preserve(key)
+            self._data.clear()
+    
+    def _evict(self, now: float):
+        """Drop expired entries from the cold end, then enforce the size cap"""
+        if self.ttl_seconds is not None:
+            while self._data:
+                key, (_, last_access) = next(iter(self._data.items()))
+                if now - last_access <= self.ttl_seconds:
+                    break
+                self._preserve(key)
+                del self._data[key]
+                self.expirations += 1
+        
+        while len(self._data) > self.max_entries:
+            self._preserve(next(iter(self._data)))
+            self._data.popitem(last=False)
+            self.evictions += 1
+    
+    def begin_snapshot(self):
+        with self._lock:
+            self._frozen = {}
+            self._frozen_keys = list(self._data)
+    
+    def snapshot_entries(self) -> Iterator[Tuple[str, bytes]]:
+        """(key, pickled value) as of begin_snapshot() in LRU order, or as of now without one"""
+        if self._frozen is None:
+            return super().snapshot_entries()
+        return self._frozen_entries()
+    
+    def _frozen_entries(self) -> Iterator[Tuple[str, bytes]]:
+        for key in self._frozen_keys:
+            # One entry per lock hold, so agents only ever wait for one pickle
+            with self._lock:
+                self._preserve(key)
+                data, self._frozen[key] = self._frozen[key], _WRITTEN
+            if data is not None:
+                yield key, data
+    
+    def end_snapshot(self):
+        with self._lock:
+            self._frozen = None
+            self._frozen_keys = []
+    
+    def _preserve(self, key: str):
+        """Keep key's value as of begin_snapshot() before it changes (lock held)"""
+        if self._frozen is not None and key not in self._frozen:
+            entry = self._data.get(key)
+            self._frozen[key] = None if entry is None else pickle.dumps(entry[0], protocol=pickle.HIGHEST_PROTOCOL)
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+
+StoreFactory = Callable[[str], StateStore]
+
+def default_store_factory(name: str) -> StateStore:
+    """Store used by agents that are not given a factory"""
+    return LRUStateStore(name)
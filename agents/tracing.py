@@ -0,0 +1,226 @@
+"""
+Tracing - Sampled per-request spans across the orchestrator, agents and rules
+The current span travels in a contextvar, so it follows asyncio tasks and
+threads started with contextvars.copy_context(). Finished traces are kept in
+a ring buffer and can also be appended to a JSON-lines file.
+"""
+from typing import Any, Dict, List, Optional
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+import itertools
+import json
+import random
+import threading
+import time
+
+MAX_SPANS_PER_TRACE = 1000  # Batches add spans per transaction; the rest are only counted
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("fraud_current_span", default=None)
+
+
+class Span:
+    """A timed operation inside a trace; use as a context manager"""
+    
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "start_ns", "end_ns", "_token")
+    
+    def __init__(self, trace: "Trace", parent_id: Optional[int], name: str, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = next(trace.span_ids)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = 0
+        self.end_ns = 0
+        self._token = None
+    
+    def set(self, **attributes):
+        """Add attributes (e.g. results known only at the end)"""
+        self.attributes.update(attributes)
+    
+    def __enter__(self) -> "Span":
+        self.start_ns = time.perf_counter_ns()
+        self._token = _current_span.set(self)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.trace.finish_span(self)
+        return False
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ms": (self.start_ns - self.trace.root.start_ns) / 1e6,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6,
+            "attributes": self.attributes
+        }
+
+
+class _NullSpan:
+    """Stand-in when the request is not sampled: every operation is a no-op"""
+    
+    __slots__ = ()
+    
+    def set(self, **attributes):
+        pass
+    
+    def __enter__(self) -> "_NullSpan":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """The spans of one sampled request"""
+    
+    __slots__ = ("tracer", "trace_id", "root", "spans", "span_ids", "started_at", "closed", "dropped_spans")
+    
+    def __init__(self, tracer: "Tracer", trace_id: str):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.root: Optional[Span] = None
+        self.spans: List[Span] = []
+        self.span_ids = itertools.count(1)
+        self.started_at = datetime.now()
+        self.closed = False
+        self.dropped_spans = 0
+    
+    def finish_span(self, span: Span):
+        if span is self.root:
+            self.closed = True
+            self.tracer._export(self)
+        elif self.closed:
+            # e.g. an agent thread abandoned at its deadline finishing afterwards
+            self.tracer.late_spans += 1
+        elif len(self.spans) >= MAX_SPANS_PER_TRACE:
+            self.dropped_spans += 1
+        else:
+            self.spans.append(span)
+    
+    @property
+    def duration_ms(self) -> float:
+        return (self.root.end_ns - self.root.start_ns) / 1e6
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": self.duration_ms,
+            "attributes": self.root.attributes,
+            "dropped_spans": self.dropped_spans,
+            "spans": [span.to_dict() for span in sorted(self.spans, key=lambda span: span.start_ns)]
+        }
+
+
+class Tracer:
+    """
+    Samples requests and keeps their finished traces
+    
+    Unsampled requests only pay for a contextvar lookup per span. With
+    min_duration_ms set, sampled traces faster than that are discarded, so a
+    high sample rate can be used to catch the slow requests only.
+    """
+    
+    def __init__(self, sample_rate: float = 0.0, buffer_size: int = 1000,
+                 export_path: Optional[str] = None, min_duration_ms: float = 0.0):
+        self.traces: deque = deque()
+        self.lock = threading.Lock()
+        self.export_file = None
+        self.trace_ids = itertools.count(1)
+        self.traces_recorded = 0
+        self.traces_discarded = 0  # Faster than min_duration_ms
+        self.late_spans = 0
+        self.configure(sample_rate, buffer_size, export_path, min_duration_ms)
+    
+    def configure(self, sample_rate: float = 0.0, buffer_size: int = 1000,
+                  export_path: Optional[str] = None, min_duration_ms: float = 0.0):
+        """
+        Args:
+            sample_rate: Fraction of requests traced (0 = off, 1 = all)
+            buffer_size: Most recent traces kept in memory
+            export_path: JSON-lines file each kept trace is appended to (None = memory only)
+            min_duration_ms: Keep only traces at least this slow
+        """
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError(f"sample_rate must be between 0 and 1, got {sample_rate}")
+        with self.lock:
+            self.sample_rate = sample_rate
+            self.min_duration_ms = min_duration_ms
+            self.traces = deque(self.traces, maxlen=buffer_size)
+            if self.export_file is not None:
+                self.export_file.close()
+            self.export_path = export_path
+            self.export_file = open(export_path, "a", encoding="utf-8", buffering=1) if export_path else None
+    
+    def trace(self, name: str, **attributes):
+        """Root span of a new trace if this request is sampled, a child span inside an existing trace"""
+        parent = _current_span.get()
+        if parent is not None:
+            return Span(parent.trace, parent.span_id, name, attributes)
+        if self.sample_rate <= 0.0 or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return NULL_SPAN
+        trace = Trace(self, f"{time.time_ns():x}-{next(self.trace_ids)}")
+        trace.root = Span(trace, None, name, attributes)
+        return trace.root
+    
+    def _export(self, trace: Trace):
+        if trace.duration_ms < self.min_duration_ms:
+            self.traces_discarded += 1
+            return
+        line = json.dumps(trace.to_dict(), default=str) if self.export_file is not None else None
+        with self.lock:
+            self.traces.append(trace)
+            self.traces_recorded += 1
+            if line is not None:
+                self.export_file.write(line + "\n")
+    
+    def recent(self, limit: int = 50, min_duration_ms: float = 0.0,
+               transaction_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Kept traces, newest first"""
+        with self.lock:
+            traces = list(self.traces)
+        result = []
+        for trace in reversed(traces):
+            if len(result) >= limit:
+                break
+            if trace.duration_ms < min_duration_ms:
+                continue
+            if transaction_id is not None and trace.root.attributes.get("transaction_id") != transaction_id:
+                continue
+            result.append(trace.to_dict())
+        return result
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "min_duration_ms": self.min_duration_ms,
+            "buffered": len(self.traces),
+            "buffer_size": self.traces.maxlen,
+            "recorded": self.traces_recorded,
+            "discarded_fast": self.traces_discarded,
+            "late_spans": self.late_spans,
+            "export_path": self.export_path
+        }
+
+
+def span(name: str, **attributes):
+    """Child span of the current span, or a no-op when the request is not traced"""
+    parent = _current_span.get()
+    if parent is None:
+        return NULL_SPAN
+    return Span(parent.trace, parent.span_id, name, attributes)
+
+
+# Process-wide tracer, off until configured (see gateway TRACE_* settings)
+tracer = Tracer()
@@ -2,9 +2,40 @@
 Transaction Monitor Agent - Real-time transaction analysis
 Detects velocity fraud, geographic impossibility, and amount anomalies
 """
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Union
 from datetime import datetime, timedelta
+import time
+import numpy as np
 from .base_agent import BaseFraudAgent, RiskAssessment
+from .velocity_index import VelocityWindow
+from .state_store import StoreFactory
+from .tracing import span
+
+# Bits of the columnar rule flag mask (one per rule)
+RULE_HIGH_AMOUNT = 1 << 0
+RULE_VELOCITY = 1 << 1
+RULE_GEO_IMPOSSIBLE = 1 << 2
+RULE_TIME_RISK = 1 << 3
+RULE_MERCHANT_RISK = 1 << 4
+
+EPOCH = datetime(1970, 1, 1)
+MICROS_PER_HOUR = 3_600_000_000
+DEFAULT_USUAL_HOURS_MASK = sum(1 << hour for hour in range(8, 23))
+
+def to_epoch_micros(timestamp: datetime) -> int:
+    """Naive datetime -> int64 microseconds, wall-clock time read as UTC"""
+    return (timestamp - EPOCH) // timedelta(microseconds=1)
+
+def from_epoch_micros(micros: int) -> datetime:
+    """Inverse of to_epoch_micros"""
+    return EPOCH + timedelta(microseconds=int(micros))
+
+def hours_to_mask(hours: List[int]) -> int:
+    """24-bit mask with one bit per hour of day"""
+    mask = 0
+    for hour in hours:
+        mask |= 1 << hour
+    return mask
 
 class TransactionMonitorAgent(BaseFraudAgent):
     """
@@ -12,22 +43,44 @@ class TransactionMonitorAgent(BaseFraudAgent):
     Uses rule-based scoring + statistical anomaly detection
     """
     
-    def __init__(self):
+    def __init__(self, velocity_windows: Dict[str, int] = None,
+                 velocity_rules: Dict[str, List[tuple]] = None,
+                 store_factory: Optional[StoreFactory] = None, max_window_entries: int = 1000):
+        """
+        Args:
+            velocity_windows: Windows counted in one pass per transaction (name -> seconds)
+            velocity_rules: Per window, (min_count, score) thresholds checked in order;
+                the velocity score is the highest matching score across windows
+            store_factory: Factory for the bounded per-customer state store
+            max_window_entries: Transactions kept per customer (the newest); window
+                counts saturate there, so no rule may need more
+        """
         super().__init__(
             name="transaction_monitor",
             description="Monitorização em tempo real de transações - velocity, geografia, valores",
-            version="1.0"
+            version="1.0",
+            store_factory=store_factory
         )
-        # Transaction history cache (in production, use Redis)
-        self.recent_transactions = {}  # customer_id -> list of transactions
+        self.velocity_windows = velocity_windows or {"1m": 60, "5m": 300, "1h": 3600, "24h": 86400}
+        self.velocity_rules = velocity_rules or {"5m": [(5, 30.0), (3, 15.0), (2, 5.0)]}
+        unknown = set(self.velocity_rules) - set(self.velocity_windows)
+        if unknown:
+            raise ValueError(f"Velocity rules for unknown windows: {sorted(unknown)}")
+        if any(min_count > max_window_entries for rules in self.velocity_rules.values() for min_count, _ in rules):
+            raise ValueError(f"Velocity rules need more than max_window_entries={max_window_entries} transactions")
+        self.max_window_entries = max_window_entries
+        self._window_micros = {name: seconds * 1_000_000 for name, seconds in self.velocity_windows.items()}
+        # Keep at least 24 hours, or the longest window if larger
+        self.retention_hours = max(24, max(self.velocity_windows.values()) / 3600)
         
+        # Transaction history cache (in production, use Redis)
+        self.recent_transactions = self._create_state_store("recent_transactions")  # customer_id -> VelocityWindow
+    
     def evaluate(self, transaction: Dict[str, Any], context: Dict = None) -> RiskAssessment:
         """
         Evaluate transaction risk
         """
-        start_time = datetime.now()
-        flags = []
-        score = 0.0
+        started = time.perf_counter_ns()
         
         # Extract transaction data
         customer_id = transaction.get("customer_id")
@@ -43,37 +96,368 @@ class TransactionMonitorAgent(BaseFraudAgent):
         max_transaction = customer_profile.get("max_transaction_amount", 500)
         
         # Rule 1: Amount anomaly (high value transaction)
-        if amount > max_transaction * 2:
-            score += 25
-            flags.append(f"HIGH_AMOUNT: €{amount} (2x above max)")
-        elif amount > avg_transaction * 5:
-            score += 15
-            flags.append(f"HIGH_AMOUNT: €{amount} (5x above average)")
+        with span("amount"):
+            if amount > max_transaction * 2:
+                amount_score = 25.0
+            elif amount > avg_transaction * 5:
+                amount_score = 15.0
+            else:
+                amount_score = 0.0
         
         # Rule 2: Velocity check (multiple transactions in short time)
-        velocity_score = self._check_velocity(customer_id, timestamp)
-        if velocity_score > 0:
-            score += velocity_score
-            flags.append("VELOCITY: Multiple transactions in short window")
+        with span("velocity"):
+            velocity_score = self._check_velocity(customer_id, timestamp)
         
         # Rule 3: Geographic impossibility
-        geo_score = self._check_geographic_impossibility(customer_id, location, timestamp)
-        if geo_score > 0:
-            score += geo_score
-            flags.append("GEO_IMPOSSIBLE: Location change too fast")
+        with span("geo_impossible"):
+            geo_score = self._check_geographic_impossibility(customer_id, location, timestamp)
         
         # Rule 4: Time-based risk (unusual hours)
-        time_score = self._check_time_risk(timestamp, customer_profile)
-        if time_score > 0:
-            score += time_score
-            flags.append("TIME_RISK: Unusual transaction time")
+        with span("time_risk"):
+            time_score = self._check_time_risk(timestamp, customer_profile)
         
         # Rule 5: Merchant risk
-        merchant_score = self._check_merchant_risk(merchant, customer_profile)
+        with span("merchant_risk"):
+            merchant_score = self._check_merchant_risk(merchant, customer_profile)
+        
+        score = amount_score + velocity_score + geo_score + time_score + merchant_score
+        flags = self._rule_flags(amount, amount_score, velocity_score, geo_score, time_score, merchant_score)
+        
+        # Store transaction for future velocity checks
+        with span("store"):
+            self._store_transaction(customer_id, transaction)
+        
+        # Calculate processing time
+        self.record_latency(time.perf_counter_ns() - started)
+        
+        return self._build_assessment(score, flags)
+    
+    def evaluate_many(self, transactions: List[Dict[str, Any]],
+                      contexts: Optional[List[Dict]] = None) -> List[Optional[RiskAssessment]]:
+        """
+        Evaluate a batch through the columnar rule engine
+        
+        Same results as calling evaluate() on each transaction in order; falls
+        back to the scalar path if the batch cannot be converted to columns.
+        """
+        started = time.perf_counter_ns()
+        contexts = self._batch_contexts(transactions, contexts)
+        if not transactions:
+            return []
+        
+        try:
+            with span("to_columns"):
+                columns = self._transactions_to_columns(transactions, contexts)
+        except Exception:
+            return super().evaluate_many(transactions, contexts)
+        
+        result = self.score_columns(**columns)
+        
+        assessments = []
+        for i, transaction in enumerate(transactions):
+            flags = self._rule_flags(
+                transaction.get("amount", 0),
+                result["amount_score"][i],
+                result["velocity_score"][i],
+                result["geo_score"][i],
+                result["time_score"][i],
+                result["merchant_score"][i]
+            )
+            assessments.append(self._build_assessment(float(result["score"][i]), flags))
+        
+        self.record_latency(time.perf_counter_ns() - started, count=len(transactions))
+        
+        return assessments
+    
+    def score_columns(self, customer_codes: np.ndarray, amounts: np.ndarray, timestamps: np.ndarray,
+                      lats: np.ndarray, lons: np.ndarray, merchant_codes: np.ndarray,
+                      customer_ids: List[str], merchant_names: List[str],
+                      avg_amounts: Union[float, np.ndarray] = 100.0,
+                      max_amounts: Union[float, np.ndarray] = 500.0,
+                      usual_hours_masks: Union[int, np.ndarray] = DEFAULT_USUAL_HOURS_MASK) -> Dict[str, np.ndarray]:
+        """
+        Vectorised version of the five rules for a batch of transactions
+        
+        Rows are scored as if evaluate() ran on each in input order, and are
+        recorded for future velocity/geo checks the same way.
+        
+        Args:
+            customer_codes: int index into customer_ids per row (-1 = no customer)
+            amounts: Transaction amounts
+            timestamps: int64 microseconds since epoch (see to_epoch_micros)
+            lats, lons: Coordinates, NaN when the transaction has no location
+            merchant_codes: int index into merchant_names per row
+            customer_ids: Customer id for each code
+            merchant_names: Merchant name for each code
+            avg_amounts, max_amounts: Customer profile amounts (scalar or per row)
+            usual_hours_masks: 24-bit usual-hours mask (scalar or per row)
+        
+        Returns:
+            Dict with per-row "score", "flags" (RULE_* bitmask) and one
+            "<rule>_score" array per rule
+        """
+        customer_codes = np.asarray(customer_codes, dtype=np.int64)
+        amounts = np.asarray(amounts, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        merchant_codes = np.asarray(merchant_codes, dtype=np.int64)
+        avg_amounts = np.asarray(avg_amounts, dtype=np.float64)
+        max_amounts = np.asarray(max_amounts, dtype=np.float64)
+        usual_hours_masks = np.asarray(usual_hours_masks, dtype=np.int64)
+        
+        # Rule 1: Amount anomaly
+        with span("amount"):
+            amount_score = np.where(
+                amounts > max_amounts * 2, 25.0,
+                np.where(amounts > avg_amounts * 5, 15.0, 0.0)
+            )
+        
+        # Rules 2 and 3 depend on each customer's history
+        with span("velocity_geo"):
+            velocity_score, geo_score = self._velocity_geo_columns(customer_codes, amounts, timestamps, lats, lons, customer_ids)
+        
+        # Rule 4: Time-based risk
+        with span("time_risk"):
+            hours = (timestamps // MICROS_PER_HOUR) % 24
+            usual = (usual_hours_masks >> hours) & 1
+            time_score = np.where(hours < 5, 10.0, np.where(usual == 0, 8.0, 0.0))
+        
+        # Rule 5: Merchant risk, computed once per distinct merchant
+        with span("merchant_risk"):
+            merchant_risk = np.array([self._check_merchant_risk(name, {}) for name in merchant_names] or [0.0])
+            merchant_score = merchant_risk[merchant_codes] if merchant_names else np.zeros(len(amounts))
+        
+        score = np.minimum(amount_score + velocity_score + geo_score + time_score + merchant_score, 100)
+        flags = (
+            np.where(amount_score > 0, RULE_HIGH_AMOUNT, 0)
+            | np.where(velocity_score > 0, RULE_VELOCITY, 0)
+            | np.where(geo_score > 0, RULE_GEO_IMPOSSIBLE, 0)
+            | np.where(time_score > 0, RULE_TIME_RISK, 0)
+            | np.where(merchant_score > 0, RULE_MERCHANT_RISK, 0)
+        ).astype(np.uint8)
+        
+        return {
+            "score": score,
+            "flags": flags,
+            "amount_score": amount_score,
+            "velocity_score": velocity_score,
+            "geo_score": geo_score,
+            "time_score": time_score,
+            "merchant_score": merchant_score
+        }
+    
+    def _velocity_geo_columns(self, customer_codes: np.ndarray, amounts: np.ndarray, timestamps: np.ndarray,
+                              lats: np.ndarray, lons: np.ndarray, customer_ids: List[str]) -> tuple:
+        """
+        Velocity and geo-impossibility scores for a batch, then store the rows
+        
+        Each customer's stored history and batch rows are laid out as one
+        sorted run, so window counts become searchsorted lookups. Customers
+        whose timestamps go backwards fall back to the scalar rules, as do
+        customers whose most recently added entry (what the scalar geo rule
+        compares with) is not the newest by timestamp after an earlier
+        out-of-order insert.
+        """
+        n = len(amounts)
+        velocity_score = np.zeros(n)
+        geo_score = np.zeros(n)
+        cutoff = to_epoch_micros(datetime.now() - timedelta(hours=self.retention_hours))
+        
+        present = np.unique(customer_codes[customer_codes >= 0])
+        if len(present) == 0:
+            return velocity_score, geo_score
+        
+        # Stored history rows come first (negative sequence numbers)
+        h_group, h_ts, h_lat, h_lon, h_seq = [], [], [], [], []
+        out_of_order = []
+        for code in present:
+            window = self.recent_transactions.get(customer_ids[code])
+            if not window:
+                continue
+            history_ts, history_locations, _ = window.live_entries()
+            if window.last is not None and window.last != (history_ts[-1], history_locations[-1]):
+                out_of_order.append(code)
+            h_group.extend([code] * len(history_ts))
+            h_ts.extend(history_ts)
+            h_lat.extend(location[0] if location else np.nan for location in history_locations)
+            h_lon.extend(location[1] if location else np.nan for location in history_locations)
+            h_seq.extend(range(-len(history_ts), 0))
+        
+        rows = np.nonzero(customer_codes >= 0)[0]
+        group = np.concatenate([np.asarray(h_group, dtype=np.int64), customer_codes[rows]])
+        ts = np.concatenate([np.asarray(h_ts, dtype=np.int64), timestamps[rows]])
+        lat = np.concatenate([np.asarray(h_lat, dtype=np.float64), lats[rows]])
+        lon = np.concatenate([np.asarray(h_lon, dtype=np.float64), lons[rows]])
+        seq = np.concatenate([np.asarray(h_seq, dtype=np.int64), rows])
+        
+        order = np.lexsort((seq, group))
+        group, ts, lat, lon, seq = group[order], ts[order], lat[order], lon[order], seq[order]
+        
+        # Customers with out-of-order timestamps take the scalar path
+        backwards = (group[1:] == group[:-1]) & (ts[1:] < ts[:-1])
+        scalar_codes = np.union1d(group[1:][backwards], np.asarray(out_of_order, dtype=np.int64))
+        if len(scalar_codes):
+            keep = ~np.isin(group, scalar_codes)
+            group, ts, lat, lon, seq = group[keep], ts[keep], lat[keep], lon[keep], seq[keep]
+            for i in rows[np.isin(customer_codes[rows], scalar_codes)]:
+                velocity_score[i], geo_score[i] = self._score_and_store_scalar(
+                    customer_ids[customer_codes[i]], amounts[i], timestamps[i], lats[i], lons[i]
+                )
+        
+        m = len(ts)
+        if m == 0:
+            return velocity_score, geo_score
+        
+        positions = np.arange(m)
+        is_batch = seq >= 0
+        new_group = np.r_[True, group[1:] != group[:-1]]
+        group_index = np.cumsum(new_group) - 1
+        starts = np.nonzero(new_group)[0]
+        group_start = starts[group_index]
+        
+        # Storing a row drops entries older than the cutoff, so only the first
+        # batch row of a customer still sees expired history
+        live = ts > cutoff
+        expired_count = np.add.reduceat((~live).astype(np.int64), starts)
+        live_start = group_start + expired_count[group_index]
+        first_batch = is_batch & (new_group | np.r_[True, ~is_batch[:-1]])
+        prior_start = np.where(first_batch, group_start, live_start)
+        
+        # Rule 2: rows after each window start, via per-customer sorted keys
+        rule_windows = list(self.velocity_rules)
+        window_starts = [ts - self._window_micros[name] for name in rule_windows]
+        values, ranks = np.unique(np.concatenate([ts] + window_starts), return_inverse=True)
+        keys = group_index * len(values) + ranks[:m]
+        velocity = np.zeros(m)
+        for w, name in enumerate(rule_windows):
+            query = group_index * len(values) + ranks[(w + 1) * m:(w + 2) * m]
+            first_in_window = np.searchsorted(keys, query, side="right")
+            count = np.maximum(positions - np.maximum(first_in_window, prior_start), 0)
+            window_score = np.zeros(m)
+            for min_count, rule_score in reversed(self.velocity_rules[name]):
+                window_score = np.where(count >= min_count, rule_score, window_score)
+            velocity = np.maximum(velocity, window_score)
+        
+        # Rule 3: compare with the previous surviving row
+        has_prev = positions - 1 >= prior_start
+        prev = np.maximum(positions - 1, 0)
+        prev_lat, prev_lon = lat[prev], lon[prev]
+        has_prev &= ~np.isnan(prev_lat)
+        distance_km = np.abs(prev_lat - np.nan_to_num(lat)) * 111 + np.abs(prev_lon - np.nan_to_num(lon)) * 111
+        time_diff_hours = (ts - ts[prev]) / 1e6 / 3600
+        moving = has_prev & (time_diff_hours != 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            speed_kmh = np.where(moving, distance_km / np.where(moving, time_diff_hours, 1), 0)
+        geo = np.where(
+            ~moving, 0.0,
+            np.where(speed_kmh > 900, 35.0,
+                     np.where(speed_kmh > 300, 20.0,
+                              np.where((speed_kmh > 120) & (distance_km > 200), 10.0, 0.0)))
+        )
+        
+        batch_rows = seq[is_batch]
+        velocity_score[batch_rows] = velocity[is_batch]
+        geo_score[batch_rows] = geo[is_batch]
+        
+        # Same end state as storing row by row: everything newer than the cutoff
+        stored = rows[np.isin(customer_codes[rows], group)]
+        for i in stored:
+            customer_id = customer_ids[customer_codes[i]]
+            window = self.recent_transactions.get(customer_id)
+            if window is None:
+                window = self.recent_transactions[customer_id] = VelocityWindow()
+            window.add(int(timestamps[i]), None if np.isnan(lats[i]) else (float(lats[i]), float(lons[i])), float(amounts[i]),
+                       self.max_window_entries)
+        for code in np.unique(group):
+            window = self.recent_transactions.get(customer_ids[code])
+            window.expire(cutoff)
+        
+        return velocity_score, geo_score
+    
+    def _score_and_store_scalar(self, customer_id: str, amount: float, micros: int, lat: float, lon: float) -> tuple:
+        """Scalar velocity and geo rules for one columnar row, then store it"""
+        entry = self._column_entry(amount, micros, lat, lon)
+        velocity = self._check_velocity(customer_id, entry["timestamp"])
+        geo = self._check_geographic_impossibility(customer_id, entry["location"], entry["timestamp"])
+        self._store_transaction(customer_id, entry)
+        return velocity, geo
+    
+    def _column_entry(self, amount: float, micros: int, lat: float, lon: float) -> Dict:
+        """Transaction dict for one columnar row"""
+        location = {} if np.isnan(lat) else {"lat": float(lat), "lon": float(lon)}
+        return {"timestamp": from_epoch_micros(micros), "location": location, "amount": float(amount)}
+    
+    def _transactions_to_columns(self, transactions: List[Dict[str, Any]], contexts: List[Dict]) -> Dict[str, Any]:
+        """Convert transaction dicts and contexts to score_columns() arguments"""
+        customer_index, merchant_index = {}, {}
+        n = len(transactions)
+        customer_codes = np.empty(n, dtype=np.int64)
+        merchant_codes = np.empty(n, dtype=np.int64)
+        amounts = np.empty(n, dtype=np.float64)
+        timestamps = np.empty(n, dtype=np.int64)
+        lats = np.empty(n, dtype=np.float64)
+        lons = np.empty(n, dtype=np.float64)
+        avg_amounts = np.empty(n, dtype=np.float64)
+        max_amounts = np.empty(n, dtype=np.float64)
+        hour_masks = np.empty(n, dtype=np.int64)
+        mask_cache = {}
+        
+        for i, (transaction, context) in enumerate(zip(transactions, contexts)):
+            customer_id = transaction.get("customer_id")
+            customer_codes[i] = customer_index.setdefault(customer_id, len(customer_index)) if customer_id else -1
+            merchant_codes[i] = merchant_index.setdefault(transaction.get("merchant", ""), len(merchant_index))
+            amounts[i] = transaction.get("amount", 0)
+            timestamps[i] = to_epoch_micros(transaction.get("timestamp", datetime.now()))
+            location = transaction.get("location", {})
+            lats[i] = location.get("lat", 0) if location else np.nan
+            lons[i] = location.get("lon", 0) if location else np.nan
+            
+            customer_profile = context.get("customer_profile", {})
+            avg_amounts[i] = customer_profile.get("avg_transaction_amount", 100)
+            max_amounts[i] = customer_profile.get("max_transaction_amount", 500)
+            usual_hours = customer_profile.get("usual_transaction_hours")
+            if usual_hours is None:
+                hour_masks[i] = DEFAULT_USUAL_HOURS_MASK
+            else:
+                if id(usual_hours) not in mask_cache:
+                    mask_cache[id(usual_hours)] = hours_to_mask(usual_hours)
+                hour_masks[i] = mask_cache[id(usual_hours)]
+        
+        return {
+            "customer_codes": customer_codes,
+            "amounts": amounts,
+            "timestamps": timestamps,
+            "lats": lats,
+            "lons": lons,
+            "merchant_codes": merchant_codes,
+            "customer_ids": list(customer_index),
+            "merchant_names": list(merchant_index),
+            "avg_amounts": avg_amounts,
+            "max_amounts": max_amounts,
+            "usual_hours_masks": hour_masks
+        }
+    
+    def _rule_flags(self, amount: float, amount_score: float, velocity_score: float, geo_score: float,
+                    time_score: float, merchant_score: float) -> List[str]:
+        """Flags for the rules that fired"""
+        flags = []
+        if amount_score >= 25:
+            flags.append(f"HIGH_AMOUNT: €{amount} (2x above max)")
+        elif amount_score > 0:
+            flags.append(f"HIGH_AMOUNT: €{amount} (5x above average)")
+        if velocity_score > 0:
+            flags.append("VELOCITY: Multiple transactions in short window")
+        if geo_score > 0:
+            flags.append("GEO_IMPOSSIBLE: Location change too fast")
+        if time_score > 0:
+            flags.append("TIME_RISK: Unusual transaction time")
         if merchant_score > 0:
-            score += merchant_score
             flags.append("MERCHANT_RISK: High-risk merchant category")
-        
+        return flags
+    
+    def _build_assessment(self, score: float, flags: List[str]) -> RiskAssessment:
+        """Cap the score and map it to an action"""
         # Cap score at 100
         score = min(score, 100)
         
@@ -85,13 +469,6 @@ class TransactionMonitorAgent(BaseFraudAgent):
         else:
             action = "APPROVE"
         
-        # Store transaction for future velocity checks
-        self._store_transaction(customer_id, transaction)
-        
-        # Calculate processing time
-        processing_time = (datetime.now() - start_time).total_seconds() * 1000
-        self.update_metrics(processing_time)
-        
         return RiskAssessment(
             score=score,
             confidence=0.85 if flags else 0.6,
@@ -102,48 +479,46 @@ class TransactionMonitorAgent(BaseFraudAgent):
             agent_name=self.name
         )
     
+    def update_state(self, transaction: Dict[str, Any], context: Dict = None):
+        """Record transaction for velocity/geo checks without scoring"""
+        self._store_transaction(transaction.get("customer_id"), transaction)
+    
     def can_handle(self, transaction_type: str, context: Dict = None) -> float:
         """Can handle all transaction types"""
         return 0.95  # High confidence for all transactions
     
     def _check_velocity(self, customer_id: str, timestamp: datetime) -> float:
         """Check for velocity fraud (multiple transactions in short time)"""
-        if not customer_id or customer_id not in self.recent_transactions:
-            return 0.0
+        counts = self.get_velocity_counts(customer_id, timestamp)
         
-        recent = self.recent_transactions[customer_id]
-        window_start = timestamp - timedelta(minutes=5)
-        
-        # Count transactions in last 5 minutes
-        count = sum(1 for t in recent if t["timestamp"] > window_start)
-        
-        if count >= 5:
-            return 30.0  # Very suspicious
-        elif count >= 3:
-            return 15.0  # Suspicious
-        elif count >= 2:
-            return 5.0   # Mild concern
-        return 0.0
+        score = 0.0
+        for name, thresholds in self.velocity_rules.items():
+            for min_count, rule_score in thresholds:
+                if counts[name] >= min_count:
+                    score = max(score, rule_score)
+                    break
+        return score
+    
+    def get_velocity_counts(self, customer_id: str, timestamp: datetime) -> Dict[str, int]:
+        """Stored transactions inside each configured window ending at timestamp"""
+        window = self.recent_transactions.get(customer_id) if customer_id else None
+        if window is None:
+            return dict.fromkeys(self.velocity_windows, 0)
+        return window.window_counts(to_epoch_micros(timestamp), self._window_micros)
     
     def _check_geographic_impossibility(self, customer_id: str, location: Dict, timestamp: datetime) -> float:
         """Check if location change is physically impossible"""
-        if not customer_id or customer_id not in self.recent_transactions:
-            return 0.0
-        
-        recent = self.recent_transactions[customer_id]
-        if not recent:
+        window = self.recent_transactions.get(customer_id) if customer_id else None
+        if window is None or window.last is None:
             return 0.0
         
-        last_transaction = recent[-1]
-        last_location = last_transaction.get("location", {})
-        last_time = last_transaction.get("timestamp")
-        
-        if not last_location or not last_time:
+        last_time, last_location = window.last
+        if not last_location:
             return 0.0
         
         # Calculate distance and time difference
-        distance_km = self._calculate_distance(last_location, location)
-        time_diff_hours = (timestamp - last_time).total_seconds() / 3600
+        distance_km = self._calculate_distance({"lat": last_location[0], "lon": last_location[1]}, location)
+        time_diff_hours = (to_epoch_micros(timestamp) - last_time) / 1e6 / 3600
         
         if time_diff_hours == 0:
             return 0.0
@@ -205,21 +580,20 @@ class TransactionMonitorAgent(BaseFraudAgent):
         if not customer_id:
             return
         
-        if customer_id not in self.recent_transactions:
-            self.recent_transactions[customer_id] = []
-        
-        self.recent_transactions[customer_id].append({
-            "timestamp": transaction.get("timestamp", datetime.now()),
-            "location": transaction.get("location", {}),
-            "amount": transaction.get("amount", 0)
-        })
-        
-        # Keep only last 24 hours of transactions
-        cutoff = datetime.now() - timedelta(hours=24)
-        self.recent_transactions[customer_id] = [
-            t for t in self.recent_transactions[customer_id]
-            if t["timestamp"] > cutoff
-        ]
+        window = self.recent_transactions.get(customer_id)
+        if window is None:
+            window = self.recent_transactions[customer_id] = VelocityWindow()
+        
+        location = transaction.get("location", {})
+        window.add(
+            to_epoch_micros(transaction.get("timestamp", datetime.now())),
+            (location.get("lat", 0), location.get("lon", 0)) if location else None,
+            transaction.get("amount", 0),
+            self.max_window_entries
+        )
+        
+        # Keep only the retention period (last 24 hours by default)
+        window.expire(to_epoch_micros(datetime.now() - timedelta(hours=self.retention_hours)))
     
     def _generate_explanation(self, flags: List[str], score: float) -> str:
         """Generate human-readable explanation"""
@@ -0,0 +1,77 @@
+"""
+Velocity Index - Time-ordered per-customer transaction windows
+Bisect-based window counts with amortised O(1) expiry
+"""
+from typing import Dict, Optional, Tuple, List
+from bisect import bisect_right
+
+
+class VelocityWindow:
+    """
+    Transactions of one customer, kept sorted by timestamp
+    
+    Timestamps are int microseconds since epoch. Expired entries are skipped
+    by advancing a head index and only physically removed once they make up
+    half of the buffer, so expiry is amortised O(1) per transaction. add()
+    can cap the live entries, dropping the oldest, so a burst from one
+    customer cannot grow the window without bound.
+    """
+    
+    __slots__ = ("timestamps", "locations", "amounts", "head", "last")
+    
+    def __init__(self):
+        self.timestamps: List[int] = []
+        self.locations: List[Optional[Tuple[float, float]]] = []  # (lat, lon), None without location
+        self.amounts: List[float] = []
+        self.head = 0  # Index of the oldest live entry
+        self.last = None  # (timestamp, location) of the most recently added entry
+    
+    def __len__(self) -> int:
+        return len(self.timestamps) - self.head
+    
+    def add(self, timestamp: int, location: Optional[Tuple[float, float]], amount: float,
+            max_entries: Optional[int] = None):
+        """Add a transaction; in-order arrivals are a plain append. Keeps at most max_entries (newest)"""
+        if not self.timestamps or timestamp >= self.timestamps[-1]:
+            self.timestamps.append(timestamp)
+            self.locations.append(location)
+            self.amounts.append(amount)
+        else:
+            index = bisect_right(self.timestamps, timestamp, lo=self.head)
+            self.timestamps.insert(index, timestamp)
+            self.locations.insert(index, location)
+            self.amounts.insert(index, amount)
+        self.last = (timestamp, location)
+        
+        if max_entries is not None and len(self) > max_entries:
+            self.head = len(self.timestamps) - max_entries
+            self._compact()
+    
+    def expire(self, cutoff: int):
+        """Drop entries with timestamp <= cutoff"""
+        self.head = bisect_right(self.timestamps, cutoff, lo=self.head)
+        
+        if self.last is not None and self.last[0] <= cutoff:
+            self.last = (self.timestamps[-1], self.locations[-1]) if len(self) else None
+        
+        self._compact()
+    
+    def _compact(self):
+        """Drop skipped entries once they dominate the buffer"""
+        if self.head > 32 and self.head * 2 >= len(self.timestamps):
+            del self.timestamps[:self.head]
+            del self.locations[:self.head]
+            del self.amounts[:self.head]
+            self.head = 0
+    
+    def count_since(self, start: int) -> int:
+        """Number of live entries with timestamp > start"""
+        return len(self.timestamps) - bisect_right(self.timestamps, start, lo=self.head)
+    
+    def window_counts(self, timestamp: int, windows: Dict[str, int]) -> Dict[str, int]:
+        """Entry counts for several windows (name -> length in microseconds) ending at timestamp"""
+        return {name: self.count_since(timestamp - length) for name, length in windows.items()}
+    
+    def live_entries(self) -> Tuple[List[int], List[Optional[Tuple[float, float]]], List[float]]:
+        """Live timestamps, locations and amounts, oldest first"""
+        return self.timestamps[self.head:], self.locations[self.head:], self.amounts[self.head:]
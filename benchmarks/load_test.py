@@ -0,0 +1,298 @@
+"""
+Load Test - Replays recorded transactions against the gateway
+Open-loop: requests are scheduled at a fixed (or Poisson) arrival rate
+whatever the server's response times, as real card traffic is. Latency is
+measured from each request's intended send time, so time spent queued behind
+slow responses counts (coordinated-omission correction); the uncorrected
+latency from the actual send is reported next to it.
+
+The input is a JSON-lines file with one request body per line, e.g. from
+benchmarks/synthetic.py. Each replayed transaction gets a unique
+transaction_id (the gateway replays retried ids from its idempotency cache)
+and the current timestamp, unless told otherwise.
+
+Run the driver on other cores (or another host) than the gateway: a Python
+client tops out at a few thousand requests/s, and a growing send_delay with
+free concurrency slots means the driver, not the server, is falling behind.
+
+Usage:
+    python benchmarks/synthetic.py --transactions 20000 > traffic.ndjson
+    python benchmarks/load_test.py traffic.ndjson --rates 200,400,800,1600 --duration 20 --slo-p99-ms 100
+    python benchmarks/load_test.py traffic.ndjson --rates 0 --concurrency 32   # closed loop, max throughput
+"""
+from typing import Any, Dict, List, Optional
+from collections import Counter
+from datetime import datetime
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from agents.metrics import LatencyHistogram
+
+
+def load_bodies(path: str) -> List[Dict[str, Any]]:
+    bodies = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                body = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise SystemExit(f"{path}:{line_number}: invalid JSON ({e})")
+            if isinstance(body, dict):
+                bodies.append(body)
+    if not bodies:
+        raise SystemExit(f"{path}: no JSON objects to replay")
+    return bodies
+
+
+class Replayer:
+    """Turns recorded bodies into request payloads, cycling through the file"""
+    
+    def __init__(self, bodies: List[Dict[str, Any]], unique_ids: bool = True, retime: bool = True):
+        self.bodies = itertools.cycle(bodies)
+        self.unique_ids = unique_ids
+        self.retime = retime
+        self.run_tag = f"{time.time_ns() // 1_000_000 % 10**8:08d}"
+        self.sequence = itertools.count()
+    
+    def next_payload(self) -> bytes:
+        body = next(self.bodies)
+        if self.unique_ids or self.retime:
+            body = dict(body)
+            if self.unique_ids:
+                body["transaction_id"] = f"{body.get('transaction_id', 'LOAD')}-{self.run_tag}-{next(self.sequence)}"
+            if self.retime:
+                body["timestamp"] = datetime.now().isoformat()
+        return json.dumps(body).encode()
+
+
+class StepResult:
+    """Latency histograms and outcome counts for one load step"""
+    
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.corrected = LatencyHistogram()  # From intended send time
+        self.uncorrected = LatencyHistogram()  # From actual send time
+        self.send_delay = LatencyHistogram()  # Intended -> actual send (queueing + client lag)
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.wall_seconds = 0.0
+    
+    def record(self, intended_ns: int, sent_ns: int, done_ns: int, status: Optional[int], error: Optional[str]):
+        self.corrected.record(done_ns - intended_ns)
+        self.uncorrected.record(done_ns - sent_ns)
+        self.send_delay.record(max(sent_ns - intended_ns, 0))
+        if error is not None:
+            self.errors[error] += 1
+        else:
+            self.statuses[status] += 1
+    
+    @property
+    def completed(self) -> int:
+        return self.corrected.count
+    
+    @property
+    def failures(self) -> int:
+        return sum(self.errors.values()) + sum(n for status, n in self.statuses.items() if status >= 500)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        def percentiles(histogram: LatencyHistogram) -> Dict[str, float]:
+            return {
+                "p50_ms": round(histogram.percentile(0.5) / 1e6, 3),
+                "p90_ms": round(histogram.percentile(0.9) / 1e6, 3),
+                "p99_ms": round(histogram.percentile(0.99) / 1e6, 3),
+                "p999_ms": round(histogram.percentile(0.999) / 1e6, 3),
+                "max_ms": round(histogram.max_ns / 1e6, 3)
+            }
+        return {
+            "target_rate": self.rate or None,
+            "achieved_rate": round(self.completed / self.wall_seconds, 1) if self.wall_seconds else None,
+            "requests": self.completed,
+            "failures": self.failures,
+            "error_rate": round(self.failures / self.completed, 4) if self.completed else None,
+            "status_codes": {str(status): n for status, n in sorted(self.statuses.items())},
+            "errors": dict(self.errors),
+            "latency": percentiles(self.corrected),
+            "latency_uncorrected": percentiles(self.uncorrected),
+            "send_delay": percentiles(self.send_delay)
+        }
+
+
+async def send(client: httpx.AsyncClient, endpoint: str, payload: bytes, intended_ns: int,
+               semaphore: asyncio.Semaphore, result: Optional[StepResult]):
+    async with semaphore:
+        sent_ns = time.perf_counter_ns()
+        status, error = None, None
+        try:
+            response = await client.post(endpoint, content=payload, headers={"content-type": "application/json"})
+            status = response.status_code
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+        done_ns = time.perf_counter_ns()
+    if result is not None:
+        result.record(intended_ns, sent_ns, done_ns, status, error)
+
+
+async def open_loop(client: httpx.AsyncClient, replayer: Replayer, endpoint: str, rate: float, duration: float,
+                    concurrency: int, poisson: bool, rng: random.Random, record: bool = True) -> Optional[StepResult]:
+    """Send at `rate` requests/s for `duration` seconds, at most `concurrency` in flight"""
+    result = StepResult(rate) if record else None
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = []
+    started_ns = time.perf_counter_ns()
+    end_ns = started_ns + int(duration * 1e9)
+    intended_ns = started_ns
+    while intended_ns < end_ns:
+        delay_ns = intended_ns - time.perf_counter_ns()
+        if delay_ns > 0:
+            await asyncio.sleep(delay_ns / 1e9)
+        # Requests whose slot is not free wait on the semaphore; their latency still counts from intended_ns
+        tasks.append(asyncio.ensure_future(send(client, endpoint, replayer.next_payload(), intended_ns, semaphore, result)))
+        gap = rng.expovariate(rate) if poisson else 1 / rate
+        intended_ns += int(gap * 1e9)
+    await asyncio.gather(*tasks)
+    if result is not None:
+        result.wall_seconds = (time.perf_counter_ns() - started_ns) / 1e9
+    return result
+
+
+async def closed_loop(client: httpx.AsyncClient, replayer: Replayer, endpoint: str, duration: float,
+                      concurrency: int, record: bool = True) -> Optional[StepResult]:
+    """`concurrency` workers sending back to back: maximum throughput, latency is not corrected"""
+    result = StepResult(0) if record else None
+    semaphore = asyncio.Semaphore(concurrency)
+    started_ns = time.perf_counter_ns()
+    end_ns = started_ns + int(duration * 1e9)
+    
+    async def worker():
+        while time.perf_counter_ns() < end_ns:
+            await send(client, endpoint, replayer.next_payload(), time.perf_counter_ns(), semaphore, result)
+    
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    if result is not None:
+        result.wall_seconds = (time.perf_counter_ns() - started_ns) / 1e9
+    return result
+
+
+def make_client(args: argparse.Namespace) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+    if args.in_process:
+        import gateway
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=gateway.app), base_url="http://gateway",
+                                 timeout=timeout)
+    return httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout)
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    replayer = Replayer(load_bodies(args.file), unique_ids=not args.keep_ids, retime=not args.keep_timestamps)
+    rng = random.Random(args.seed)
+    rates = [float(rate) for rate in args.rates.split(",")]
+    steps = []
+    
+    async with make_client(args) as client:
+        if args.warmup > 0:
+            if rates[0] > 0:
+                await open_loop(client, replayer, args.endpoint, rates[0], args.warmup, args.concurrency,
+                                args.arrival == "poisson", rng, record=False)
+            else:
+                await closed_loop(client, replayer, args.endpoint, args.warmup, args.concurrency, record=False)
+        
+        for rate in rates:
+            if rate > 0:
+                result = await open_loop(client, replayer, args.endpoint, rate, args.duration, args.concurrency,
+                                         args.arrival == "poisson", rng)
+            else:
+                result = await closed_loop(client, replayer, args.endpoint, args.duration, args.concurrency)
+            step = result.to_dict()
+            steps.append(step)
+            print_step(step)
+    
+    report = {
+        "meta": {
+            "file": args.file,
+            "target": "in-process" if args.in_process else args.url,
+            "endpoint": args.endpoint,
+            "arrival": args.arrival,
+            "duration_seconds": args.duration,
+            "concurrency": args.concurrency,
+            "timestamp": datetime.now().isoformat(timespec="seconds")
+        },
+        "steps": steps
+    }
+    if args.slo_p99_ms is not None:
+        report["slo"] = slo_verdict(steps, args.slo_p99_ms, args.max_error_rate)
+    return report
+
+
+def slo_verdict(steps: List[Dict[str, Any]], p99_ms: float, max_error_rate: float) -> Dict[str, Any]:
+    """Highest open-loop rate whose corrected p99 and error rate stay within the SLO"""
+    passing = [
+        step for step in steps
+        if step["target_rate"] and step["latency"]["p99_ms"] <= p99_ms and (step["error_rate"] or 0) <= max_error_rate
+    ]
+    best = max(passing, key=lambda step: step["target_rate"], default=None)
+    return {
+        "p99_ms": p99_ms,
+        "max_error_rate": max_error_rate,
+        "max_sustained_rate": best["target_rate"] if best else None,
+        "achieved_rate": best["achieved_rate"] if best else None
+    }
+
+
+def print_step(step: Dict[str, Any]):
+    target = f"{step['target_rate']:.0f}/s" if step["target_rate"] else "closed"
+    latency, uncorrected = step["latency"], step["latency_uncorrected"]
+    print(f"{target:>10} achieved {step['achieved_rate'] or 0:>8.1f}/s  "
+          f"p50 {latency['p50_ms']:>8.2f}  p99 {latency['p99_ms']:>8.2f}  p99.9 {latency['p999_ms']:>8.2f} ms  "
+          f"(uncorrected p99 {uncorrected['p99_ms']:.2f})  errors {step['failures']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", help="JSON-lines file, one request body per line")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", default="/api/v1/fraud/evaluate")
+    parser.add_argument("--in-process", action="store_true", help="Drive gateway.app over ASGI instead of HTTP")
+    parser.add_argument("--rates", default="100,200,400",
+                        help="Comma-separated arrival rates (requests/s) run in turn; 0 = closed loop")
+    parser.add_argument("--arrival", choices=("constant", "poisson"), default="poisson")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per rate")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unrecorded seconds before the first rate")
+    parser.add_argument("--concurrency", type=int, default=64, help="Maximum requests in flight")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout (seconds)")
+    parser.add_argument("--keep-ids", action="store_true", help="Send the recorded transaction_ids unchanged")
+    parser.add_argument("--keep-timestamps", action="store_true", help="Send the recorded timestamps unchanged")
+    parser.add_argument("--slo-p99-ms", type=float, help="Report the highest rate with p99 within this")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=1, help="Seed for Poisson inter-arrival times")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+    
+    report = asyncio.run(run(args))
+    if "slo" in report:
+        slo = report["slo"]
+        if slo["max_sustained_rate"] is None:
+            print(f"\nNo rate kept p99 <= {slo['p99_ms']}ms")
+        else:
+            print(f"\nMax sustained rate with p99 <= {slo['p99_ms']}ms: {slo['max_sustained_rate']:.0f}/s")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
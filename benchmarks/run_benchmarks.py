@@ -0,0 +1,313 @@
+"""
+Benchmark Suite - Throughput, latency and memory on synthetic traffic
+Streams the same seeded traffic (see synthetic.py) through each agent on its
+own, through RiskOrchestrator.evaluate / evaluate_many, and through the
+gateway over ASGI (no network), and writes the results as JSON. Comparing
+against the JSON of an earlier commit flags regressions.
+
+Each target gets fresh agents, so per-customer state builds up exactly as it
+would in production. Memory is measured in a separate tracemalloc pass
+because tracing allocations slows execution down.
+
+Usage:
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --compare results.json --threshold 0.15
+"""
+from typing import Any, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from agents import RiskOrchestrator, TransactionMonitorAgent, BehavioralAnalysisAgent
+from agents.identity_verification import IdentityVerificationAgent
+from agents.anomaly_detection import AnomalyDetectionAgent
+from agents.device_fingerprint import DeviceFingerprintAgent
+from synthetic import TransactionGenerator, SyntheticTraffic, to_json
+
+AGENTS = {
+    "transaction_monitor": TransactionMonitorAgent,
+    "behavioral_analysis": BehavioralAnalysisAgent,
+    "identity_verification": IdentityVerificationAgent,
+    "anomaly_detection": AnomalyDetectionAgent,
+    "device_fingerprint": DeviceFingerprintAgent,
+}
+BATCH_SIZE = 256
+# Compared between runs: (result key, higher is better)
+COMPARED = (("throughput_per_s", True), ("p50_us", False), ("p99_us", False))
+
+
+def build_orchestrator() -> RiskOrchestrator:
+    orchestrator = RiskOrchestrator()
+    for agent_class in AGENTS.values():
+        orchestrator.register_agent(agent_class())
+    return orchestrator
+
+
+def summarize(latencies_ns: List[int], wall_seconds: float, items: int) -> Dict[str, Any]:
+    """Throughput and latency percentiles (microseconds)"""
+    latencies = np.asarray(latencies_ns, dtype=np.float64) / 1000
+    return {
+        "items": items,
+        "wall_seconds": round(wall_seconds, 4),
+        "throughput_per_s": round(items / wall_seconds, 1) if wall_seconds else None,
+        "mean_us": round(float(latencies.mean()), 2),
+        "p50_us": round(float(np.percentile(latencies, 50)), 2),
+        "p90_us": round(float(np.percentile(latencies, 90)), 2),
+        "p99_us": round(float(np.percentile(latencies, 99)), 2),
+        "p999_us": round(float(np.percentile(latencies, 99.9)), 2),
+        "max_us": round(float(latencies.max()), 2)
+    }
+
+
+def time_calls(call: Callable[[int], Any], count: int) -> Dict[str, Any]:
+    """Time call(i) for i in range(count)"""
+    latencies = [0] * count
+    gc.collect()
+    started = time.perf_counter()
+    for i in range(count):
+        call_started = time.perf_counter_ns()
+        call(i)
+        latencies[i] = time.perf_counter_ns() - call_started
+    return summarize(latencies, time.perf_counter() - started, count)
+
+
+def measure_memory(setup: Callable[[], Callable[[int], Any]], count: int, customers: int) -> Dict[str, Any]:
+    """Memory retained by the state built while streaming the traffic, and the peak during it"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        call = setup()
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for i in range(count):
+            call(i)
+        gc.collect()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    retained = after - before
+    return {
+        "retained_bytes": retained,
+        "peak_bytes": peak - before,
+        "retained_bytes_per_customer": round(retained / customers, 1) if customers else None
+    }
+
+
+def bench_agent(name: str, traffic: SyntheticTraffic, memory: bool) -> Dict[str, Any]:
+    transactions, contexts = traffic.transactions, traffic.contexts
+    
+    def setup():
+        agent = AGENTS[name]()
+        return lambda i: agent.evaluate(transactions[i], contexts[i])
+    
+    result = time_calls(setup(), len(traffic))
+    if memory:
+        result["memory"] = measure_memory(setup, len(traffic), traffic.customers)
+    return result
+
+
+def bench_orchestrator(traffic: SyntheticTraffic, memory: bool) -> Dict[str, Any]:
+    transactions, contexts = traffic.transactions, traffic.contexts
+    actions = [None] * len(traffic)
+    
+    def setup():
+        orchestrator = build_orchestrator()
+        
+        def call(i):
+            actions[i] = orchestrator.evaluate(transactions[i], contexts[i]).recommended_action
+        return call
+    
+    result = time_calls(setup(), len(traffic))
+    result["detection"] = detection_stats(actions, traffic.fraud_types)
+    if memory:
+        result["memory"] = measure_memory(setup, len(traffic), traffic.customers)
+    return result
+
+
+def bench_orchestrator_batch(traffic: SyntheticTraffic) -> Dict[str, Any]:
+    """evaluate_many in BATCH_SIZE chunks; latency is per batch, throughput per transaction"""
+    orchestrator = build_orchestrator()
+    starts = list(range(0, len(traffic), BATCH_SIZE))
+    
+    def call(b):
+        start = starts[b]
+        orchestrator.evaluate_many(traffic.transactions[start:start + BATCH_SIZE],
+                                   traffic.contexts[start:start + BATCH_SIZE])
+    
+    result = time_calls(call, len(starts))
+    result["batch_size"] = BATCH_SIZE
+    result["items"] = len(traffic)
+    result["throughput_per_s"] = round(len(traffic) / result["wall_seconds"], 1)
+    return result
+
+
+def bench_gateway(traffic: SyntheticTraffic, count: int) -> Dict[str, Any]:
+    """POST /api/v1/fraud/evaluate in-process over ASGI, one request at a time"""
+    import httpx
+    import gateway
+    
+    bodies = [json.dumps(to_json(transaction)).encode() for transaction in traffic.transactions[:count]]
+    latencies = [0] * len(bodies)
+    statuses = {}
+    
+    async def run() -> float:
+        transport = httpx.ASGITransport(app=gateway.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            started = time.perf_counter()
+            for i, body in enumerate(bodies):
+                call_started = time.perf_counter_ns()
+                response = await client.post("/api/v1/fraud/evaluate", content=body,
+                                             headers={"content-type": "application/json"})
+                latencies[i] = time.perf_counter_ns() - call_started
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            return time.perf_counter() - started
+    
+    gc.collect()
+    wall_seconds = asyncio.run(run())
+    result = summarize(latencies, wall_seconds, len(bodies))
+    result["status_codes"] = {str(code): n for code, n in statuses.items()}
+    return result
+
+
+def detection_stats(actions: List[str], fraud_types: List[Optional[str]]) -> Dict[str, Any]:
+    """How the decisions line up with the injected fraud (sanity check, not a model evaluation)"""
+    fraud = [fraud_type is not None for fraud_type in fraud_types]
+    flagged = [action in ("REVIEW", "BLOCK") for action in actions]
+    fraud_count = sum(fraud)
+    legit_count = len(fraud) - fraud_count
+    caught = sum(1 for is_fraud, hit in zip(fraud, flagged) if is_fraud and hit)
+    false_alarms = sum(1 for is_fraud, hit in zip(fraud, flagged) if not is_fraud and hit)
+    by_type = {}
+    for fraud_type, hit in zip(fraud_types, flagged):
+        if fraud_type is not None:
+            counts = by_type.setdefault(fraud_type, [0, 0])
+            counts[0] += hit
+            counts[1] += 1
+    return {
+        "fraud_transactions": fraud_count,
+        "recall": round(caught / fraud_count, 4) if fraud_count else None,
+        "false_positive_rate": round(false_alarms / legit_count, 4) if legit_count else None,
+        "recall_by_type": {name: round(hit / total, 4) for name, (hit, total) in sorted(by_type.items())},
+        "actions": {action: actions.count(action) for action in ("APPROVE", "REVIEW", "BLOCK")}
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print the change per target and metric; return the regressions beyond threshold"""
+    regressions = []
+    print(f"\nvs. {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')})")
+    for key in ("seed", "transactions", "customers", "python"):
+        if baseline["meta"].get(key) != results["meta"].get(key):
+            print(f"warning: {key} differs ({baseline['meta'].get(key)} vs {results['meta'].get(key)}), results are not comparable")
+    print(f"{'target':<36}{'metric':<18}{'baseline':>12}{'current':>12}{'change':>9}")
+    for target, current in results["targets"].items():
+        previous = baseline.get("targets", {}).get(target)
+        if previous is None:
+            continue
+        for key, higher_is_better in COMPARED:
+            old, new = previous.get(key), current.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            marker = "  <-- regression" if worse > threshold else ""
+            print(f"{target:<36}{key:<18}{old:>12.1f}{new:>12.1f}{change:>+8.1%}{marker}")
+            if marker:
+                regressions.append(f"{target} {key}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=20000)
+    parser.add_argument("--customers", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fraud-rate", type=float, default=0.01)
+    parser.add_argument("--gateway-requests", type=int, default=5000,
+                        help="Requests sent through the gateway (0 skips it)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc passes")
+    parser.add_argument("--only", nargs="*", help="Run only these targets (e.g. transaction_monitor gateway)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier results JSON to compare with")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown reported as a regression (exit code 1)")
+    args = parser.parse_args()
+    
+    generator = TransactionGenerator(customers=args.customers, seed=args.seed, fraud_rate=args.fraud_rate)
+    traffic = generator.generate(args.transactions)
+    memory = not args.no_memory
+    wanted = set(args.only) if args.only else None
+    
+    def selected(target: str) -> bool:
+        return wanted is None or target in wanted or target.split(".")[0] in wanted
+    
+    targets = {}
+    for name in AGENTS:
+        if selected(name):
+            targets[f"{name}.evaluate"] = bench_agent(name, traffic, memory)
+    if selected("risk_orchestrator.evaluate"):
+        targets["risk_orchestrator.evaluate"] = bench_orchestrator(traffic, memory)
+    if selected("risk_orchestrator.evaluate_many"):
+        targets["risk_orchestrator.evaluate_many"] = bench_orchestrator_batch(traffic)
+    if args.gateway_requests and selected("gateway"):
+        targets["gateway.evaluate"] = bench_gateway(traffic, min(args.gateway_requests, len(traffic)))
+    
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "seed": args.seed,
+            "transactions": len(traffic),
+            "customers": args.customers,
+            "fraud_transactions": traffic.fraud_count
+        },
+        "targets": targets
+    }
+    
+    print(f"{'target':<36}{'txn/s':>10}{'p50 µs':>10}{'p99 µs':>10}{'retained KB':>13}")
+    for target, result in targets.items():
+        retained = result.get("memory", {}).get("retained_bytes")
+        retained_text = f"{retained / 1024:>13.0f}" if retained is not None else f"{'-':>13}"
+        print(f"{target:<36}{result['throughput_per_s']:>10.0f}{result['p50_us']:>10.1f}{result['p99_us']:>10.1f}{retained_text}")
+    if "risk_orchestrator.evaluate" in targets:
+        print("detection:", json.dumps(targets["risk_orchestrator.evaluate"]["detection"]))
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Synthetic Transactions - Reproducible traffic for benchmarks
+Customers with a home city, spending level, usual hours, favourite merchants
+and a device; activity follows a power law (a few customers transact a lot),
+locations jitter around home, some transactions arrive in velocity bursts and
+a fraction are injected fraud patterns. The same seed gives the same traffic.
+
+Timestamps start at today's midnight: agents expire history relative to the
+current time, so fixed past dates would never exercise velocity/geo rules.
+
+Usage:
+    python benchmarks/synthetic.py --transactions 1000 > traffic.ndjson
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+from datetime import datetime, date, time, timedelta
+import argparse
+import itertools
+import json
+import math
+import random
+import sys
+
+CITIES = [
+    ("Lisboa", 38.7223, -9.1393),
+    ("Porto", 41.1579, -8.6291),
+    ("Braga", 41.5454, -8.4265),
+    ("Coimbra", 40.2033, -8.4103),
+    ("Faro", 37.0194, -7.9304),
+    ("Madrid", 40.4168, -3.7038),
+    ("Paris", 48.8566, 2.3522),
+    ("Lille", 50.6292, 3.0573),
+]
+FAR_AWAY = [(40.7128, -74.0060), (-23.5505, -46.6333), (35.6762, 139.6503), (1.3521, 103.8198)]
+
+MERCHANTS = [
+    ("Continente", "grocery"), ("Pingo Doce", "grocery"), ("Lidl", "grocery"),
+    ("Galp", "fuel"), ("Repsol", "fuel"), ("Uber", "transport"), ("CP Comboios", "transport"),
+    ("Amazon", "e-commerce"), ("Worten", "electronics"), ("Fnac", "electronics"),
+    ("Zara", "fashion"), ("IKEA", "home"), ("Netflix", "subscription"), ("Spotify", "subscription"),
+    ("McDonald's", "restaurant"), ("Vodafone", "telecom"), ("Farmácia Central", "pharmacy"),
+]
+RISKY_MERCHANTS = [("Binance crypto", "crypto"), ("Online gambling", "gambling"), ("QuickCash money_transfer", "money_transfer")]
+
+DEVICES = [
+    {"user_agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) Safari/604.1", "platform": "iPhone",
+     "screen_resolution": "1170x2532", "color_depth": "24", "timezone": "Europe/Lisbon", "language": "pt-PT", "touch_support": "true"},
+    {"user_agent": "Mozilla/5.0 (Linux; Android 14; SM-S911B) Chrome/120.0 Mobile", "platform": "Android",
+     "screen_resolution": "1080x2340", "color_depth": "24", "timezone": "Europe/Lisbon", "language": "pt-PT", "touch_support": "true"},
+    {"user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0 Safari/537.36", "platform": "Win32",
+     "screen_resolution": "1920x1080", "color_depth": "24", "timezone": "Europe/Lisbon", "language": "pt-PT", "touch_support": "false"},
+    {"user_agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_2) Safari/605.1.15", "platform": "MacIntel",
+     "screen_resolution": "2560x1600", "color_depth": "30", "timezone": "Europe/Paris", "language": "fr-FR", "touch_support": "false"},
+]
+EMULATOR_DEVICE = {"user_agent": "Mozilla/5.0 (Linux; Android 9; Android SDK built for x86) HeadlessChrome/90.0",
+                   "platform": "Linux x86_64", "screen_resolution": "800x600", "color_depth": "16",
+                   "timezone": "UTC", "language": "en-US", "touch_support": "false"}
+
+FRAUD_TYPES = ("high_amount", "impossible_travel", "night_risky_merchant", "new_device", "card_testing", "identity")
+
+
+@dataclass
+class SyntheticCustomer:
+    """Spending pattern a customer's legitimate transactions are drawn from"""
+    customer_id: str
+    home: Tuple[float, float]
+    avg_amount: float
+    usual_hours: List[int]
+    merchants: List[Tuple[str, str]]
+    device_id: str
+    device_info: Dict[str, Any]
+    profile: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class SyntheticTraffic:
+    """Transactions in timestamp order with their evaluation contexts and labels"""
+    transactions: List[Dict[str, Any]]
+    contexts: List[Dict[str, Any]]
+    fraud_types: List[Optional[str]]  # None for legitimate transactions
+    customers: int
+    
+    def __len__(self) -> int:
+        return len(self.transactions)
+    
+    @property
+    def fraud_count(self) -> int:
+        return sum(1 for fraud_type in self.fraud_types if fraud_type)
+
+
+class TransactionGenerator:
+    """
+    Seeded generator of realistic card traffic
+    
+    Args:
+        customers: Customer population size
+        seed: Random seed; equal seeds give identical traffic
+        fraud_rate: Fraction of events replaced by an injected fraud pattern
+        burst_rate: Fraction of legitimate events followed by a velocity burst
+        zipf_exponent: Power-law exponent of customer activity (higher = more skewed)
+        duration_hours: Simulated time span the traffic is spread over
+        identity_rate: Fraction of transactions carrying KYC identity data
+        start: First timestamp (default: today's midnight)
+    """
+    
+    def __init__(self, customers: int = 5000, seed: int = 42, fraud_rate: float = 0.01,
+                 burst_rate: float = 0.02, zipf_exponent: float = 1.1, duration_hours: float = 24.0,
+                 identity_rate: float = 0.1, start: Optional[datetime] = None):
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.fraud_rate = fraud_rate
+        self.burst_rate = burst_rate
+        self.duration_seconds = duration_hours * 3600
+        self.identity_rate = identity_rate
+        self.start = start or datetime.combine(date.today(), time())
+        self.customers = [self._make_customer(i) for i in range(customers)]
+        # Power-law activity: the customer of rank r is picked with weight 1/r^s
+        self.cum_weights = list(itertools.accumulate(1 / (rank ** zipf_exponent) for rank in range(1, customers + 1)))
+        self.ids = itertools.count()
+    
+    def generate(self, n: int) -> SyntheticTraffic:
+        """About n transactions (bursts may add a few), sorted by timestamp"""
+        rng = self.rng
+        events = []  # (offset seconds, transaction, context, fraud type)
+        picks = rng.choices(self.customers, cum_weights=self.cum_weights, k=n)
+        offsets = sorted(rng.uniform(0, self.duration_seconds) for _ in range(n))
+        
+        for customer, offset in zip(picks, offsets):
+            if len(events) >= n:
+                break
+            if rng.random() < self.fraud_rate:
+                events.extend(self._fraud(customer, offset, rng.choice(FRAUD_TYPES)))
+                continue
+            events.append(self._legitimate(customer, offset))
+            if rng.random() < self.burst_rate:
+                # Velocity burst: a few more purchases within the next minutes
+                burst_offset = offset
+                for _ in range(rng.randint(2, 5)):
+                    burst_offset += rng.uniform(5, 90)
+                    events.append(self._legitimate(customer, burst_offset, shift_hours=False))
+        
+        events.sort(key=lambda event: event[0])
+        return SyntheticTraffic(
+            transactions=[event[1] for event in events],
+            contexts=[event[2] for event in events],
+            fraud_types=[event[3] for event in events],
+            customers=len(self.customers)
+        )
+    
+    def _make_customer(self, index: int) -> SyntheticCustomer:
+        rng = self.rng
+        _, lat, lon = rng.choice(CITIES)
+        avg_amount = round(math.exp(rng.gauss(math.log(60), 0.7)), 2)
+        first_hour = rng.randint(6, 10)
+        usual_hours = list(range(first_hour, min(first_hour + rng.randint(10, 15), 24)))
+        device_info = dict(rng.choice(DEVICES))
+        return SyntheticCustomer(
+            customer_id=f"CUST-{index:07d}",
+            home=(lat + rng.gauss(0, 0.1), lon + rng.gauss(0, 0.1)),
+            avg_amount=avg_amount,
+            usual_hours=usual_hours,
+            merchants=rng.sample(MERCHANTS, rng.randint(3, 8)),
+            device_id=f"DEV-{index:07d}",
+            device_info=device_info,
+            profile={
+                "avg_transaction_amount": avg_amount,
+                "max_transaction_amount": round(avg_amount * 5, 2),
+                "usual_transaction_hours": usual_hours
+            }
+        )
+    
+    def _legitimate(self, customer: SyntheticCustomer, offset: float, shift_hours: bool = True) -> tuple:
+        rng = self.rng
+        # Shift into the customer's usual hours most of the time
+        timestamp = self.start + timedelta(seconds=offset)
+        if shift_hours and timestamp.hour not in customer.usual_hours and rng.random() < 0.9:
+            timestamp = timestamp.replace(hour=rng.choice(customer.usual_hours))
+            offset = (timestamp - self.start).total_seconds()
+        merchant, category = rng.choice(customer.merchants)
+        amount = round(customer.avg_amount * math.exp(rng.gauss(0, 0.5)), 2)
+        location = {"lat": customer.home[0] + rng.gauss(0, 0.03), "lon": customer.home[1] + rng.gauss(0, 0.03)}
+        return self._event(customer, offset, amount, merchant, category, location, None)
+    
+    def _fraud(self, customer: SyntheticCustomer, offset: float, fraud_type: str) -> List[tuple]:
+        """One injected fraud pattern (card testing yields several transactions)"""
+        rng = self.rng
+        merchant, category = rng.choice(customer.merchants)
+        location = {"lat": customer.home[0], "lon": customer.home[1]}
+        amount = round(customer.avg_amount * math.exp(rng.gauss(0, 0.5)), 2)
+        overrides = {}
+        
+        if fraud_type == "high_amount":
+            amount = round(customer.avg_amount * rng.uniform(15, 60), 2)
+            merchant, category = rng.choice([("Worten", "electronics"), ("Fnac", "electronics"), ("Amazon", "e-commerce")])
+        elif fraud_type == "impossible_travel":
+            lat, lon = rng.choice(FAR_AWAY)
+            location = {"lat": lat, "lon": lon}
+            amount = round(customer.avg_amount * rng.uniform(2, 8), 2)
+        elif fraud_type == "night_risky_merchant":
+            offset = offset - offset % 86400 + rng.uniform(1, 4.5) * 3600
+            merchant, category = rng.choice(RISKY_MERCHANTS)
+            amount = round(customer.avg_amount * rng.uniform(3, 10), 2)
+        elif fraud_type == "new_device":
+            overrides = {"device_id": f"DEV-X{next(self.ids)}", "device_info": EMULATOR_DEVICE}
+            amount = round(customer.avg_amount * rng.uniform(3, 10), 2)
+        elif fraud_type == "card_testing":
+            events = []
+            for _ in range(rng.randint(5, 10)):
+                offset += rng.uniform(2, 20)
+                merchant, category = rng.choice(RISKY_MERCHANTS + [("Netflix", "subscription")])
+                events.append(self._event(customer, offset, round(rng.uniform(0.5, 3), 2), merchant, category,
+                                          location, fraud_type))
+            return events
+        elif fraud_type == "identity":
+            overrides = {"identity_data": {
+                "document": {"type": "passport", "number": "X12", "expiry_date": "2020-01-01", "name": "john doe"},
+                "biometric": {"face_match_score": rng.uniform(0.2, 0.6), "deepfake_detected": rng.random() < 0.3},
+                "personal": {"name": "jane roe"}
+            }}
+        
+        return [self._event(customer, offset, amount, merchant, category, location, fraud_type, **overrides)]
+    
+    def _event(self, customer: SyntheticCustomer, offset: float, amount: float, merchant: str, category: str,
+               location: Dict[str, float], fraud_type: Optional[str], device_id: Optional[str] = None,
+               device_info: Optional[Dict[str, Any]] = None, identity_data: Optional[Dict[str, Any]] = None) -> tuple:
+        transaction = {
+            "transaction_id": f"SYN-{self.seed}-{next(self.ids):09d}",
+            "customer_id": customer.customer_id,
+            "amount": amount,
+            "currency": "EUR",
+            "merchant": merchant,
+            "merchant_category": category,
+            "location": location,
+            "timestamp": self.start + timedelta(seconds=offset),
+            "card_type": "credit",
+            "channel": "online",
+            "device_id": device_id or customer.device_id,
+            "device_info": device_info or customer.device_info
+        }
+        context = {"customer_profile": customer.profile}
+        if identity_data is not None:
+            context["identity_data"] = identity_data
+        elif self.rng.random() < self.identity_rate:
+            context["identity_data"] = {
+                "document": {"type": "passport", "number": f"P{customer.customer_id[-7:]}", "expiry_date": "2031-06-30"},
+                "biometric": {"face_match_score": round(self.rng.uniform(0.85, 0.99), 3)}
+            }
+        return (offset, transaction, context, fraud_type)
+
+
+def to_json(transaction: Dict[str, Any]) -> Dict[str, Any]:
+    """Transaction as a gateway request body (timestamp as ISO string)"""
+    body = dict(transaction)
+    body["timestamp"] = transaction["timestamp"].isoformat()
+    return body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=1000)
+    parser.add_argument("--customers", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fraud-rate", type=float, default=0.01)
+    args = parser.parse_args()
+    
+    generator = TransactionGenerator(customers=args.customers, seed=args.seed, fraud_rate=args.fraud_rate)
+    traffic = generator.generate(args.transactions)
+    for transaction in traffic.transactions:
+        sys.stdout.write(json.dumps(to_json(transaction)) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,25 +2,100 @@
 Cofidis Fraud Detector - API Gateway
 FastAPI application exposing fraud detection endpoints
 """
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import Dict, Any, List, Optional
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
 from datetime import datetime
+from functools import partial
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import os
+import time
 import uvicorn
 
 # Import agents
-from agents.transaction_monitor import TransactionMonitorAgent
-from agents.behavioral_analysis import BehavioralAnalysisAgent
-from agents.identity_verification import IdentityVerificationAgent
-from agents.risk_orchestrator import RiskOrchestrator
+from agents.pipeline import StatePersistence, build_orchestrator
+from agents.profile_store import DEFAULT_PROFILE, ProfileStore
+from agents.case_store import CASE_STATUSES, CaseStore
+from agents.audit_trail import AuditTrail
+from agents.sharding import ShardedOrchestrator
+from agents.base_agent import RiskAssessment
+from agents.metrics import registry
+from agents.tracing import tracer
+from agents.profiler import ProfilerBusyError, render_collapsed, sampler, top_functions
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Restore agent state and start scoring shards and profile/case/audit writes (if any) before serving; flush and stop on shutdown"""
+    if isinstance(orchestrator, ShardedOrchestrator):
+        await run_in_threadpool(orchestrator.start)
+        print(f"📊 Registered agents: {list(orchestrator.agents.keys())}")
+    if audit is not None:
+        audit.weights = dict(orchestrator.weights)
+        audit.start()
+    if persistence is not None:
+        await run_in_threadpool(persistence.restore)
+        persistence.start()
+    if profiles is not None:
+        profiles.start()
+    if cases is not None:
+        cases.start()
+    yield
+    if persistence is not None:
+        await run_in_threadpool(persistence.stop)
+    if profiles is not None:
+        await run_in_threadpool(profiles.close)
+    if cases is not None:
+        await run_in_threadpool(cases.close)
+    if audit is not None:
+        await run_in_threadpool(audit.close)
+    orchestrator.shutdown()
 
 app = FastAPI(
     title="Cofidis Fraud Detector",
     description="Multi-Agent System for Real-time Fraud Detection",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+HTTP_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response is complete",
+    ["method", "route", "status"])
+
+class MetricsMiddleware:
+    """Records HTTP request latency by method, route template and status"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter_ns()
+        status = 500
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Route template, not the raw path, to keep label cardinality bounded
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            HTTP_LATENCY.labels(scope["method"], route_path, str(status)).record(time.perf_counter_ns() - started)
+
+app.add_middleware(MetricsMiddleware)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -30,23 +105,129 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def _parse_agent_timeouts(value: str) -> Dict[str, float]:
+    """Parse "agent=ms,agent=ms" into a timeout map"""
+    timeouts = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, ms = item.partition("=")
+        timeouts[name.strip()] = float(ms)
+    return timeouts
+
 # Initialize system
-orchestrator = RiskOrchestrator()
+# AGENT_EXECUTION_MODE=concurrent fans agents out to a thread pool in synchronous evaluate(), which here
+# only serves single evaluations with a budget or agent timeouts on shards (SHARDS>1); /evaluate and the
+# websocket in one process use evaluate_async() (CPU agents inline, blocking I/O agents on the pool) and
+# batches run agent by agent, whatever the mode
+# REQUEST_BUDGET_MS / AGENT_TIMEOUTS_MS bound how long a decision may wait on agents
+# AGENT_EARLY_TERMINATION=1 skips agents that can no longer change the decision
+# IDEMPOTENCY_TTL_SECONDS replays the assessment of exact retries, keyed by customer_id + transaction_id
+# (0 disables); a reused ID with a different amount/merchant/location/timestamp is scored again
+# Per-customer agent state is bounded: STATE_MAX_ENTRIES per store, idle entries expire after STATE_TTL_SECONDS
+idempotency_ttl = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "300"))
+orchestrator_settings = dict(
+    execution_mode=os.getenv("AGENT_EXECUTION_MODE", "sequential"),
+    request_budget_ms=float(os.environ["REQUEST_BUDGET_MS"]) if os.getenv("REQUEST_BUDGET_MS") else None,
+    agent_timeouts_ms=_parse_agent_timeouts(os.getenv("AGENT_TIMEOUTS_MS", "")),
+    early_termination=os.getenv("AGENT_EARLY_TERMINATION", "0") == "1",
+    idempotency_ttl_seconds=idempotency_ttl if idempotency_ttl > 0 else None,
+    idempotency_max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "100000")),
+    state_max_entries=int(os.getenv("STATE_MAX_ENTRIES", "100000")),
+    state_ttl_seconds=float(os.environ["STATE_TTL_SECONDS"]) if os.getenv("STATE_TTL_SECONDS") else None
+)
+
+# Warm restarts: with SNAPSHOT_PATH set, agent state is restored at startup, written
+# every SNAPSHOT_INTERVAL_SECONDS in the background and once more on shutdown.
+# With EVENT_LOG_DIR set, every scored transaction is also logged (batched every
+# EVENT_LOG_FLUSH_MS, fsynced unless EVENT_LOG_FSYNC=0) and the tail after the
+# snapshot is replayed at startup
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH") or None
+EVENT_LOG_DIR = os.getenv("EVENT_LOG_DIR") or None
+persistence_settings = dict(
+    snapshot_path=SNAPSHOT_PATH,
+    snapshot_interval_seconds=float(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "300")),
+    event_log_dir=EVENT_LOG_DIR,
+    event_log_options=dict(
+        fsync=os.getenv("EVENT_LOG_FSYNC", "1") == "1",
+        flush_interval_ms=float(os.getenv("EVENT_LOG_FLUSH_MS", "10")),
+        segment_bytes=int(float(os.getenv("EVENT_LOG_SEGMENT_MB", "64")) * 1024 * 1024)
+    )
+)
 
-# Create agents
-transaction_monitor = TransactionMonitorAgent()
-behavioral_analysis = BehavioralAnalysisAgent()
-identity_verification = IdentityVerificationAgent()
+# SHARDS>1 scores in that many worker processes, each owning the state of the
+# customers hashed to it; the processes start with the application.
+# Agent metrics, trace spans and profiler samples stay inside the shard processes,
+# so /metrics only has the gateway series and /admin/traces, /admin/profile are empty
+SHARDS = int(os.getenv("SHARDS", "1"))
+persistence: Optional[StatePersistence] = None
+if SHARDS > 1:
+    # Each shard snapshots and logs its own state
+    orchestrator = ShardedOrchestrator(
+        partial(build_orchestrator, **orchestrator_settings), shards=SHARDS, persistence=persistence_settings
+    )
+else:
+    orchestrator = build_orchestrator(**orchestrator_settings)
+    if SNAPSHOT_PATH or EVENT_LOG_DIR:
+        persistence = StatePersistence(orchestrator, **persistence_settings, meta={"shard": 0, "shards": 1})
 
-# Register all agents
-orchestrator.register_agent(transaction_monitor)
-orchestrator.register_agent(behavioral_analysis)
-orchestrator.register_agent(identity_verification)
+# Customer profiles: with PROFILE_DB_PATH set, profiles are learned from scored
+# transactions into SQLite and read through an LRU cache of PROFILE_CACHE_ENTRIES
+# (re-read after PROFILE_CACHE_TTL_SECONDS if set); without it every customer
+# gets DEFAULT_PROFILE
+PROFILE_DB_PATH = os.getenv("PROFILE_DB_PATH") or None
+profiles: Optional[ProfileStore] = None
+if PROFILE_DB_PATH:
+    profiles = ProfileStore(
+        PROFILE_DB_PATH,
+        cache_entries=int(os.getenv("PROFILE_CACHE_ENTRIES", "100000")),
+        cache_ttl_seconds=float(os.environ["PROFILE_CACHE_TTL_SECONDS"]) if os.getenv("PROFILE_CACHE_TTL_SECONDS") else None,
+        min_history=int(os.getenv("PROFILE_MIN_HISTORY", "10")),
+        flush_interval_ms=float(os.getenv("PROFILE_FLUSH_MS", "500"))
+    )
+
+# Fraud cases: with CASE_DB_PATH set, REVIEW/BLOCK assessments open cases in
+# SQLite, inserted in batches every CASE_FLUSH_MS, for /api/v1/fraud/cases
+CASE_DB_PATH = os.getenv("CASE_DB_PATH") or None
+cases: Optional[CaseStore] = None
+if CASE_DB_PATH:
+    cases = CaseStore(CASE_DB_PATH, flush_interval_ms=float(os.getenv("CASE_FLUSH_MS", "200")))
+
+# Audit trail: with AUDIT_DIR set, every decision (inputs, per-agent scores and
+# weights, flags, explanation) is queued and written every AUDIT_FLUSH_MS to
+# gzip JSON-lines files rotated after AUDIT_ROTATE_MB; beyond AUDIT_MAX_PENDING
+# queued decisions new ones are dropped and counted
+AUDIT_DIR = os.getenv("AUDIT_DIR") or None
+audit: Optional[AuditTrail] = None
+if AUDIT_DIR:
+    audit = AuditTrail(
+        AUDIT_DIR,
+        max_pending=int(os.getenv("AUDIT_MAX_PENDING", "100000")),
+        flush_interval_ms=float(os.getenv("AUDIT_FLUSH_MS", "200")),
+        rotate_bytes=int(float(os.getenv("AUDIT_ROTATE_MB", "256")) * 1024 * 1024),
+        fsync=os.getenv("AUDIT_FSYNC", "1") == "1"
+    )
+
+# Sampled tracing: TRACE_SAMPLE_RATE of requests keep per-agent and per-rule spans,
+# optionally only those slower than TRACE_MIN_DURATION_MS, also appended to TRACE_EXPORT_PATH
+tracer.configure(
+    sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0")),
+    buffer_size=int(os.getenv("TRACE_BUFFER_SIZE", "1000")),
+    export_path=os.getenv("TRACE_EXPORT_PATH") or None,
+    min_duration_ms=float(os.getenv("TRACE_MIN_DURATION_MS", "0"))
+)
 
-print(f"📊 Registered agents: {list(orchestrator.agents.keys())}")
+# Built-in stack sampler behind /admin/profile, off unless PROFILER_ENABLED=1
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"
+
+# NDJSON streaming: lines scored per micro-batch, longer lines are rejected
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "256"))
+STREAM_MAX_LINE_BYTES = int(os.getenv("STREAM_MAX_LINE_BYTES", "65536"))
+
+# WebSocket scoring: requests evaluated concurrently per connection before reads pause
+WS_MAX_IN_FLIGHT = int(os.getenv("WS_MAX_IN_FLIGHT", "64"))
 
 print("🚀 Cofidis Fraud Detector initialized!")
-print(f"📊 Registered agents: {list(orchestrator.agents.keys())}")
+if SHARDS == 1:
+    print(f"📊 Registered agents: {list(orchestrator.agents.keys())}")
 
 # Request/Response Models
 class TransactionRequest(BaseModel):
@@ -97,16 +278,202 @@ class CustomerProfile(BaseModel):
     typical_locations: List[Dict[str, float]] = []
     risk_level: str = "low"  # low, medium, high
 
+class CaseUpdate(BaseModel):
+    status: str = Field(..., description="open/investigating/fraud/legitimate")
+
+def build_context(transaction: Dict[str, Any]) -> Dict[str, Any]:
+    """Evaluation context for a transaction"""
+    if profiles is None:
+        return {"customer_profile": DEFAULT_PROFILE}
+    return {"customer_profile": profiles.context_profile(transaction["customer_id"])}
+
+async def build_context_async(transaction: Dict[str, Any]) -> Dict[str, Any]:
+    """build_context() for the event loop: a profile cache miss is read from SQLite in the threadpool"""
+    if profiles is None:
+        return build_context(transaction)
+    record = profiles.cached(transaction["customer_id"])
+    if record is None:
+        return await run_in_threadpool(build_context, transaction)
+    return {"customer_profile": record.context}
+
+def build_contexts(transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Evaluation contexts for a batch, with the profile cache misses read together"""
+    if profiles is None:
+        return [{"customer_profile": DEFAULT_PROFILE} for _ in transactions]
+    records = profiles.get_many([transaction["customer_id"] for transaction in transactions])
+    return [{"customer_profile": record.context} for record in records]
+
+def record_outcomes(transactions: List[Dict[str, Any]], contexts: List[Dict],
+                    assessments: List[Optional[RiskAssessment]]):
+    """Feed scored transactions into the audit trail, customer profiles and fraud cases (queued, written in batches)"""
+    for transaction, context, assessment in zip(transactions, contexts, assessments):
+        if assessment is None:
+            continue
+        if audit is not None:
+            audit.record(transaction, context, assessment)
+        if profiles is not None:
+            profiles.record(transaction, assessment.recommended_action)
+        if cases is not None:
+            cases.record(transaction, assessment)
+
+# Request bodies are validated straight from JSON bytes, without an intermediate dict
+transaction_adapter = TypeAdapter(TransactionRequest)
+transaction_list_adapter = TypeAdapter(List[TransactionRequest])
+
+async def parse_body(request: Request, adapter: TypeAdapter) -> Any:
+    """Validate the raw request body, raising FastAPI's usual 422 on errors"""
+    try:
+        return adapter.validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)]
+        )
+
+def transaction_dict(transaction: TransactionRequest) -> Dict[str, Any]:
+    """
+    Plain dict of a validated transaction for the agents (shallow, no model_dump() copy)
+    
+    The agents work in naive local time, like datetime.now(), so a timestamp
+    with a UTC offset (e.g. "2024-02-12T10:30:00Z") is converted to it.
+    """
+    txn = dict(transaction.__dict__)
+    timestamp = txn["timestamp"]
+    if timestamp.tzinfo is not None:
+        txn["timestamp"] = timestamp.astimezone().replace(tzinfo=None)
+    return txn
+
+def build_response(transaction: TransactionRequest, assessment: RiskAssessment,
+                   processing_time: float) -> Dict[str, Any]:
+    """
+    JSON-ready FraudAssessmentResponse payload for one evaluated transaction
+    
+    Built from already-validated data, so it is serialised as-is instead of
+    going through the response model and FastAPI's response validation.
+    """
+    return {
+        "transaction_id": transaction.transaction_id,
+        "customer_id": transaction.customer_id,
+        "risk_score": assessment.score,
+        "confidence": assessment.confidence,
+        "recommended_action": assessment.recommended_action,
+        "flags": assessment.flags,
+        "explanation": assessment.explanation,
+        "processing_time_ms": processing_time,
+        "timestamp": assessment.timestamp.isoformat(),
+        "agent_breakdown": {
+            "agents_evaluated": len(orchestrator.agents) - len(assessment.timed_out_agents) - len(assessment.skipped_agents),
+            "timed_out_agents": assessment.timed_out_agents,
+            "skipped_agents": assessment.skipped_agents,
+            "primary_agent": "risk_orchestrator"
+        }
+    }
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    Streaming response sent while the request body is still being read
+    
+    StreamingResponse watches for client disconnects on receive(), which would
+    swallow request body chunks. Here the body iterator owns receive(), and a
+    disconnect surfaces as ClientDisconnect from request.stream().
+    """
+    media_type = "application/x-ndjson"
+    
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+def _score_lines(entries: List[Tuple[int, Optional[bytes]]]) -> bytes:
+    """Validate and score a micro-batch of (line number, NDJSON line) into result lines"""
+    output: List[Dict[str, Any]] = [None] * len(entries)
+    valid = []
+    for i, (line_number, line) in enumerate(entries):
+        if line is None:
+            output[i] = {"line": line_number, "error": f"Line exceeds {STREAM_MAX_LINE_BYTES} bytes"}
+            continue
+        try:
+            valid.append((i, TransactionRequest.model_validate_json(line)))
+        except ValidationError as e:
+            errors = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'line'}: {err['msg']}" for err in e.errors())
+            output[i] = {"line": line_number, "error": errors}
+    
+    if valid:
+        transaction_dicts = [transaction_dict(txn) for _, txn in valid]
+        contexts = build_contexts(transaction_dicts)
+        try:
+            assessments = orchestrator.evaluate_many(transaction_dicts, contexts)
+        except Exception as e:
+            assessments = [None] * len(valid)
+            print(f"Error scoring stream batch: {e}")
+        record_outcomes(transaction_dicts, contexts, assessments)
+        
+        for (i, txn), assessment in zip(valid, assessments):
+            if assessment is None:
+                output[i] = {"line": entries[i][0], "transaction_id": txn.transaction_id, "error": "Evaluation failed"}
+                continue
+            output[i] = {
+                "transaction_id": txn.transaction_id,
+                "risk_score": assessment.score,
+                "action": assessment.recommended_action
+            }
+    
+    return b"".join(json.dumps(item).encode() + b"\n" for item in output)
+
+async def _stream_assessments(request: Request) -> AsyncIterator[bytes]:
+    """
+    Score NDJSON transactions as the request body arrives
+    
+    Each received chunk is split into complete lines, scored in micro-batches
+    of STREAM_BATCH_SIZE and answered before the next chunk is read. Only the
+    unfinished last line is carried over, so memory stays bounded and a slow
+    reader throttles the upload through the transport's flow control.
+    """
+    buffer = b""
+    line_number = 0
+    discarding = False  # Inside a line that already exceeded STREAM_MAX_LINE_BYTES
+    
+    async for chunk in request.stream():
+        *lines, rest = (buffer + chunk).split(b"\n")
+        if discarding:
+            if not lines:
+                buffer = b""
+                continue
+            # Tail of the oversized line, already reported
+            lines.pop(0)
+            line_number += 1
+            discarding = False
+        
+        entries = []
+        for line in lines:
+            line_number += 1
+            if len(line) > STREAM_MAX_LINE_BYTES:
+                entries.append((line_number, None))
+            elif line.strip():
+                entries.append((line_number, line))
+        
+        buffer = rest
+        if len(buffer) > STREAM_MAX_LINE_BYTES:
+            entries.append((line_number + 1, None))
+            buffer = b""
+            discarding = True
+        
+        for start in range(0, len(entries), STREAM_BATCH_SIZE):
+            yield await run_in_threadpool(_score_lines, entries[start:start + STREAM_BATCH_SIZE])
+    
+    # Last line without a trailing newline
+    if buffer.strip() and not discarding:
+        yield await run_in_threadpool(_score_lines, [(line_number + 1, buffer)])
+
 # API Endpoints
 
 @app.get("/")
-def root():
+async def root():
     """Root endpoint - system info"""
     return {
         "service": "Cofidis Fraud Detector",
         "version": "1.0.0",
         "status": "operational",
-        "agents": orchestrator.get_system_status(),
+        "agents": await run_in_threadpool(orchestrator.get_system_status),
         "endpoints": {
             "evaluate": "/api/v1/fraud/evaluate",
             "health": "/health",
@@ -115,7 +482,7 @@ def root():
     }
 
 @app.get("/health")
-def health():
+async def health():
     """Health check endpoint"""
     return {
         "status": "healthy",
@@ -125,13 +492,33 @@ def health():
     }
 
 @app.get("/status")
-def system_status():
+async def system_status():
     """Detailed system status"""
-    return orchestrator.get_system_status()
+    # Sharded, this waits on every shard, so it runs off the event loop
+    status = await run_in_threadpool(orchestrator.get_system_status)
+    if profiles is not None:
+        status["customer_profiles"] = profiles.stats()
+    if cases is not None:
+        status["fraud_cases"] = cases.stats()
+    if audit is not None:
+        status["audit_trail"] = audit.stats()
+    return status
+
+@app.get("/metrics")
+async def metrics():
+    """Latency histograms and counters in Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
-@app.post("/api/v1/fraud/evaluate", response_model=FraudAssessmentResponse)
-def evaluate_transaction(
-    transaction: TransactionRequest,
+@app.post(
+    "/api/v1/fraud/evaluate",
+    response_model=FraudAssessmentResponse,
+    openapi_extra={"requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": TransactionRequest.model_json_schema()}}
+    }}
+)
+async def evaluate_transaction(
+    request: Request,
     background_tasks: BackgroundTasks
 ):
     """
@@ -139,99 +526,297 @@ def evaluate_transaction(
     
     Returns risk assessment with score, flags, and recommended action
     """
+    transaction = await parse_body(request, transaction_adapter)
     try:
         start_time = datetime.now()
         
-        # Build customer profile (in production, fetch from database)
-        customer_profile = {
-            "avg_transaction_amount": 100.0,
-            "max_transaction_amount": 500.0,
-            "usual_transaction_hours": list(range(8, 23))
-        }
+        # Plain dict for the agents
+        txn = transaction_dict(transaction)
+        context = await build_context_async(txn)
         
-        # Convert request to dict for evaluation
-        transaction_dict = transaction.model_dump()
-        context = {"customer_profile": customer_profile}
-        
-        # Evaluate
-        assessment = orchestrator.evaluate(transaction_dict, context)
+        # Evaluate on the event loop (CPU-only agents inline, I/O agents awaited)
+        assessment = await orchestrator.evaluate_async(txn, context)
+        record_outcomes([txn], [context], [assessment])
         
         # Calculate processing time
         processing_time = (datetime.now() - start_time).total_seconds() * 1000
         
-        return FraudAssessmentResponse(
-            transaction_id=transaction.transaction_id,
-            customer_id=transaction.customer_id,
-            risk_score=assessment.score,
-            confidence=assessment.confidence,
-            recommended_action=assessment.recommended_action,
-            flags=assessment.flags,
-            explanation=assessment.explanation,
-            processing_time_ms=processing_time,
-            timestamp=assessment.timestamp,
-            agent_breakdown={
-                "agents_evaluated": len(orchestrator.agents),
-                "primary_agent": "risk_orchestrator"
-            }
-        )
-        
+        # Returned as a ready JSONResponse, so response_model only documents the schema
+        return JSONResponse(build_response(transaction, assessment, processing_time))
+    
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/v1/fraud/evaluate-batch")
-def evaluate_batch(transactions: List[TransactionRequest]):
+@app.post(
+    "/api/v1/fraud/evaluate-batch",
+    openapi_extra={"requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {"type": "array", "items": TransactionRequest.model_json_schema()}}}
+    }}
+)
+async def evaluate_batch(request: Request):
     """
     Evaluate multiple transactions in batch
+    
+    Results are returned in input order and match single evaluations.
+    The batch runs in the threadpool so a large one does not stall the event loop.
     """
-    results = []
-    for txn in transactions:
+    transactions = await parse_body(request, transaction_list_adapter)
+    try:
+        transaction_dicts = [transaction_dict(txn) for txn in transactions]
+        contexts = await run_in_threadpool(build_contexts, transaction_dicts)
+        assessments = await run_in_threadpool(orchestrator.evaluate_many, transaction_dicts, contexts)
+        record_outcomes(transaction_dicts, contexts, assessments)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    results = [
+        {
+            "transaction_id": txn.transaction_id,
+            "risk_score": assessment.score,
+            "action": assessment.recommended_action
+        }
+        for txn, assessment in zip(transactions, assessments)
+    ]
+    
+    return JSONResponse({"results": results, "total": len(results)})
+
+@app.post("/api/v1/fraud/evaluate-stream")
+async def evaluate_stream(request: Request):
+    """
+    Evaluate newline-delimited JSON transactions as a stream
+    
+    The body is one TransactionRequest per line (application/x-ndjson). One
+    result line is streamed back per input line, in input order, as soon as its
+    micro-batch is scored; invalid lines get {"line", "error"} and the stream
+    continues.
+    """
+    return NDJSONStreamingResponse(_stream_assessments(request))
+
+@app.websocket("/api/v1/fraud/ws")
+async def evaluate_websocket(websocket: WebSocket):
+    """
+    Persistent scoring channel with pipelined requests
+    
+    Each message is {"id": <correlation id>, "transaction": <TransactionRequest>}.
+    Every request is answered with {"id", "result": <FraudAssessmentResponse>}
+    or {"id", "error"} as soon as it is scored, so replies may arrive out of
+    order. Up to WS_MAX_IN_FLIGHT requests are evaluated at once; beyond that
+    the connection stops reading until one finishes.
+    """
+    await websocket.accept()
+    in_flight = asyncio.Semaphore(WS_MAX_IN_FLIGHT)
+    send_lock = asyncio.Lock()
+    tasks = set()
+    
+    async def reply(message: Dict[str, Any]):
+        async with send_lock:
+            await websocket.send_text(json.dumps(message, default=str))
+    
+    async def score(correlation_id: Any, payload: Any):
         try:
-            assessment = orchestrator.evaluate(txn.model_dump(), {})
-            results.append({
-                "transaction_id": txn.transaction_id,
-                "risk_score": assessment.score,
-                "action": assessment.recommended_action
-            })
+            start_time = datetime.now()
+            transaction = transaction_adapter.validate_python(payload)
+            txn = transaction_dict(transaction)
+            context = await build_context_async(txn)
+            assessment = await orchestrator.evaluate_async(txn, context)
+            record_outcomes([txn], [context], [assessment])
+            processing_time = (datetime.now() - start_time).total_seconds() * 1000
+            await reply({"id": correlation_id, "result": build_response(transaction, assessment, processing_time)})
+        except ValidationError as e:
+            await reply({"id": correlation_id, "error": e.errors(include_url=False)})
+        except WebSocketDisconnect:
+            pass
         except Exception as e:
-            results.append({
-                "transaction_id": txn.transaction_id,
-                "error": str(e)
-            })
+            await reply({"id": correlation_id, "error": str(e)})
+        finally:
+            in_flight.release()
     
-    return {"results": results, "total": len(results)}
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                message = json.loads(raw)
+                correlation_id, payload = message["id"], message["transaction"]
+            except (ValueError, TypeError, KeyError):
+                await reply({"id": None, "error": 'Expected {"id": ..., "transaction": {...}}'})
+                continue
+            
+            await in_flight.acquire()
+            task = asyncio.create_task(score(correlation_id, payload))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
 
 @app.get("/api/v1/customer/{customer_id}/profile")
-def get_customer_profile(customer_id: str):
+async def get_customer_profile(customer_id: str):
     """
     Get customer risk profile
+    
+    Served from the profile cache (read from SQLite in the threadpool on a miss), plus
+    the customer's updates not yet written, so a transaction shows up as soon as it is
+    scored. Amounts and usual hours come from approved transactions; until min_history
+    of them the agents score against the default profile, reported as "source".
+    Without PROFILE_DB_PATH there are no profiles and the static sample is returned.
     """
-    # In production, fetch from database
+    if profiles is None:
+        return {
+            "customer_id": customer_id,
+            "risk_level": "low",
+            "avg_transaction_amount": 100.0,
+            "total_transactions": 150,
+            "fraud_history": False,
+            "last_updated": datetime.now().isoformat()
+        }
+    record = profiles.current_cached(customer_id) or await run_in_threadpool(profiles.current, customer_id)
+    if not record.transactions:
+        raise HTTPException(status_code=404, detail=f"No profile for customer {customer_id}")
+    context = record.context
     return {
         "customer_id": customer_id,
-        "risk_level": "low",
-        "avg_transaction_amount": 100.0,
-        "total_transactions": 150,
-        "fraud_history": False,
-        "last_updated": datetime.now().isoformat()
+        "risk_level": record.risk_level(),
+        "avg_transaction_amount": record.amount_sum / record.approved if record.approved else 0.0,
+        "max_transaction_amount": record.max_amount,
+        "usual_transaction_hours": context["usual_transaction_hours"],
+        "total_transactions": record.transactions,
+        "approved_transactions": record.approved,
+        "reviewed_transactions": record.reviewed,
+        "blocked_transactions": record.blocked,
+        "fraud_history": record.blocked > 0,
+        "source": "default" if context is DEFAULT_PROFILE else "learned",
+        "last_transaction_at": record.last_transaction_at,
+        "last_updated": record.updated_at
     }
 
 @app.get("/api/v1/fraud/cases")
-def get_fraud_cases(
+async def get_fraud_cases(
     status: Optional[str] = "open",
+    customer_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    before: Optional[str] = None,
     limit: int = 50,
     offset: int = 0
 ):
     """
-    Get fraud cases for investigation
+    Get fraud cases for investigation, newest first
+    
+    status=all lists every status. For deep pages pass the previous page's
+    next_before as before instead of increasing offset. Without CASE_DB_PATH
+    no cases are kept and the list is always empty.
     """
-    # In production, fetch from database
+    if status == "all":
+        status = None
+    elif status not in CASE_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be 'all' or one of {', '.join(CASE_STATUSES)}")
+    if not 1 <= limit <= 500 or offset < 0:
+        raise HTTPException(status_code=400, detail="limit must be 1-500 and offset non-negative")
+    
+    if cases is None:
+        return {"cases": [], "total": 0, "next_before": None, "status": status or "all", "limit": limit, "offset": offset}
+    try:
+        page = await run_in_threadpool(cases.query, status, customer_id, since, until, before, limit, offset)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="before must be a next_before returned by a previous page")
     return {
-        "cases": [],
-        "total": 0,
-        "status": status,
+        **page,
+        "status": status or "all",
         "limit": limit,
         "offset": offset
     }
 
+@app.patch("/api/v1/fraud/cases/{case_id}")
+async def update_fraud_case(case_id: int, update: CaseUpdate):
+    """
+    Move a case to another status (e.g. once investigated)
+    """
+    if cases is None:
+        raise HTTPException(status_code=404, detail="Fraud cases are disabled (set CASE_DB_PATH)")
+    try:
+        case = await run_in_threadpool(cases.update_status, case_id, update.status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if case is None:
+        raise HTTPException(status_code=404, detail=f"No case {case_id}")
+    return case
+
+@app.get("/admin/traces")
+async def get_traces(
+    limit: int = 50,
+    min_duration_ms: float = 0.0,
+    transaction_id: Optional[str] = None
+):
+    """
+    Recent sampled traces, newest first, with per-agent and per-rule spans
+    """
+    return {
+        "tracing": tracer.stats(),
+        "traces": tracer.recent(limit, min_duration_ms, transaction_id)
+    }
+
+@app.get("/admin/snapshot")
+async def get_snapshot_status():
+    """
+    Agent state persistence: last snapshot and restore, event log position, per shard when sharded
+    """
+    if not (SNAPSHOT_PATH or EVENT_LOG_DIR):
+        raise HTTPException(status_code=404, detail="Persistence disabled (set SNAPSHOT_PATH / EVENT_LOG_DIR)")
+    if isinstance(orchestrator, ShardedOrchestrator):
+        return {"shards": await run_in_threadpool(orchestrator.persistence_stats)}
+    return persistence.stats()
+
+@app.post("/admin/snapshot")
+async def take_snapshot():
+    """
+    Snapshot agent state now (e.g. before a deploy), without pausing scoring
+    """
+    if not SNAPSHOT_PATH:
+        raise HTTPException(status_code=404, detail="Snapshots disabled (set SNAPSHOT_PATH)")
+    if isinstance(orchestrator, ShardedOrchestrator):
+        return {"shards": await run_in_threadpool(orchestrator.snapshot)}
+    return await run_in_threadpool(persistence.snapshot)
+
+@app.get("/admin/profile")
+async def get_profile(
+    seconds: float = 10.0,
+    interval_ms: float = 10.0,
+    format: str = "collapsed",
+    include_idle: bool = False,
+    project_only: bool = False
+):
+    """
+    Sample all threads' stacks for N seconds against live traffic
+    
+    format=collapsed returns a flamegraph-ready file (flamegraph.pl,
+    speedscope); format=json returns the hottest functions and the stacks.
+    """
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler disabled (set PROFILER_ENABLED=1)")
+    if format not in ("collapsed", "json"):
+        raise HTTPException(status_code=400, detail="format must be 'collapsed' or 'json'")
+    
+    try:
+        result = await asyncio.to_thread(sampler.profile, seconds, interval_ms, include_idle)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if format == "collapsed":
+        return PlainTextResponse(
+            render_collapsed(result["stacks"]),
+            headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'}
+        )
+    return {
+        "samples": result["samples"],
+        "idle_samples": result["idle_samples"],
+        "duration_seconds": result["duration_seconds"],
+        "interval_ms": result["interval_ms"],
+        "top_functions": top_functions(result["stacks"], project_only=project_only),
+        "stacks": result["stacks"]
+    }
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
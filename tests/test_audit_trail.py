@@ -0,0 +1,110 @@
+"""
+Audit trail: rotation, backpressure and drop counters, and batches that fail to write
+"""
+from datetime import datetime
+import gzip
+import json
+import os
+
+from agents.audit_trail import AuditTrail
+from agents.base_agent import RiskAssessment
+
+
+def decision(i: int):
+    transaction = {"transaction_id": f"T{i}", "customer_id": "CUST-1", "amount": 10.0 * i,
+                   "timestamp": datetime(2024, 2, 12, 10, 30)}
+    assessment = RiskAssessment(score=20.0, confidence=0.8, flags=[], explanation="ok", recommended_action="APPROVE",
+                                timestamp=datetime(2024, 2, 12, 10, 30), agent_name="risk_orchestrator",
+                                agent_scores={"transaction_monitor": 20.0})
+    return transaction, {"customer_profile": {"avg_transaction_amount": 100.0}}, assessment
+
+
+def read_ids(directory):
+    """transaction_ids in every audit file, oldest file first; a file cut after a failed write ends early"""
+    ids = []
+    for name in sorted(os.listdir(directory)):
+        with gzip.open(os.path.join(directory, name), "rt") as f:
+            try:
+                ids.extend(json.loads(line)["transaction_id"] for line in f)
+            except EOFError:
+                pass
+    return ids
+
+
+def test_files_rotate_once_full(tmp_path):
+    audit = AuditTrail(str(tmp_path), weights={"transaction_monitor": 0.3}, rotate_bytes=1, fsync=False)
+    for i in range(3):
+        audit.record(*decision(i))
+        audit.flush()
+    audit.close()
+    
+    assert audit.files == 3
+    assert len(os.listdir(tmp_path)) == 3
+    assert read_ids(tmp_path) == ["T0", "T1", "T2"]
+    entry = json.loads(gzip.open(audit.current_file, "rt").readline())
+    assert (entry["transaction_id"], entry["weights"]) == ("T2", {"transaction_monitor": 0.3})
+
+
+def test_full_queue_signals_backpressure_then_drops(tmp_path):
+    audit = AuditTrail(str(tmp_path), max_pending=10, high_water_ratio=0.5, fsync=False)
+    accepted = [audit.record(*decision(i)) for i in range(12)]
+    
+    assert accepted == [True] * 10 + [False] * 2
+    assert audit.backpressure == 6
+    stats = audit.stats()
+    assert (stats["pending"], stats["recorded"], stats["dropped"]) == (10, 10, 2)
+    audit.close()
+    assert audit.written == 10
+    assert not audit.record(*decision(12))
+
+
+class FailingFile:
+    """Takes part of the first write, then fails like a full disk"""
+    
+    def __init__(self, file):
+        self.file = file
+        self.failed = False
+    
+    def write(self, data: bytes):
+        if not self.failed:
+            self.failed = True
+            self.file.write(data[:len(data) // 2])
+            raise OSError("No space left on device")
+        return self.file.write(data)
+    
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def test_failed_batch_is_written_again_to_a_new_file(tmp_path):
+    audit = AuditTrail(str(tmp_path), fsync=False)
+    audit.record(*decision(0))
+    audit.flush()
+    first_file = audit.current_file
+    audit._file.fileobj = FailingFile(audit._file.fileobj)
+    for i in (1, 2):
+        audit.record(*decision(i))
+    audit.flush()
+    
+    assert audit.write_errors == 1
+    assert audit.stats()["pending"] == 2
+    audit.record(*decision(3))
+    audit.close()
+    
+    assert audit.current_file != first_file
+    assert read_ids(tmp_path) == ["T0", "T1", "T2", "T3"]
+    assert audit.written == 4
+    assert audit.lost == 0
+
+
+def test_decisions_still_failing_on_close_are_counted_as_lost(tmp_path):
+    audit = AuditTrail(str(tmp_path), fsync=False)
+    for i in range(3):
+        audit.record(*decision(i))
+    def fail():
+        raise OSError("Read-only file system")
+    audit._rotate = fail
+    audit.close()
+    
+    assert audit.write_errors == 1
+    assert audit.stats()["lost"] == 3
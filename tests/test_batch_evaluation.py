@@ -0,0 +1,57 @@
+"""
+Batch evaluation (evaluate_many) vs one evaluate() call per transaction
+"""
+from datetime import datetime
+
+from agents.anomaly_detection import AnomalyDetectionAgent
+from agents.base_agent import BaseFraudAgent, RiskAssessment
+from agents.pipeline import build_orchestrator
+from benchmarks.synthetic import TransactionGenerator
+
+TRAFFIC = TransactionGenerator(customers=120, seed=4, fraud_rate=0.1).generate(1500)
+
+
+def orchestrator():
+    orchestrator = build_orchestrator()
+    orchestrator.register_agent(AnomalyDetectionAgent())
+    return orchestrator
+
+
+def summary(results):
+    return [(r.score, r.recommended_action, sorted(r.flags), r.agent_scores) for r in results]
+
+
+def test_batches_score_like_single_evaluations():
+    single = orchestrator()
+    expected = [single.evaluate(transaction, context)
+                for transaction, context in zip(TRAFFIC.transactions, TRAFFIC.contexts)]
+    
+    batched = orchestrator()
+    results = []
+    for start in range(0, len(TRAFFIC.transactions), 250):
+        end = start + 250
+        results.extend(batched.evaluate_many(TRAFFIC.transactions[start:end], TRAFFIC.contexts[start:end]))
+    
+    assert summary(results) == summary(expected)
+    assert {r.recommended_action for r in expected} >= {"APPROVE", "BLOCK"}
+
+
+class FailingAgent(BaseFraudAgent):
+    """Fails on transactions above 1000"""
+    
+    def __init__(self):
+        super().__init__("failing_agent", "Fails on large amounts")
+    
+    def evaluate(self, transaction, context=None) -> RiskAssessment:
+        if transaction["amount"] > 1000:
+            raise ValueError("amount too large")
+        return RiskAssessment(score=transaction["amount"] / 100, confidence=0.9, flags=[], explanation="",
+                              recommended_action="APPROVE", timestamp=datetime.now(), agent_name=self.name)
+
+
+def test_default_agent_batch_keeps_input_order_and_marks_failures():
+    transactions = [{"amount": amount} for amount in (100.0, 5000.0, 300.0)]
+    
+    results = FailingAgent().evaluate_many(transactions)
+    
+    assert [r and r.score for r in results] == [1.0, None, 3.0]
@@ -0,0 +1,65 @@
+"""
+Behavioral profiles: online amount statistics and bounded merchant/device sets
+"""
+from datetime import datetime
+import random
+import statistics
+
+from agents.behavioral_analysis import (BehavioralAnalysisAgent, CustomerProfile, MAX_DEVICES, MAX_MERCHANTS,
+                                        MIN_STD_RATIO, PRIOR_STD_AMOUNT)
+
+
+def test_amount_statistics_match_the_full_history():
+    rng = random.Random(9)
+    profile = CustomerProfile()
+    amounts = []
+    for _ in range(500):
+        amount = round(rng.lognormvariate(5, 0.8), 2)
+        profile.add_amount(amount)
+        amounts.append(amount)
+        
+        if len(amounts) < 5:
+            assert profile.std_amount == PRIOR_STD_AMOUNT
+            continue
+        mean = statistics.fmean(amounts)
+        assert abs(profile.avg_amount - mean) < 1e-9 * mean
+        expected_std = max(statistics.stdev(amounts), MIN_STD_RATIO * mean, 1.0)
+        assert abs(profile.std_amount - expected_std) < 1e-9 * expected_std
+
+
+def test_merchant_and_device_sets_drop_the_oldest_entries():
+    profile = CustomerProfile()
+    for i in range(MAX_MERCHANTS + 10):
+        profile.add_merchant(f"merchant-{i}")
+        profile.add_merchant(f"merchant-{i}")
+    for i in range(MAX_DEVICES + 5):
+        profile.add_device(f"device-{i}")
+    
+    assert len(profile.merchants) == MAX_MERCHANTS
+    assert not profile.knows_merchant("merchant-9")
+    assert profile.knows_merchant("merchant-10")
+    assert len(profile.devices) == MAX_DEVICES
+    assert not profile.knows_device("device-4")
+    assert profile.knows_device(f"device-{MAX_DEVICES + 4}")
+    assert not hasattr(profile, "__dict__")
+
+
+def test_hours_mask_tracks_usual_hours():
+    profile = CustomerProfile()
+    profile.add_hour(23)
+    profile.add_hour(23)
+    
+    assert profile.is_usual_hour(23)
+    assert not profile.is_usual_hour(4)
+    assert profile.usual_hour_count == bin(profile.hours_mask).count("1")
+
+
+def test_amount_deviation_uses_the_customer_spread():
+    agent = BehavioralAnalysisAgent()
+    for amount in (98.0, 102.0, 99.0, 101.0, 100.0, 100.0):
+        agent.evaluate({"customer_id": "C1", "amount": amount, "timestamp": datetime(2024, 2, 12, 10)})
+    
+    # σ is floored at 10% of the €100 average, so €200 is a 10σ deviation
+    result = agent.evaluate({"customer_id": "C1", "amount": 200.0, "timestamp": datetime(2024, 2, 12, 10)})
+    assert any(flag.startswith("AMOUNT_DEVIATION") and "5σ" in flag for flag in result.flags)
+    assert result.score == 25
@@ -0,0 +1,92 @@
+"""
+Fraud cases in SQLite: keyset pages, trigger-kept totals and indexed reads
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from agents.base_agent import RiskAssessment
+from agents.case_store import CaseStore
+
+START = datetime(2024, 2, 12, 10, 0, tzinfo=timezone.utc)
+
+
+def assessment(minutes: int, action: str = "REVIEW") -> RiskAssessment:
+    return RiskAssessment(score=60.0, confidence=0.8, flags=["HIGH_AMOUNT"], explanation="test",
+                          recommended_action=action, timestamp=START + timedelta(minutes=minutes),
+                          agent_name="risk_orchestrator")
+
+
+@pytest.fixture
+def cases(tmp_path):
+    store = CaseStore(str(tmp_path / "cases.db"))
+    yield store
+    store.close()
+
+
+def record(store: CaseStore, count: int, customer_id: str = "CUST-1", same_minute_every: int = 3):
+    """count cases, several sharing a created_at so pages have to break ties on case_id"""
+    for i in range(count):
+        transaction = {"transaction_id": f"{customer_id}-T{i}", "customer_id": customer_id, "amount": 900.0}
+        store.record(transaction, assessment(i // same_minute_every))
+    store.flush()
+
+
+def test_keyset_pages_list_every_case_once_newest_first(cases):
+    record(cases, 25)
+    
+    everything = cases.query(limit=100)["cases"]
+    pages, before = [], None
+    while True:
+        page = cases.query(before=before, limit=10)
+        pages.extend(page["cases"])
+        before = page["next_before"]
+        if before is None:
+            break
+    
+    assert [case["case_id"] for case in pages] == [case["case_id"] for case in everything]
+    assert len({case["case_id"] for case in pages}) == 25
+    order = [(case["created_at"], case["case_id"]) for case in pages]
+    assert order == sorted(order, reverse=True)
+    with pytest.raises(ValueError):
+        cases.query(before="not a cursor")
+
+
+def test_totals_follow_inserts_and_status_changes(cases):
+    record(cases, 4)
+    record(cases, 2, customer_id="CUST-2")
+    first = cases.query(limit=1)["cases"][0]["case_id"]
+    
+    cases.update_status(first, "fraud")
+    cases.update_status(first, "fraud")
+    
+    assert cases.query(status="open")["total"] == 5
+    assert cases.query(status="fraud")["total"] == 1
+    assert cases.query(status="legitimate")["total"] == 0
+    assert cases.query(status=None)["total"] == 6
+    assert cases.query(status=None, customer_id="CUST-2")["total"] == 2
+    assert cases.query(since=START)["total"] is None
+
+
+def test_time_range_is_compared_in_utc(cases):
+    record(cases, 3, same_minute_every=1)
+    plus_one = timezone(timedelta(hours=1))
+    
+    page = cases.query(since=datetime(2024, 2, 12, 11, 1, tzinfo=plus_one))
+    assert [case["transaction_id"] for case in page["cases"]] == ["CUST-1-T2", "CUST-1-T1"]
+    page = cases.query(until=datetime(2024, 2, 12, 11, 1, tzinfo=plus_one))
+    assert [case["transaction_id"] for case in page["cases"]] == ["CUST-1-T0"]
+    assert page["cases"][0]["created_at"] == "2024-02-12T10:00:00.000000+00:00"
+
+
+@pytest.mark.parametrize("where, params, index", [
+    ("status = ?", ("open",), "fraud_cases_status"),
+    ("customer_id = ?", ("CUST-1",), "fraud_cases_customer"),
+    ("created_at >= ?", ("2024",), "fraud_cases_created"),
+])
+def test_pages_are_index_range_scans_without_a_sort(cases, where, params, index):
+    sql = f"SELECT case_id FROM fraud_cases WHERE {where} ORDER BY created_at DESC, case_id DESC LIMIT 10"
+    plan = " ".join(row[-1] for row in cases._reader.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+    
+    assert index in plan
+    assert "TEMP B-TREE" not in plan
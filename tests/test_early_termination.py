@@ -0,0 +1,51 @@
+"""
+Early termination skips agents without changing any decision
+"""
+import asyncio
+
+import pytest
+
+from agents.anomaly_detection import AnomalyDetectionAgent
+from agents.pipeline import build_orchestrator
+from benchmarks.synthetic import TransactionGenerator
+
+TRAFFIC = TransactionGenerator(customers=150, seed=21, fraud_rate=0.1).generate(2500)
+
+
+def orchestrator(early_termination: bool, execution_mode: str = "sequential"):
+    orchestrator = build_orchestrator(execution_mode=execution_mode, early_termination=early_termination)
+    orchestrator.register_agent(AnomalyDetectionAgent())
+    return orchestrator
+
+
+def score(orchestrator, path: str):
+    pairs = list(zip(TRAFFIC.transactions, TRAFFIC.contexts))
+    if path == "evaluate_many":
+        return orchestrator.evaluate_many(TRAFFIC.transactions, TRAFFIC.contexts)
+    if path == "evaluate_async":
+        async def run():
+            return [await orchestrator.evaluate_async(transaction, context) for transaction, context in pairs]
+        return asyncio.run(run())
+    return [orchestrator.evaluate(transaction, context) for transaction, context in pairs]
+
+
+@pytest.mark.parametrize("path, execution_mode", [
+    ("evaluate", "sequential"),
+    ("evaluate", "concurrent"),
+    ("evaluate_async", "sequential"),
+    ("evaluate_many", "sequential")
+])
+def test_decisions_match_running_every_agent(path, execution_mode):
+    full = orchestrator(False, execution_mode)
+    early = orchestrator(True, execution_mode)
+    
+    expected = score(full, path)
+    results = score(early, path)
+    full.shutdown()
+    early.shutdown()
+    
+    assert [r.recommended_action for r in results] == [r.recommended_action for r in expected]
+    assert {r.recommended_action for r in expected} >= {"APPROVE", "BLOCK"}
+    if execution_mode == "sequential":
+        # Concurrent agents usually all finish before the decision settles
+        assert any(r.skipped_agents for r in results)
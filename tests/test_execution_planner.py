@@ -0,0 +1,70 @@
+"""
+Execution planner: agent ordering, score bounds and settled decisions
+"""
+from itertools import combinations
+import random
+
+from agents.execution_planner import ExecutionPlanner
+
+
+class BoundedAgent:
+    """Agent stand-in with a fixed score upper bound"""
+    
+    def __init__(self, bound: float):
+        self.bound = bound
+    
+    def score_upper_bound(self, transaction, context=None) -> float:
+        return self.bound
+
+
+def weighted_average(scores, weights):
+    total_weight = sum(weights.get(name, 0.1) for name in scores)
+    return sum(score * weights.get(name, 0.1) for name, score in scores.items()) / total_weight if total_weight else 0.0
+
+
+def test_unmeasured_agents_run_first_then_by_impact_per_millisecond():
+    planner = ExecutionPlanner()
+    agents = {"slow": BoundedAgent(50), "cheap": BoundedAgent(50), "new": BoundedAgent(50), "quiet": BoundedAgent(50)}
+    weights = {"slow": 0.3, "cheap": 0.3, "new": 0.3, "quiet": 0.3}
+    planner.record("slow", cost_ms=10.0, score=40.0)
+    planner.record("cheap", cost_ms=0.5, score=40.0)
+    planner.record("quiet", cost_ms=0.5, score=0.0)
+    
+    plan = planner.plan(agents, weights, {}, {})
+    
+    assert plan == [("new", 50), ("cheap", 50), ("quiet", 50), ("slow", 50)]
+    order, bounds = planner.plan_many(agents, weights, [{}, {}], [{}, {}])
+    assert order == [name for name, _ in plan]
+    assert bounds == [{name: 50 for name in agents}] * 2
+
+
+def test_score_bounds_cover_every_subset_of_remaining_agents():
+    rng = random.Random(3)
+    planner = ExecutionPlanner()
+    for _ in range(300):
+        names = [f"agent_{i}" for i in range(5)]
+        weights = {name: rng.choice([0.1, 0.2, 0.3]) for name in names}
+        answered = rng.randint(0, 4)
+        scores = {name: rng.uniform(0, 100) for name in names[:answered]}
+        remaining = {name: rng.uniform(0, 100) for name in names[answered:]}
+        
+        lower, upper = planner.score_bounds(scores, remaining, weights)
+        
+        for size in range(len(remaining) + 1):
+            for subset in combinations(remaining, size):
+                # Each answering agent scores between 0 and its bound
+                high = weighted_average({**scores, **{name: remaining[name] for name in subset}}, weights)
+                low = weighted_average({**scores, **{name: 0.0 for name in subset}}, weights)
+                assert lower - 1e-9 <= low and high <= upper + 1e-9
+
+
+def test_settled_action_waits_for_agents_that_could_change_it():
+    planner = ExecutionPlanner()
+    weights = {"a": 0.3, "b": 0.3}
+    
+    assert planner.settled_action({"a": 10.0}, {"b": 20.0}, weights) == "APPROVE"
+    assert planner.settled_action({"a": 10.0}, {"b": 85.0}, weights) is None
+    # A remaining agent able to reach the critical score could still force BLOCK
+    assert planner.settled_action({"a": 0.0}, {"b": 95.0}, {"a": 1.0, "b": 0.01}) is None
+    assert planner.settled_action({"a": 100.0}, {"b": 100.0}, weights) is None
+    assert planner.settled_action({"a": 100.0}, {"b": 100.0}, {"a": 0.3, "b": 0.05}) == "BLOCK"
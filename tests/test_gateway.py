@@ -0,0 +1,211 @@
+"""
+API gateway endpoints, in one process (no shards)
+"""
+from datetime import datetime, timezone
+import asyncio
+import json
+import os
+import tempfile
+
+# The gateway reads its configuration when imported
+DATA_DIR = tempfile.mkdtemp(prefix="fraud-gateway-test-")
+os.environ["SHARDS"] = "1"
+os.environ["PROFILE_DB_PATH"] = os.path.join(DATA_DIR, "profiles.db")
+os.environ["SNAPSHOT_PATH"] = os.path.join(DATA_DIR, "state.snapshot")
+
+from fastapi.testclient import TestClient
+
+import gateway
+from agents.pipeline import build_orchestrator
+from agents.snapshot import load_snapshot
+
+client = TestClient(gateway.app)
+
+
+def transaction(transaction_id: str, **fields):
+    return {"transaction_id": transaction_id, "customer_id": "CUST-GW", "amount": 150.0, "merchant": "Amazon",
+            "location": {"lat": 38.72, "lon": -9.14}, "timestamp": "2024-02-12T10:30:00", **fields}
+
+
+def test_retry_with_other_fields_is_not_replayed():
+    first = client.post("/api/v1/fraud/evaluate", json=transaction("GW-T1")).json()
+    retry = client.post("/api/v1/fraud/evaluate", json=transaction("GW-T1")).json()
+    reused = client.post("/api/v1/fraud/evaluate",
+                         json=transaction("GW-T1", amount=99999.0, merchant="Binance crypto")).json()
+    
+    assert retry["risk_score"] == first["risk_score"]
+    assert reused["risk_score"] > first["risk_score"]
+
+
+def test_profile_reflects_a_transaction_as_soon_as_it_is_scored():
+    assert client.get("/api/v1/customer/CUST-NEW/profile").status_code == 404
+    client.post("/api/v1/fraud/evaluate", json=transaction("GW-P1", customer_id="CUST-NEW"))
+    
+    profile = client.get("/api/v1/customer/CUST-NEW/profile")
+    assert profile.status_code == 200
+    assert profile.json()["total_transactions"] == 1
+
+
+def test_profile_without_a_store_is_the_static_sample(monkeypatch):
+    monkeypatch.setattr(gateway, "profiles", None)
+    
+    profile = client.get("/api/v1/customer/CUST-ANY/profile")
+    assert profile.status_code == 200
+    assert profile.json()["customer_id"] == "CUST-ANY"
+    assert profile.json()["total_transactions"] == 150
+
+
+def test_cases_without_a_store_are_an_empty_list(monkeypatch):
+    monkeypatch.setattr(gateway, "cases", None)
+    
+    page = client.get("/api/v1/fraud/cases", params={"status": "all", "since": "2024-02-12T10:30:00Z"})
+    assert page.status_code == 200
+    assert page.json()["cases"] == []
+    assert page.json()["total"] == 0
+    assert client.get("/api/v1/fraud/cases", params={"status": "closed"}).status_code == 400
+
+
+def test_timestamp_with_utc_offset_is_scored_by_every_agent():
+    local = datetime(2024, 2, 12, 10, 30, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    naive = client.post("/api/v1/fraud/evaluate",
+                        json=transaction("GW-TZ1", customer_id="CUST-TZ1", amount=1500.0,
+                                         timestamp=local.isoformat())).json()
+    aware = client.post("/api/v1/fraud/evaluate",
+                        json=transaction("GW-TZ2", customer_id="CUST-TZ2", amount=1500.0,
+                                         timestamp="2024-02-12T10:30:00Z")).json()
+    
+    assert any(flag.startswith("HIGH_AMOUNT") for flag in aware["flags"])
+    assert aware["risk_score"] == naive["risk_score"]
+    assert aware["agent_breakdown"]["agents_evaluated"] == naive["agent_breakdown"]["agents_evaluated"]
+
+
+def test_batch_results_are_in_input_order_and_score_like_single_calls():
+    single = client.post("/api/v1/fraud/evaluate", json=transaction("GW-B0", customer_id="CUST-B0")).json()
+    batch = [transaction(f"GW-B{i}", customer_id=f"CUST-B{i}", amount=150.0 + (i - 1) * 1000) for i in range(1, 4)]
+    
+    response = client.post("/api/v1/fraud/evaluate-batch", json=batch[:1] + batch[1:][::-1]).json()
+    
+    assert response["total"] == 3
+    assert [r["transaction_id"] for r in response["results"]] == ["GW-B1", "GW-B3", "GW-B2"]
+    # A new customer's first transaction, with the same fields as the single call
+    assert response["results"][0]["risk_score"] == single["risk_score"]
+    assert response["results"][0]["action"] == single["recommended_action"]
+
+
+def ndjson_line(transaction_id: str, **fields) -> bytes:
+    return json.dumps(transaction(transaction_id, customer_id="CUST-S", **fields)).encode()
+
+
+class ChunkedRequest:
+    """Stands in for a Request whose body arrives in the given chunks"""
+    
+    def __init__(self, chunks):
+        self.chunks = chunks
+    
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def test_stream_answers_every_line_in_order(monkeypatch):
+    monkeypatch.setattr(gateway, "STREAM_MAX_LINE_BYTES", 500)
+    body = b"\n".join([ndjson_line("GW-S1"), b"{not json", ndjson_line("GW-S2", merchant="x" * 600), b"",
+                       ndjson_line("GW-S3")])
+    
+    response = client.post("/api/v1/fraud/evaluate-stream", content=body,
+                           headers={"Content-Type": "application/x-ndjson"})
+    
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line.get("transaction_id") for line in lines] == ["GW-S1", None, None, "GW-S3"]
+    assert [line.get("line") for line in lines[1:3]] == [2, 3]
+    assert lines[2]["error"] == "Line exceeds 500 bytes"
+    assert "action" in lines[3]
+
+
+def test_stream_discards_an_oversized_line_split_across_chunks(monkeypatch):
+    monkeypatch.setattr(gateway, "STREAM_MAX_LINE_BYTES", 500)
+    oversized = ndjson_line("GW-S5", merchant="x" * 1000)
+    chunks = [ndjson_line("GW-S4") + b"\n" + oversized[:300], oversized[300:700],
+              oversized[700:] + b"\n" + ndjson_line("GW-S6") + b"\n"]
+    
+    async def collect():
+        return b"".join([output async for output in gateway._stream_assessments(ChunkedRequest(chunks))])
+    
+    lines = [json.loads(line) for line in asyncio.run(collect()).splitlines()]
+    assert [line.get("transaction_id") for line in lines] == ["GW-S4", None, "GW-S6"]
+    assert lines[1] == {"line": 2, "error": "Line exceeds 500 bytes"}
+
+
+def test_websocket_answers_pipelined_requests_by_id():
+    with client.websocket_connect("/api/v1/fraud/ws") as websocket:
+        websocket.send_text(json.dumps({"id": 1, "transaction": transaction("GW-W1", customer_id="CUST-W")}))
+        websocket.send_text(json.dumps({"id": "two", "transaction": transaction("GW-W2", customer_id="CUST-W")}))
+        websocket.send_text(json.dumps({"id": 3, "transaction": {"transaction_id": "GW-W3"}}))
+        websocket.send_text("not json")
+        replies = [websocket.receive_json() for _ in range(4)]
+    
+    by_id = {reply["id"]: reply for reply in replies}
+    assert set(by_id) == {1, "two", 3, None}
+    assert by_id[1]["result"]["transaction_id"] == "GW-W1"
+    assert by_id["two"]["result"]["customer_id"] == "CUST-W"
+    assert any(error["loc"] == ["amount"] for error in by_id[3]["error"])
+    assert by_id[None]["error"].startswith("Expected")
+
+
+def test_metrics_are_served_in_prometheus_text_format():
+    client.post("/api/v1/fraud/evaluate", json=transaction("GW-M1", customer_id="CUST-M"))
+    
+    response = client.get("/metrics")
+    
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert "# TYPE http_request_duration_seconds histogram" in lines
+    assert "# TYPE fraud_decisions_total counter" in lines
+    assert any(line.startswith('http_request_duration_seconds_count{method="POST",route="/api/v1/fraud/evaluate",'
+                               'status="200"}') for line in lines)
+    assert any(line.startswith('fraud_agent_latency_seconds_bucket{agent="risk_orchestrator",le="+Inf"}')
+               for line in lines)
+
+
+def test_traces_show_the_agents_of_a_sampled_request(monkeypatch):
+    monkeypatch.setattr(gateway.tracer, "sample_rate", 1.0)
+    client.post("/api/v1/fraud/evaluate", json=transaction("GW-TR1", customer_id="CUST-TR"))
+    
+    response = client.get("/admin/traces", params={"transaction_id": "GW-TR1"}).json()
+    
+    assert response["tracing"]["sample_rate"] == 1.0
+    [trace] = response["traces"]
+    assert trace["name"] == "risk_orchestrator.evaluate"
+    assert {span["name"] for span in trace["spans"]} >= set(gateway.orchestrator.agents)
+
+
+def test_profile_is_served_only_when_enabled(monkeypatch):
+    assert client.get("/admin/profile", params={"seconds": 0.01}).status_code == 404
+    monkeypatch.setattr(gateway, "PROFILER_ENABLED", True)
+    
+    collapsed = client.get("/admin/profile", params={"seconds": 0.05, "include_idle": True})
+    report = client.get("/admin/profile", params={"seconds": 0.05, "format": "json"}).json()
+    
+    assert collapsed.headers["content-disposition"] == 'attachment; filename="profile.collapsed"'
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed.text.splitlines())
+    assert set(report) >= {"samples", "top_functions", "stacks"}
+    assert client.get("/admin/profile", params={"seconds": 0.01, "format": "svg"}).status_code == 400
+
+
+def test_snapshot_on_demand_can_be_restored(monkeypatch):
+    client.post("/api/v1/fraud/evaluate", json=transaction("GW-SN1", customer_id="CUST-SN"))
+    
+    taken = client.post("/admin/snapshot").json()
+    status = client.get("/admin/snapshot").json()
+    
+    assert status["snapshots"]["last_snapshot"] == taken
+    assert status["snapshots"]["path"] == os.environ["SNAPSHOT_PATH"]
+    assert status["event_log"] is None
+    restored = build_orchestrator()
+    load_snapshot(os.environ["SNAPSHOT_PATH"], restored.agents, {"shard": 0, "shards": 1})
+    assert restored.agents["behavioral_analysis"].customer_profiles.get("CUST-SN") is not None
+    
+    monkeypatch.setattr(gateway, "SNAPSHOT_PATH", None)
+    assert client.post("/admin/snapshot").status_code == 404
+    assert client.get("/admin/snapshot").status_code == 404
@@ -0,0 +1,113 @@
+"""
+Retried transaction_ids get their original assessment without touching agent state
+"""
+import asyncio
+import copy
+import pickle
+
+from agents.behavioral_analysis import CustomerProfile
+from agents.pipeline import build_orchestrator
+from benchmarks.synthetic import TransactionGenerator
+
+TRAFFIC = TransactionGenerator(customers=20, seed=4).generate(60)
+
+
+def comparable(value):
+    """Value without the wall-clock time a profile was created"""
+    if isinstance(value, CustomerProfile):
+        value = copy.copy(value)
+        value.created_at = 0.0
+    return value
+
+
+def agent_state(orchestrator) -> bytes:
+    return pickle.dumps([
+        sorted((key, comparable(value)) for key, value in store.items())
+        for agent in orchestrator.agents.values() for store in agent.state_stores.values()
+    ])
+
+
+def test_retry_replays_assessment_without_recording_again():
+    orchestrator = build_orchestrator(idempotency_ttl_seconds=300)
+    for transaction, context in zip(TRAFFIC.transactions, TRAFFIC.contexts):
+        orchestrator.evaluate(transaction, context)
+    state = agent_state(orchestrator)
+    
+    original = orchestrator.evaluate(TRAFFIC.transactions[0], TRAFFIC.contexts[0])
+    
+    assert agent_state(orchestrator) == state
+    assert orchestrator.idempotency.hits == 1
+    assert original is orchestrator.evaluate(dict(TRAFFIC.transactions[0]), TRAFFIC.contexts[0])
+
+
+def test_batch_replays_earlier_and_repeated_transaction_ids():
+    orchestrator = build_orchestrator(idempotency_ttl_seconds=300)
+    single = build_orchestrator()
+    first = orchestrator.evaluate_many(TRAFFIC.transactions[:30], TRAFFIC.contexts[:30])
+    expected = [single.evaluate(t, c) for t, c in zip(TRAFFIC.transactions, TRAFFIC.contexts)]
+    
+    # Retries of the first batch, with the rest of the traffic sent twice
+    retried = TRAFFIC.transactions[:30] + TRAFFIC.transactions[30:] * 2
+    results = orchestrator.evaluate_many(retried, TRAFFIC.contexts[:30] + TRAFFIC.contexts[30:] * 2)
+    
+    assert results[:30] == first
+    assert results[30:60] == results[60:]
+    assert [(r.score, r.recommended_action) for r in results[:60]] == \
+        [(r.score, r.recommended_action) for r in expected]
+    assert orchestrator.idempotency.batch_duplicates == 30
+    assert agent_state(orchestrator) == agent_state(single)
+
+
+def test_concurrent_retries_wait_for_the_first_evaluation():
+    orchestrator = build_orchestrator(idempotency_ttl_seconds=300)
+    single = build_orchestrator()
+    transaction, context = TRAFFIC.transactions[0], TRAFFIC.contexts[0]
+    
+    async def retries():
+        return await asyncio.gather(*(orchestrator.evaluate_async(transaction, context) for _ in range(3)))
+    results = asyncio.run(retries())
+    single.evaluate(transaction, context)
+    
+    assert results[0] is results[1] is results[2]
+    assert agent_state(orchestrator) == agent_state(single)
+
+
+def test_transactions_without_id_are_always_scored():
+    orchestrator = build_orchestrator(idempotency_ttl_seconds=300)
+    transaction = {key: value for key, value in TRAFFIC.transactions[0].items() if key != "transaction_id"}
+    
+    orchestrator.evaluate(transaction, TRAFFIC.contexts[0])
+    state = agent_state(orchestrator)
+    orchestrator.evaluate(transaction, TRAFFIC.contexts[0])
+    
+    assert agent_state(orchestrator) != state
+    assert orchestrator.idempotency.hits == 0
+
+
+def test_reused_transaction_id_with_other_fields_is_scored_again():
+    orchestrator = build_orchestrator(idempotency_ttl_seconds=300)
+    transaction = dict(TRAFFIC.transactions[0], amount=150.0, merchant="Amazon")
+    reused = dict(transaction, amount=99999.0, merchant="Binance crypto")
+    
+    first = orchestrator.evaluate(transaction, TRAFFIC.contexts[0])
+    second = orchestrator.evaluate(reused, TRAFFIC.contexts[0])
+    
+    assert second is not first
+    assert second.score > first.score
+    assert orchestrator.idempotency.conflicts == 1
+    # The same ID under another customer is another transaction
+    other_customer = dict(transaction, customer_id="CUST-OTHER")
+    assert orchestrator.evaluate(other_customer, TRAFFIC.contexts[0]) is not first
+    assert orchestrator.idempotency.hits == 0
+
+
+def test_reused_transaction_id_in_a_batch_is_scored_again():
+    orchestrator = build_orchestrator(idempotency_ttl_seconds=300)
+    transaction = dict(TRAFFIC.transactions[0], amount=150.0, merchant="Amazon")
+    reused = dict(transaction, amount=99999.0, merchant="Binance crypto")
+    
+    results = orchestrator.evaluate_many([transaction, reused, transaction], [TRAFFIC.contexts[0]] * 3)
+    
+    assert results[1] is not results[0]
+    assert results[1].score > results[0].score
+    assert results[2] is results[0]
@@ -0,0 +1,66 @@
+"""
+Latency histograms and Prometheus text exposition
+"""
+import random
+import re
+
+import pytest
+
+from agents.metrics import (BUCKET_COUNT, LatencyHistogram, MetricsRegistry, bucket_index, bucket_upper_ns,
+                            flag_code)
+
+SAMPLE_LINE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_]\w*="([^"\\]|\\.)*",?)*\})? -?[0-9.e+-]+$')
+
+
+def test_buckets_keep_durations_within_a_sixteenth():
+    for value in [0, 1, 31, 32, 33, 1000, 123_456, 10**9, 2**40 - 1]:
+        index = bucket_index(value)
+        assert 0 <= index < BUCKET_COUNT
+        assert value <= bucket_upper_ns(index) <= value + value / 16
+        assert index == 0 or bucket_upper_ns(index - 1) < value
+
+
+def test_percentiles_are_within_bucket_resolution():
+    rng = random.Random(15)
+    values = sorted(int(rng.lognormvariate(13, 1.5)) for _ in range(20000))
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    
+    for quantile in (0.5, 0.9, 0.99, 0.999):
+        exact = values[int(quantile * len(values)) - 1]
+        assert exact <= histogram.percentile(quantile) <= exact * 17 / 16
+    assert histogram.percentile(1.0) == values[-1]
+    assert histogram.count == len(values)
+    assert histogram.sum_ns == sum(values)
+
+
+def test_render_is_prometheus_text_format():
+    registry = MetricsRegistry()
+    latency = registry.histogram("test_latency_seconds", "Test latency", ["route"])
+    errors = registry.counter("test_errors_total", "Test errors", ["reason"])
+    for elapsed_ns in (50_000, 2_000_000, 3_000_000_000):
+        latency.labels("/a").record(elapsed_ns)
+    errors.inc('quote " and \\ slash')
+    
+    lines = registry.render().splitlines()
+    
+    assert "# TYPE test_latency_seconds histogram" in lines
+    assert "# TYPE test_errors_total counter" in lines
+    assert "# TYPE test_latency_seconds_quantile gauge" in lines
+    assert 'test_latency_seconds_bucket{route="/a",le="0.0001"} 1' in lines
+    assert 'test_latency_seconds_bucket{route="/a",le="2.5"} 2' in lines
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'test_latency_seconds_count{route="/a"} 3' in lines
+    assert 'test_errors_total{reason="quote \\" and \\\\ slash"} 1' in lines
+    assert all(line.startswith("# ") or SAMPLE_LINE.match(line) for line in lines)
+
+
+def test_metric_names_are_registered_once():
+    registry = MetricsRegistry()
+    counter = registry.counter("test_total", "Test", ["agent"])
+    
+    assert registry.counter("test_total", "Test", ["agent"]) is counter
+    with pytest.raises(ValueError):
+        registry.histogram("test_total", "Test", ["agent"])
+    assert flag_code("HIGH_AMOUNT: €1500 acima do limite") == "HIGH_AMOUNT"
@@ -0,0 +1,224 @@
+"""
+Agent state persistence: snapshots plus the event log tail rebuild the live state
+"""
+import copy
+import os
+import pickle
+import stat
+import threading
+import zlib
+
+import pytest
+
+from agents.behavioral_analysis import CustomerProfile
+from agents.event_log import RECORD_HEADER, EventLog, read_events
+from agents.pipeline import StatePersistence, build_orchestrator
+from agents.snapshot import SnapshotError, SnapshotManager, load_snapshot, write_snapshot
+from benchmarks.synthetic import TransactionGenerator
+
+META = {"shard": 0, "shards": 1}
+WORKERS = 4
+
+
+def comparable(value) -> bytes:
+    """Value pickled to compare by content, without the wall-clock time a profile was created"""
+    if isinstance(value, CustomerProfile):
+        value = copy.copy(value)
+        value.created_at = 0.0
+    return pickle.dumps(value)
+
+
+def agent_stores(orchestrator):
+    return [store for agent in orchestrator.agents.values() for store in agent.state_stores.values()]
+
+
+def agent_state(orchestrator):
+    return {
+        (agent_name, namespace): {key: comparable(value) for key, value in store.items()}
+        for agent_name, agent in orchestrator.agents.items()
+        for namespace, store in agent.state_stores.items()
+    }
+
+
+def persistence(orchestrator, directory, **options):
+    return StatePersistence(orchestrator, snapshot_path=str(directory / "state.bin"), snapshot_interval_seconds=0,
+                            event_log_dir=str(directory / "events"), meta=META, **options)
+
+
+@pytest.mark.parametrize("execution_mode", ["sequential", "concurrent"])
+def test_snapshot_under_traffic_plus_log_tail_rebuilds_live_state(tmp_path, execution_mode):
+    traffic = TransactionGenerator(customers=200, seed=7, fraud_rate=0.05).generate(3000)
+    live = build_orchestrator(execution_mode=execution_mode)
+    live_persistence = persistence(live, tmp_path, event_log_options={"fsync": False, "flush_interval_ms": 1})
+    live_persistence.restore()
+    live_persistence.start()
+    
+    # Each worker owns a set of customers, so the log keeps every customer's order
+    scored = []
+    snapshot_due = threading.Event()
+    def score(worker: int):
+        for transaction, context in zip(traffic.transactions, traffic.contexts):
+            if zlib.crc32(transaction["customer_id"].encode()) % WORKERS == worker:
+                live.evaluate(transaction, context)
+                scored.append(1)
+                if len(scored) >= len(traffic) // 3:
+                    snapshot_due.set()
+    
+    workers = [threading.Thread(target=score, args=(worker,)) for worker in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    snapshot_due.wait(30)
+    snapshot = live_persistence.snapshot()
+    for worker in workers:
+        worker.join()
+    live.shutdown()
+    assert live_persistence.event_log.flush(10)
+    
+    # Crash after the snapshot: no final snapshot, the tail is in the log
+    rebuilt = build_orchestrator(execution_mode=execution_mode)
+    rebuilt_persistence = persistence(rebuilt, tmp_path)
+    rebuilt_persistence.restore()
+    restored = rebuilt_persistence.snapshots.last_restore
+    
+    assert 0 < snapshot["wal_lsn"] < len(traffic)
+    assert restored["replayed_events"] == len(traffic) - snapshot["wal_lsn"]
+    assert agent_state(rebuilt) == agent_state(live)
+
+
+def logged_ids(directory):
+    return [transaction["transaction_id"] for _, transaction, _, _ in read_events(str(directory))]
+
+
+def append_events(log, start: int, count: int):
+    for i in range(start, start + count):
+        log.append({"transaction_id": f"T{i}", "customer_id": "CUST-1", "amount": 10.0}, {})
+    log.flush()
+
+
+def test_events_after_a_torn_tail_stay_readable(tmp_path):
+    log = EventLog(str(tmp_path), fsync=False)
+    log.start()
+    append_events(log, 0, 3)
+    log.close()
+    # Crash in the middle of the first record of a new segment
+    with open(tmp_path / "00000000000000000004.wal", "wb") as f:
+        f.write(RECORD_HEADER.pack(4, 100, 0) + b"partial")
+    
+    log = EventLog(str(tmp_path), fsync=False)
+    log.start()
+    assert log.last_lsn == 3
+    append_events(log, 3, 2)
+    log.close()
+    
+    assert logged_ids(tmp_path) == ["T0", "T1", "T2", "T3", "T4"]
+    assert [lsn for lsn, _, _, _ in read_events(str(tmp_path))] == [1, 2, 3, 4, 5]
+
+
+class FailingFile:
+    """Writes part of the first record it gets, then fails like a full disk"""
+    
+    def __init__(self, file):
+        self.file = file
+        self.failed = False
+    
+    def write(self, data: bytes):
+        if not self.failed:
+            self.failed = True
+            self.file.write(data[:RECORD_HEADER.size + 1])
+            raise OSError("No space left on device")
+        return self.file.write(data)
+    
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def test_failed_write_is_retried_in_a_new_segment(tmp_path):
+    log = EventLog(str(tmp_path), fsync=False)
+    log.start()
+    append_events(log, 0, 2)
+    log._file = FailingFile(log._file)
+    append_events(log, 2, 2)
+    append_events(log, 4, 2)
+    log.close()
+    
+    assert log.write_errors == 1
+    assert log.unlogged == 0
+    assert logged_ids(tmp_path) == ["T0", "T1", "T2", "T3", "T4", "T5"]
+    assert [lsn for lsn, _, _, _ in read_events(str(tmp_path))] == [1, 2, 3, 4, 5, 6]
+    assert EventLog(str(tmp_path)).last_lsn == 6
+
+
+def test_events_that_never_reach_the_log_are_counted(tmp_path):
+    log = EventLog(str(tmp_path), fsync=False, max_pending=3)
+    for i in range(4):
+        log.append({"transaction_id": f"T{i}", "customer_id": "CUST-1", "amount": 10.0}, {})
+    def fail(first_lsn):
+        raise OSError("No space left on device")
+    log._rotate = fail
+    log.close()
+    
+    assert log.dropped == 1
+    assert log.write_errors == 1
+    assert log.stats()["unlogged"] == 4
+
+
+def test_warm_restart_from_snapshot_scores_like_an_uninterrupted_run(tmp_path):
+    traffic = TransactionGenerator(customers=300, seed=3).generate(3000)
+    half = len(traffic) // 2
+    reference = build_orchestrator()
+    expected = [reference.evaluate(t, c) for t, c in zip(traffic.transactions, traffic.contexts)]
+    
+    first = build_orchestrator()
+    for transaction, context in zip(traffic.transactions[:half], traffic.contexts[:half]):
+        first.evaluate(transaction, context)
+    SnapshotManager(first, str(tmp_path / "state.bin"), 0, meta=META).snapshot()
+    restarted = build_orchestrator()
+    restored = SnapshotManager(restarted, str(tmp_path / "state.bin"), 0, meta=META).restore()
+    assert restored["entries"] == sum(len(store) for store in agent_stores(first))
+    assert agent_state(restarted) == agent_state(first)
+    
+    results = [restarted.evaluate(t, c) for t, c in zip(traffic.transactions[half:], traffic.contexts[half:])]
+    assert [(r.score, r.recommended_action) for r in results] == \
+        [(r.score, r.recommended_action) for r in expected[half:]]
+
+
+def test_snapshot_rename_is_fsynced_before_the_log_is_truncated(tmp_path, monkeypatch):
+    orchestrator = build_orchestrator()
+    log_persistence = persistence(orchestrator, tmp_path, event_log_options={"fsync": False})
+    traffic = TransactionGenerator(customers=5).generate(10)
+    orchestrator.evaluate_many(traffic.transactions, traffic.contexts)
+    calls = []
+    fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: calls.append(("fsync", stat.S_ISDIR(os.fstat(fd).st_mode))) or fsync(fd))
+    truncate = log_persistence.event_log.truncate
+    monkeypatch.setattr(log_persistence.event_log, "truncate", lambda lsn: calls.append(("truncate", lsn)) or truncate(lsn))
+    
+    log_persistence.snapshot()
+    
+    assert calls == [("fsync", False), ("fsync", True), ("truncate", log_persistence.event_log.position())]
+
+
+def test_snapshot_for_another_shard_layout_is_rejected(tmp_path):
+    orchestrator = build_orchestrator()
+    traffic = TransactionGenerator(customers=5).generate(10)
+    orchestrator.evaluate_many(traffic.transactions, traffic.contexts)
+    write_snapshot(str(tmp_path / "state.bin"), orchestrator.agents, META)
+    
+    with pytest.raises(SnapshotError):
+        load_snapshot(str(tmp_path / "state.bin"), build_orchestrator().agents, {"shard": 0, "shards": 2})
+
+
+def test_corrupt_snapshot_chunk_is_skipped(tmp_path):
+    traffic = TransactionGenerator(customers=50, seed=1).generate(500)
+    orchestrator = build_orchestrator()
+    orchestrator.evaluate_many(traffic.transactions, traffic.contexts)
+    path = tmp_path / "state.bin"
+    write_snapshot(str(path), orchestrator.agents, META)
+    data = bytearray(path.read_bytes())
+    data[100] ^= 0xFF
+    path.write_bytes(bytes(data))
+    
+    restored = load_snapshot(str(path), build_orchestrator().agents, META)
+    
+    assert restored["skipped_chunks"] == 1
+    assert 0 < restored["entries"] < sum(len(store) for store in agent_stores(orchestrator))
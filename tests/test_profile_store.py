@@ -0,0 +1,105 @@
+"""
+Customer profiles in SQLite behind the LRU cache
+"""
+from datetime import datetime
+import sqlite3
+
+from agents.profile_store import ProfileStore
+
+
+def test_cached_never_reads_the_database(tmp_path):
+    profiles = ProfileStore(str(tmp_path / "profiles.db"))
+    
+    assert profiles.cached("CUST-1") is None
+    assert profiles.db_reads == 0
+    
+    record = profiles.get("CUST-1")
+    assert profiles.db_reads == 1
+    assert profiles.cached("CUST-1") is record
+    assert profiles.db_reads == 1
+    profiles.close()
+
+
+def scored(transaction_id: str, amount: float = 50.0):
+    return {"transaction_id": transaction_id, "customer_id": "CUST-1", "amount": amount,
+            "timestamp": datetime(2024, 2, 12, 10, 30)}
+
+
+def test_current_includes_updates_not_yet_written(tmp_path):
+    profiles = ProfileStore(str(tmp_path / "profiles.db"))
+    profiles.record(scored("T1"), "APPROVE")
+    profiles.record(scored("T2"), "BLOCK")
+    
+    assert profiles.get("CUST-1").transactions == 0
+    current = profiles.current("CUST-1")
+    assert (current.transactions, current.approved, current.blocked) == (2, 1, 1)
+    assert profiles.get("CUST-1").transactions == 0
+    
+    profiles.flush()
+    assert profiles.get("CUST-1").transactions == 2
+    assert profiles.current("CUST-1").transactions == 2
+    profiles.close()
+
+
+class StaleReader:
+    """Reads the rows, then lets a flush commit before handing them back"""
+    
+    def __init__(self, connection, during_read):
+        self.connection = connection
+        self.during_read = during_read
+    
+    def execute(self, *args):
+        rows = self.connection.execute(*args).fetchall()
+        self.during_read()
+        return rows
+    
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+def test_read_racing_a_flush_does_not_replace_the_flushed_profile(tmp_path):
+    path = str(tmp_path / "profiles.db")
+    first = ProfileStore(path)
+    first.record(scored("T1"), "APPROVE")
+    first.close()
+    
+    profiles = ProfileStore(path)
+    profiles.record(scored("T2"), "APPROVE")
+    profiles._reader = StaleReader(profiles._reader, profiles.flush)
+    
+    assert profiles.get("CUST-1").transactions == 2
+    assert profiles.cached("CUST-1").transactions == 2
+    profiles.close()
+
+
+class FailingConnection:
+    """Fails to start a transaction, like a database locked by another writer"""
+    
+    def __init__(self, connection):
+        self.connection = connection
+    
+    def execute(self, sql, *args):
+        if sql == "BEGIN IMMEDIATE":
+            raise sqlite3.OperationalError("database is locked")
+        return self.connection.execute(sql, *args)
+    
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+def test_failed_flush_is_written_with_the_next_one(tmp_path):
+    profiles = ProfileStore(str(tmp_path / "profiles.db"))
+    writer = profiles._writer
+    profiles._writer = FailingConnection(writer)
+    profiles.record(scored("T1", 80.0), "APPROVE")
+    profiles.flush()
+    assert profiles.write_errors == 1
+    assert profiles.current("CUST-1").transactions == 1
+    
+    profiles._writer = writer
+    profiles.record(scored("T2", 20.0), "APPROVE")
+    profiles.flush()
+    record = profiles.get("CUST-1")
+    assert (record.transactions, record.amount_sum, record.max_amount) == (2, 100.0, 80.0)
+    assert profiles.stats()["pending"] == 0
+    profiles.close()
@@ -0,0 +1,59 @@
+"""
+Stack sampler and its collapsed / top-function reports
+"""
+import threading
+
+import pytest
+
+from agents.profiler import ProfilerBusyError, StackSampler, render_collapsed, top_functions
+
+
+def spin(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profile_samples_a_busy_thread():
+    stop = threading.Event()
+    worker = threading.Thread(target=spin, args=(stop,), name="busy-worker")
+    worker.start()
+    try:
+        result = StackSampler().profile(0.2, interval_ms=5)
+    finally:
+        stop.set()
+        worker.join()
+    
+    busy = {stack: count for stack, count in result["stacks"].items() if stack.startswith("busy-worker;")}
+    assert busy
+    assert all("spin (tests/test_profiler.py:" in stack for stack in busy)
+    assert result["samples"] == sum(result["stacks"].values())
+    assert result["interval_ms"] == 5
+
+
+def test_only_one_profile_runs_at_a_time():
+    sampler = StackSampler()
+    sampler.lock.acquire()
+    try:
+        with pytest.raises(ProfilerBusyError):
+            sampler.profile(0.01)
+    finally:
+        sampler.lock.release()
+
+
+def test_reports_rank_stacks_and_functions():
+    stacks = {
+        "main;handle (gateway.py:10);loads (json/decoder.py:5)": 3,
+        "main;handle (gateway.py:10);evaluate (agents/risk_orchestrator.py:20)": 5,
+        "worker;run (threading.py:1)": 1
+    }
+    
+    heaviest = render_collapsed(stacks).splitlines()[0]
+    assert heaviest == "main;handle (gateway.py:10);evaluate (agents/risk_orchestrator.py:20) 5"
+    assert render_collapsed({}) == ""
+    report = top_functions(stacks)
+    assert report["self"][0] == {"function": "evaluate (agents/risk_orchestrator.py:20)", "samples": 5}
+    assert report["total"][0] == {"function": "handle (gateway.py:10)", "samples": 8}
+    # Library time is attributed to the innermost project frame
+    project = top_functions(stacks, project_only=True)
+    assert project["self"] == [{"function": "evaluate (agents/risk_orchestrator.py:20)", "samples": 5},
+                               {"function": "handle (gateway.py:10)", "samples": 3}]
@@ -0,0 +1,266 @@
+"""
+Risk orchestrator scoring paths
+"""
+from datetime import datetime
+import asyncio
+import threading
+import time
+
+import pytest
+
+from agents.base_agent import BaseFraudAgent, RiskAssessment
+from agents.event_log import read_events
+from agents.pipeline import StatePersistence, build_orchestrator
+from agents.risk_orchestrator import RiskOrchestrator
+from benchmarks.synthetic import TransactionGenerator
+
+
+def assessment(agent: BaseFraudAgent, score: float) -> RiskAssessment:
+    return RiskAssessment(score=score, confidence=0.9, flags=[], explanation=agent.name,
+                          recommended_action="APPROVE", timestamp=datetime.now(), agent_name=agent.name)
+
+
+class CountingAgent(BaseFraudAgent):
+    """Scores 0 and counts the transactions recorded in its state"""
+    
+    def __init__(self, name: str):
+        super().__init__(name, "Counts recorded transactions")
+        self.recorded = 0
+    
+    def evaluate(self, transaction, context=None) -> RiskAssessment:
+        self.update_state(transaction, context)
+        return assessment(self, 0.0)
+    
+    def update_state(self, transaction, context=None):
+        self.recorded += 1
+
+
+class BlockingAgent(CountingAgent):
+    """Blocking I/O agent that holds its worker thread until released"""
+    
+    blocking_io = True
+    
+    def __init__(self):
+        super().__init__("blocking_agent")
+        self.started = threading.Event()
+        self.release = threading.Event()
+    
+    def evaluate(self, transaction, context=None) -> RiskAssessment:
+        self.started.set()
+        self.release.wait(5)
+        return super().evaluate(transaction, context)
+    
+    def score_upper_bound(self, transaction, context=None) -> float:
+        return 20.0
+
+
+class WaitingAgent(CountingAgent):
+    """Inline agent that answers once the blocking agent's thread is running"""
+    
+    def __init__(self, blocking: BlockingAgent):
+        super().__init__("waiting_agent")
+        self.blocking = blocking
+    
+    def evaluate(self, transaction, context=None) -> RiskAssessment:
+        self.blocking.started.wait(5)
+        return super().evaluate(transaction, context)
+
+
+class CriticalAgent(CountingAgent):
+    """Answers at once with a critical score"""
+    
+    def evaluate(self, transaction, context=None) -> RiskAssessment:
+        super().evaluate(transaction, context)
+        return assessment(self, 95.0)
+
+
+def transaction(i: int):
+    return {"transaction_id": f"T{i}", "customer_id": f"C{i}", "amount": 50.0, "merchant": "Cafe",
+            "timestamp": datetime.now()}
+
+
+def test_running_blocking_agent_is_not_recorded_twice_when_skipped():
+    orchestrator = RiskOrchestrator(early_termination=True)
+    blocking = BlockingAgent()
+    orchestrator.register_agent(blocking)
+    orchestrator.register_agent(WaitingAgent(blocking))
+    
+    result = asyncio.run(orchestrator.evaluate_async(transaction(1)))
+    blocking.release.set()
+    orchestrator.shutdown()
+    deadline = time.monotonic() + 5
+    while blocking.recorded == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    
+    assert result.skipped_agents == ["blocking_agent"]
+    assert blocking.recorded == 1
+
+
+def wait_for(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_hung_agent_does_not_hold_up_snapshots_or_evaluations(tmp_path):
+    orchestrator = RiskOrchestrator(execution_mode="concurrent", agent_timeouts_ms={"blocking_agent": 20})
+    blocking = BlockingAgent()
+    orchestrator.register_agent(blocking)
+    orchestrator.register_agent(CountingAgent("counting_agent"))
+    persistence = StatePersistence(orchestrator, snapshot_path=str(tmp_path / "state.bin"),
+                                   snapshot_interval_seconds=0, event_log_dir=str(tmp_path / "events"),
+                                   event_log_options={"fsync": False, "flush_interval_ms": 1},
+                                   meta={"shard": 0, "shards": 1})
+    persistence.restore()
+    persistence.start()
+    
+    assert orchestrator.evaluate(transaction(1)).timed_out_agents == ["blocking_agent"]
+    snapshot = threading.Thread(target=persistence.snapshot)
+    snapshot.start()
+    snapshot.join(2)
+    assert not snapshot.is_alive()
+    started = time.monotonic()
+    assert orchestrator.evaluate(transaction(2)).timed_out_agents == ["blocking_agent"]
+    assert time.monotonic() - started < 1
+    
+    # T1's late update straddles the snapshot, T2's does not
+    blocking.release.set()
+    assert wait_for(lambda: orchestrator.late_writes + orchestrator.dropped_late_writes == 2)
+    assert orchestrator.dropped_late_writes == 1
+    assert orchestrator.late_writes == 1
+    persistence.stop()
+    orchestrator.shutdown()
+    
+    events = [(transaction["transaction_id"], not_run)
+              for _, transaction, _, not_run in read_events(str(tmp_path / "events"))]
+    assert events == [("T1", ["blocking_agent"]), ("T2", ["blocking_agent"]), ("T2", ["counting_agent"])]
+
+
+def test_evaluate_async_scores_like_evaluate():
+    traffic = TransactionGenerator(customers=100, seed=11, fraud_rate=0.1).generate(1500)
+    sync = build_orchestrator()
+    expected = [sync.evaluate(t, c) for t, c in zip(traffic.transactions, traffic.contexts)]
+    
+    async def score_all(orchestrator):
+        return [await orchestrator.evaluate_async(t, c) for t, c in zip(traffic.transactions, traffic.contexts)]
+    results = asyncio.run(score_all(build_orchestrator()))
+    
+    assert [(r.score, r.flags, r.recommended_action, r.agent_scores) for r in results] == \
+        [(r.score, r.flags, r.recommended_action, r.agent_scores) for r in expected]
+    assert {r.recommended_action for r in results} >= {"APPROVE", "BLOCK"}
+
+
+def test_critical_score_short_circuits_concurrent_agents():
+    orchestrator = RiskOrchestrator(execution_mode="concurrent")
+    blocking = BlockingAgent()
+    orchestrator.register_agent(blocking)
+    orchestrator.register_agent(CriticalAgent("critical_agent"))
+    
+    started = time.monotonic()
+    sync_result = orchestrator.evaluate(transaction(1))
+    async_result = asyncio.run(orchestrator.evaluate_async(transaction(2)))
+    elapsed = time.monotonic() - started
+    blocking.release.set()
+    orchestrator.shutdown()
+    
+    assert elapsed < 2
+    for result in (sync_result, async_result):
+        assert result.recommended_action == "BLOCK"
+        assert "critical_agent" in result.explanation
+        assert result.agent_scores == {"critical_agent": 95.0}
+
+
+class SleepingAgent(CountingAgent):
+    """Blocking I/O agent that takes a fixed time to answer"""
+    
+    blocking_io = True
+    
+    def __init__(self, name: str, seconds: float, score: float = 0.0):
+        super().__init__(name)
+        self.seconds = seconds
+        self.score = score
+    
+    def evaluate(self, transaction, context=None) -> RiskAssessment:
+        time.sleep(self.seconds)
+        self.update_state(transaction, context)
+        return assessment(self, self.score)
+
+
+def test_concurrent_mode_scores_like_sequential():
+    traffic = TransactionGenerator(customers=100, seed=5, fraud_rate=0.1).generate(1500)
+    sequential = build_orchestrator()
+    concurrent = build_orchestrator(execution_mode="concurrent")
+    
+    expected = [sequential.evaluate(t, c) for t, c in zip(traffic.transactions, traffic.contexts)]
+    results = [concurrent.evaluate(t, c) for t, c in zip(traffic.transactions, traffic.contexts)]
+    concurrent.shutdown()
+    
+    assert [(r.score, r.flags, r.recommended_action) for r in results] == \
+        [(r.score, r.flags, r.recommended_action) for r in expected]
+
+
+def test_concurrent_mode_runs_agents_in_parallel():
+    orchestrator = RiskOrchestrator(execution_mode="concurrent")
+    agents = [SleepingAgent(f"agent_{i}", 0.2) for i in range(3)]
+    for agent in agents:
+        orchestrator.register_agent(agent)
+    
+    started = time.monotonic()
+    result = orchestrator.evaluate(transaction(1))
+    elapsed = time.monotonic() - started
+    orchestrator.shutdown()
+    
+    assert elapsed < 0.5
+    assert set(result.agent_scores) == {agent.name for agent in agents}
+    assert [agent.recorded for agent in agents] == [1, 1, 1]
+
+
+def test_result_past_an_agent_timeout_is_left_out_of_the_decision():
+    orchestrator = RiskOrchestrator(agent_timeouts_ms={"slow_agent": 30})
+    fast, slow = SleepingAgent("fast_agent", 0, 50.0), SleepingAgent("slow_agent", 0.1, 80.0)
+    last = CountingAgent("last_agent")
+    for agent in (fast, slow, last):
+        orchestrator.register_agent(agent)
+    
+    result = orchestrator.evaluate(transaction(1))
+    
+    assert result.timed_out_agents == ["slow_agent"]
+    assert result.agent_scores == {"fast_agent": 50.0, "last_agent": 0.0}
+    # Sequential agents cannot be interrupted: the slow one still recorded the transaction
+    assert [fast.recorded, slow.recorded, last.recorded] == [1, 1, 1]
+
+
+def test_agents_past_the_request_budget_are_not_started():
+    orchestrator = RiskOrchestrator(request_budget_ms=50)
+    slow, after = SleepingAgent("slow_agent", 0.1), CountingAgent("after_agent")
+    orchestrator.register_agent(slow)
+    orchestrator.register_agent(after)
+    
+    result = orchestrator.evaluate(transaction(1))
+    
+    assert result.timed_out_agents == ["slow_agent", "after_agent"]
+    assert result.agent_scores == {}
+    assert after.recorded == 0
+    # A per-call budget overrides the default one
+    assert orchestrator.evaluate(transaction(2), budget_ms=1000).timed_out_agents == []
+
+
+@pytest.mark.parametrize("path", ["concurrent", "async"])
+def test_budget_bounds_the_wait_for_slow_agents(path):
+    orchestrator = RiskOrchestrator(execution_mode="concurrent")
+    orchestrator.register_agent(SleepingAgent("slow_agent", 0.5, 80.0))
+    orchestrator.register_agent(SleepingAgent("fast_agent", 0, 30.0))
+    
+    started = time.monotonic()
+    if path == "async":
+        result = asyncio.run(orchestrator.evaluate_async(transaction(1), budget_ms=50))
+    else:
+        result = orchestrator.evaluate(transaction(1), budget_ms=50)
+    elapsed = time.monotonic() - started
+    orchestrator.shutdown()
+    
+    assert elapsed < 0.3
+    assert result.timed_out_agents == ["slow_agent"]
+    assert result.agent_scores == {"fast_agent": 30.0}
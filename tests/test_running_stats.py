@@ -0,0 +1,65 @@
+"""
+Incremental baseline statistics vs recomputing them from the history
+"""
+from collections import deque
+from datetime import datetime
+import math
+import random
+import statistics
+
+from agents.anomaly_detection import AnomalyDetectionAgent, HISTORY_SIZE
+from agents.running_stats import SlidingWindowStats
+
+
+def test_sliding_window_matches_exact_statistics():
+    rng = random.Random(8)
+    stats = SlidingWindowStats(50)
+    window = deque(maxlen=50)
+    for _ in range(2000):
+        # Large offset and small spread, where naive sum-of-squares loses precision
+        value = 1_000_000 + rng.gauss(0, 5)
+        stats.add(value)
+        window.append(value)
+        
+        assert math.isclose(stats.mean, statistics.fmean(window), rel_tol=1e-12)
+        if len(window) > 1:
+            assert math.isclose(stats.variance, statistics.pvariance(window), rel_tol=1e-6)
+
+
+def test_constant_values_have_no_variance():
+    stats = SlidingWindowStats(10)
+    for _ in range(35):
+        stats.add(0.1)
+    
+    assert stats.variance == 0.0
+    assert stats.std == 0.0
+
+
+def reference_assessment(history, amount):
+    """Z-score rules recomputed from the full history, as before the running statistics"""
+    mean = sum(history) / len(history)
+    variance = sum((x - mean) ** 2 for x in history) / len(history)
+    std = math.sqrt(variance) if variance > 0 else 1
+    z_score = abs(amount - mean) / std
+    if z_score > 5:
+        return 35.0, f"EXTREME_ZSCORE: {z_score:.1f}σ desvio"
+    if z_score > 3:
+        return 20.0, f"HIGH_ZSCORE: {z_score:.1f}σ desvio"
+    if z_score > 2:
+        return 8.0, f"ELEVATED_ZSCORE: {z_score:.1f}σ desvio"
+    return 0.0, None
+
+
+def test_agent_scores_match_recomputing_the_baseline():
+    rng = random.Random(9)
+    agent = AnomalyDetectionAgent()
+    history = deque(maxlen=HISTORY_SIZE)
+    for i in range(2500):
+        amount = round(rng.lognormvariate(4, 0.5) * (20 if rng.random() < 0.02 else 1), 2)
+        result = agent.evaluate({"customer_id": "C1", "amount": amount, "timestamp": datetime.now()})
+        
+        if len(history) >= 5:
+            score, flag = reference_assessment(history, amount)
+            assert result.score == score
+            assert result.flags == ([flag] if flag else [])
+        history.append(amount)
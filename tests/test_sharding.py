@@ -0,0 +1,58 @@
+"""
+Shard request handling (run in-process, without worker processes)
+"""
+from datetime import datetime
+import time
+
+from agents.base_agent import BaseFraudAgent, RiskAssessment
+from agents.pipeline import build_orchestrator
+from agents.sharding import _handle, shard_for
+
+CONTEXT = {"customer_profile": {"avg_transaction_amount": 100.0, "max_transaction_amount": 500.0}}
+
+
+class SlowAgent(BaseFraudAgent):
+    def __init__(self):
+        super().__init__("slow_agent", "Answers after 50ms")
+    
+    def evaluate(self, transaction, context=None) -> RiskAssessment:
+        time.sleep(0.05)
+        return RiskAssessment(score=90.0, confidence=0.9, flags=["SLOW"], explanation="slow",
+                              recommended_action="BLOCK", timestamp=datetime.now(), agent_name=self.name)
+
+
+def transaction(i: int):
+    return {"transaction_id": f"T{i}", "customer_id": f"C{i}", "amount": 50.0, "merchant": "Cafe",
+            "timestamp": datetime.now()}
+
+
+def test_single_evaluations_keep_agent_timeouts():
+    orchestrator = build_orchestrator(agent_timeouts_ms={"slow_agent": 5})
+    orchestrator.register_agent(SlowAgent())
+    requests = [(i, "evaluate", (transaction(i), CONTEXT, None)) for i in range(3)]
+    
+    replies = _handle(orchestrator, None, requests)
+    
+    assert [request_id for request_id, _, _ in replies] == [0, 1, 2]
+    for _, ok, assessment in replies:
+        assert ok
+        assert assessment.timed_out_agents == ["slow_agent"]
+        assert "SLOW" not in assessment.flags
+
+
+def test_single_evaluations_without_deadlines_are_batched():
+    orchestrator = build_orchestrator()
+    single = build_orchestrator()
+    transactions = [transaction(i) for i in range(4)]
+    requests = [(i, "evaluate", (txn, CONTEXT, None)) for i, txn in enumerate(transactions)]
+    
+    replies = _handle(orchestrator, None, requests)
+    
+    expected = [single.evaluate(txn, CONTEXT) for txn in transactions]
+    assert [(assessment.score, assessment.recommended_action) for _, _, assessment in replies] == \
+        [(assessment.score, assessment.recommended_action) for assessment in expected]
+
+
+def test_shard_for_is_stable():
+    assert shard_for("CUST-1", 4) == shard_for("CUST-1", 4)
+    assert {shard_for(f"CUST-{i}", 4) for i in range(100)} == {0, 1, 2, 3}
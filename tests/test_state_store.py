@@ -0,0 +1,65 @@
+"""
+LRU state store: size and idle-time bounds, and snapshots that see the values as of begin_snapshot()
+"""
+import pickle
+
+from agents import state_store
+from agents.state_store import LRUStateStore
+
+
+def frozen(store):
+    return {key: pickle.loads(data) for key, data in store.snapshot_entries()}
+
+
+def test_snapshot_entries_keep_values_as_of_begin_snapshot():
+    store = LRUStateStore("windows", max_entries=3)
+    for key in ("a", "b", "c"):
+        store[key] = [key]
+    
+    store.begin_snapshot()
+    store.get("a").append("changed in place")
+    store["b"] = ["replaced"]
+    store["d"] = ["inserted, evicting c"]
+    del store["d"]
+    entries = list(store.snapshot_entries())
+    store.get("b").append("after it was written")
+    store.end_snapshot()
+    
+    assert [key for key, _ in entries] == ["a", "b", "c"]
+    assert {key: pickle.loads(data) for key, data in entries} == {"a": ["a"], "b": ["b"], "c": ["c"]}
+    assert "c" not in store
+    assert frozen(store) == {"a": ["a", "changed in place"], "b": ["replaced", "after it was written"]}
+
+
+def test_least_recently_used_entry_is_evicted_when_full():
+    store = LRUStateStore("windows", max_entries=2)
+    store["a"] = 1
+    store["b"] = 2
+    store.get("a")
+    store["c"] = 3
+    
+    assert "b" not in store
+    assert [key for key, _ in store.items()] == ["a", "c"]
+    assert store.stats()["evictions"] == 1
+
+
+def test_idle_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(state_store.time, "monotonic", lambda: now[0])
+    store = LRUStateStore("windows", ttl_seconds=60)
+    store["idle"] = 1
+    store["active"] = 2
+    
+    now[0] += 45
+    assert store.get("active") == 2
+    now[0] += 30
+    assert "idle" not in store
+    assert store.get("idle") is None
+    assert store.get("active") == 2
+    
+    # Writes sweep expired entries from the cold end
+    store["other"] = 3
+    now[0] += 61
+    store["new"] = 4
+    assert [key for key, _ in store.items()] == ["new"]
+    assert store.stats()["expirations"] == 3
@@ -0,0 +1,68 @@
+"""
+Sampled tracing: span trees, sampling, filters and export
+"""
+import json
+import time
+
+import pytest
+
+from agents.tracing import NULL_SPAN, Tracer, span
+
+
+def traced_request(tracer: Tracer, transaction_id: str, sleep: float = 0.0):
+    with tracer.trace("request", transaction_id=transaction_id) as root:
+        with span("agent") as agent_span:
+            with span("rule"):
+                time.sleep(sleep)
+            agent_span.set(score=10.0)
+    return root
+
+
+def test_sampled_request_keeps_its_span_tree(tmp_path):
+    export_path = tmp_path / "traces.jsonl"
+    tracer = Tracer(sample_rate=1.0, export_path=str(export_path))
+    traced_request(tracer, "T1")
+    tracer.configure(sample_rate=1.0)  # Closes the export file
+    
+    [trace] = tracer.recent()
+    assert trace["name"] == "request"
+    assert trace["attributes"] == {"transaction_id": "T1"}
+    agent, rule = trace["spans"]
+    assert (agent["name"], agent["parent_id"], agent["attributes"]) == ("agent", 1, {"score": 10.0})
+    assert (rule["name"], rule["parent_id"]) == ("rule", agent["span_id"])
+    assert [json.loads(line)["trace_id"] for line in export_path.read_text().splitlines()] == [trace["trace_id"]]
+
+
+def test_unsampled_requests_record_nothing():
+    tracer = Tracer(sample_rate=0.0)
+    
+    assert traced_request(tracer, "T1") is NULL_SPAN
+    assert span("outside a trace") is NULL_SPAN
+    assert tracer.recent() == []
+    with pytest.raises(ValueError):
+        tracer.configure(sample_rate=1.5)
+
+
+def test_filters_and_buffer_size():
+    tracer = Tracer(sample_rate=1.0, buffer_size=3, min_duration_ms=5)
+    traced_request(tracer, "fast")
+    for transaction_id in ("T1", "T2", "T3", "T4"):
+        traced_request(tracer, transaction_id, sleep=0.006)
+    
+    stats = tracer.stats()
+    assert (stats["recorded"], stats["discarded_fast"], stats["buffered"]) == (4, 1, 3)
+    assert [trace["attributes"]["transaction_id"] for trace in tracer.recent()] == ["T4", "T3", "T2"]
+    assert [trace["attributes"]["transaction_id"] for trace in tracer.recent(transaction_id="T3")] == ["T3"]
+    assert len(tracer.recent(limit=1)) == 1
+    assert tracer.recent(min_duration_ms=60_000) == []
+
+
+def test_span_finishing_after_its_trace_is_counted_as_late():
+    tracer = Tracer(sample_rate=1.0)
+    with tracer.trace("request"):
+        late = span("abandoned agent")
+    with late:
+        pass
+    
+    assert tracer.stats()["late_spans"] == 1
+    assert tracer.recent()[0]["spans"] == []
@@ -0,0 +1,122 @@
+"""
+Columnar (evaluate_many) vs scalar (evaluate) equivalence of the Transaction Monitor
+"""
+from datetime import datetime, timedelta
+import random
+
+import pytest
+
+from agents import TransactionMonitorAgent
+
+PROFILE = {"customer_profile": {
+    "avg_transaction_amount": 100.0,
+    "max_transaction_amount": 500.0,
+    "usual_transaction_hours": list(range(8, 23))
+}}
+CITIES = [(38.72, -9.14), (41.15, -8.61), (48.86, 2.35), (40.42, -3.70), (51.51, -0.13)]
+
+
+def score_scalar(transactions):
+    agent = TransactionMonitorAgent()
+    return [agent.evaluate(transaction, PROFILE) for transaction in transactions]
+
+
+def score_batches(transactions, batch_sizes, agent=None):
+    agent = agent or TransactionMonitorAgent()
+    results = []
+    start = 0
+    for size in batch_sizes:
+        batch = transactions[start:start + size]
+        results.extend(agent.evaluate_many(batch, [PROFILE] * len(batch)))
+        start += size
+    return results
+
+
+def random_traffic(seed: int, count: int = 600, out_of_order: float = 0.2):
+    rng = random.Random(seed)
+    now = datetime.now() - timedelta(hours=2)
+    transactions = []
+    for i in range(count):
+        # Mostly increasing time, with some transactions arriving late
+        timestamp = now + timedelta(seconds=20 * i)
+        if rng.random() < out_of_order:
+            timestamp -= timedelta(minutes=rng.randint(1, 90))
+        lat, lon = rng.choice(CITIES)
+        transaction = {
+            "transaction_id": f"T{seed}-{i}",
+            "customer_id": f"C{rng.randint(0, 15)}",
+            "amount": rng.choice([15.0, 60.0, 120.0, 900.0, 2500.0]),
+            "merchant": rng.choice(["Supermarket", "Crypto Exchange", "Online Casino", "Cafe"]),
+            "timestamp": timestamp
+        }
+        if rng.random() < 0.9:
+            transaction["location"] = {"lat": lat, "lon": lon}
+        transactions.append(transaction)
+    return transactions
+
+
+def random_batch_sizes(seed: int, total: int):
+    rng = random.Random(seed)
+    sizes = []
+    while total > 0:
+        sizes.append(min(total, rng.randint(1, 80)))
+        total -= sizes[-1]
+    return sizes
+
+
+def assert_same(scalar, columnar):
+    assert len(scalar) == len(columnar)
+    for i, (expected, actual) in enumerate(zip(scalar, columnar)):
+        assert actual.score == pytest.approx(expected.score), i
+        assert actual.flags == expected.flags, i
+        assert actual.recommended_action == expected.recommended_action, i
+
+
+def test_geo_rule_compares_with_last_added_entry():
+    now = datetime.now()
+    transactions = [
+        {"transaction_id": "T1", "customer_id": "C1", "amount": 20.0, "merchant": "Cafe",
+         "location": {"lat": 38.72, "lon": -9.14}, "timestamp": now},
+        {"transaction_id": "T2", "customer_id": "C1", "amount": 20.0, "merchant": "Cafe",
+         "location": {"lat": 48.86, "lon": 2.35}, "timestamp": now - timedelta(minutes=30)},
+        {"transaction_id": "T3", "customer_id": "C1", "amount": 20.0, "merchant": "Cafe",
+         "location": {"lat": 48.86, "lon": 2.35}, "timestamp": now + timedelta(minutes=10)}
+    ]
+    scalar = score_scalar(transactions)
+    # The first two alone, then the third as its own batch
+    assert_same(scalar, score_batches(transactions, [1, 1, 1]))
+    assert_same(scalar, score_batches(transactions, [2, 1]))
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_columnar_matches_scalar_on_random_traffic(seed):
+    transactions = random_traffic(seed)
+    assert_same(score_scalar(transactions), score_batches(transactions, random_batch_sizes(seed, len(transactions))))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_columnar_matches_scalar_in_order(seed):
+    transactions = random_traffic(seed, out_of_order=0.0)
+    assert_same(score_scalar(transactions), score_batches(transactions, [len(transactions)]))
+
+
+def test_velocity_window_keeps_only_the_newest_transactions():
+    agent = TransactionMonitorAgent(max_window_entries=20)
+    now = datetime.now()
+    burst = [{"transaction_id": f"T{i}", "customer_id": "C1", "amount": 20.0, "merchant": "Cafe",
+              "timestamp": now - timedelta(seconds=500 - i)} for i in range(500)]
+    results = [agent.evaluate(transaction, PROFILE) for transaction in burst]
+    
+    window = agent.recent_transactions.get("C1")
+    assert len(window) == 20
+    assert len(window.timestamps) < 64
+    assert window.live_entries()[0][-1] == max(window.timestamps)
+    assert agent.get_velocity_counts("C1", now)["24h"] == 20
+    assert "VELOCITY: Multiple transactions in short window" in results[-1].flags
+    # Counts past the cap only matter up to the largest rule threshold, so batches still agree
+    assert_same(results, score_batches(burst, [100] * 5, TransactionMonitorAgent(max_window_entries=20)))
+
+
+def test_velocity_rules_must_fit_in_the_window_cap():
+    with pytest.raises(ValueError):
+        TransactionMonitorAgent(max_window_entries=4)
@@ -0,0 +1,62 @@
+"""
+Velocity window counts vs a brute-force scan of the same transactions
+"""
+import random
+
+from agents.velocity_index import VelocityWindow
+
+MINUTE = 60_000_000
+WINDOWS = {"1m": MINUTE, "5m": 5 * MINUTE, "1h": 60 * MINUTE, "24h": 24 * 60 * MINUTE}
+
+
+def brute_force_counts(timestamps, timestamp, cutoff):
+    live = [t for t in timestamps if t > cutoff]
+    return {name: sum(1 for t in live if t > timestamp - length) for name, length in WINDOWS.items()}
+
+
+def test_counts_match_a_full_scan_with_late_arrivals_and_expiry():
+    rng = random.Random(6)
+    window = VelocityWindow()
+    seen = []
+    now = 0
+    for i in range(3000):
+        now += rng.randint(0, 3 * MINUTE)
+        # Some transactions arrive up to 10 minutes late
+        timestamp = now - rng.randint(0, 10 * MINUTE) if rng.random() < 0.2 else now
+        window.add(timestamp, (38.7, -9.1), float(i))
+        seen.append(timestamp)
+        cutoff = now - WINDOWS["24h"]
+        window.expire(cutoff)
+        
+        assert window.window_counts(now, WINDOWS) == brute_force_counts(seen, now, cutoff)
+    
+    timestamps, _, amounts = window.live_entries()
+    assert timestamps == sorted(t for t in seen if t > cutoff)
+    assert len(window) == len(timestamps) == len(amounts)
+    # Expired entries are removed from the buffer, not just skipped
+    assert len(window.timestamps) < 2 * len(window) + 64
+
+
+def test_entry_cap_keeps_the_newest_transactions():
+    window = VelocityWindow()
+    for i in range(200):
+        window.add(i * MINUTE, None, float(i), max_entries=50)
+    
+    timestamps, _, amounts = window.live_entries()
+    assert len(window) == 50
+    assert amounts == [float(i) for i in range(150, 200)]
+    assert window.count_since(-1) == 50
+    assert window.last == (199 * MINUTE, None)
+
+
+def test_expiring_the_last_entry_clears_it():
+    window = VelocityWindow()
+    window.add(5 * MINUTE, (38.7, -9.1), 10.0)
+    window.add(MINUTE, (41.1, -8.6), 20.0)
+    
+    assert window.last == (MINUTE, (41.1, -8.6))
+    window.expire(2 * MINUTE)
+    assert window.last == (5 * MINUTE, (38.7, -9.1))
+    window.expire(5 * MINUTE)
+    assert window.last is None
+    assert len(window) == 0